@@ -0,0 +1,481 @@
+# Content-addressed storage for PromptStore.
+#
+# Bodies are stored once per distinct content in promptBlobs/:
+#
+#     index.json       {"version": 1, "pack": "blobs-0001.pack",
+#                       "names":  {name: body hash},
+#                       "bodies": {body hash: [chunk hash, ...]},   # multi-chunk bodies only
+#                       "chunks": {chunk hash: [offset, length]}}
+#     index.log        puts, renames and deletes since index.json was written
+#     blobs-NNNN.pack  the chunks' UTF-8 bytes, appended back to back
+#
+# Hashes are 16-byte BLAKE2b digests in hex. Bodies of a few KB or more are
+# split into chunks at content-defined line boundaries, so two long prompts
+# that differ in one paragraph share every other chunk. A body that fits in
+# one chunk is addressed by that chunk's hash directly.
+#
+# Saving appends only chunks the pack does not have yet, then one line per
+# change to index.log (as the journal backend does for promptData.json), so
+# renaming or copying a prompt writes no body data at all. The log is folded
+# into index.json once it grows large, and at compaction (a log left behind
+# by a crash during folding, or next to an index.json changed some other way,
+# follows the journal backend's rules). Chunks
+# no name refers to any more are garbage; compact() copies the live chunks
+# into a new pack once enough garbage has built up (collect_garbage() does it
+# unconditionally). Only names are loaded at startup; bodies are read from
+# the pack on demand.
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import zlib
+
+from JournalBackend import JournalBackend
+from PromptStore import (Change, JsonFileBackend, PromptFormatError, PromptStoreError, StorageBackend,
+                         atomic_write, file_signature)
+
+BLOB_DIRNAME = "promptBlobs"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class BlobBackend(StorageBackend):
+    """Name -> hash index over a deduplicated, chunked body pack."""
+
+    name = "blobs"
+    filename = os.path.join(BLOB_DIRNAME, "index.json")
+    log_filename = os.path.join(BLOB_DIRNAME, "index.log")
+    lazy = True
+    incremental_save = True
+    VERSION = 1
+
+    # Chunking: bodies shorter than CHUNK_MIN_BODY stay whole. Longer ones end
+    # a chunk after a line whose CRC-32 has its low CHUNK_MASK bits clear (so
+    # boundaries follow content, not offsets), once the chunk holds at least
+    # CHUNK_MIN characters, or as soon as it reaches CHUNK_MAX.
+    CHUNK_MIN_BODY = 4096
+    CHUNK_MIN = 1024
+    CHUNK_MAX = 64 * 1024
+    CHUNK_MASK = 0x1F
+
+    # The log is folded into index.json once it is both larger than
+    # FOLD_MIN_BYTES and FOLD_RATIO times the index, or holds FOLD_MAX_RECORDS ops.
+    FOLD_MIN_BYTES = 1024 * 1024
+    FOLD_RATIO = 0.5
+    FOLD_MAX_RECORDS = 10000
+
+    # compact() collects garbage once it is both GC_MIN_BYTES and GC_RATIO of the pack.
+    GC_MIN_BYTES = 1024 * 1024
+    GC_RATIO = 0.25
+
+    def __init__(self, directory: str):
+        super().__init__(directory)
+        self._lock = threading.Lock()          # guards the index dicts and the pack handle
+        self._names: dict[str, str] | None = None
+        self._bodies: dict[str, list[str]] = {}
+        self._chunks: dict[str, list[int]] = {}
+        self._pack_name: str | None = None
+        self._pack = None                      # Read handle on the current pack
+        self._log_records = 0
+        # The log on disk cannot take appends (a torn final line, or a header
+        # naming another index.json); the next save writes index.json.
+        self._log_stale = False
+        self._log_end = None  # Bytes of intact log lines, if a torn line follows them
+        # Signature of the index.json this instance loaded or last wrote; the
+        # log is only ever appended on top of that exact file.
+        self._base_signature = None
+
+    @classmethod
+    def detect(cls, directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, cls.filename))
+
+    @property
+    def blob_directory(self) -> str:
+        return os.path.join(self.directory, BLOB_DIRNAME)
+
+    @property
+    def log_path(self) -> str:
+        return os.path.join(self.directory, self.log_filename)
+
+    def _pack_path(self, pack_name):
+        return os.path.join(self.blob_directory, pack_name)
+
+    # --- Chunks ---
+
+    @classmethod
+    def split_chunks(cls, body: str) -> list[str]:
+        if len(body) < cls.CHUNK_MIN_BODY:
+            return [body]
+        chunks = []
+        current = []
+        size = 0
+        for line in body.splitlines(keepends=True):
+            current.append(line)
+            size += len(line)
+            if size >= cls.CHUNK_MAX or (size >= cls.CHUNK_MIN and not zlib.crc32(line.encode('utf-8')) & cls.CHUNK_MASK):
+                chunks.append("".join(current))
+                current = []
+                size = 0
+        if current:
+            chunks.append("".join(current))
+        return chunks
+
+    def _add_body(self, body, bodies, chunks, new_data):
+        """Address body, queueing chunks the pack lacks in new_data; returns the body hash."""
+        body_hash = content_hash(body)
+        if body_hash in bodies or body_hash in chunks:
+            return body_hash
+        pieces = self.split_chunks(body)
+        hashes = []
+        for piece in pieces:
+            chunk_hash = body_hash if len(pieces) == 1 else content_hash(piece)
+            if chunk_hash not in chunks and chunk_hash not in new_data:
+                new_data[chunk_hash] = piece.encode('utf-8')
+            hashes.append(chunk_hash)
+        if len(pieces) > 1:
+            bodies[body_hash] = hashes
+        return body_hash
+
+    def _read_chunk(self, chunk_hash) -> bytes:
+        offset, length = self._chunks[chunk_hash]
+        if self._pack is None:
+            self._pack = open(self._pack_path(self._pack_name), 'rb')
+        self._pack.seek(offset)
+        return self._pack.read(length)
+
+    # --- Loading ---
+
+    def _snapshot_signature(self):
+        """Identifies the index.json a log was started against."""
+        return file_signature(self.path)
+
+    def signature(self):
+        return [self._snapshot_signature(), file_signature(self.log_path)]
+
+    def _read_index(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except json.JSONDecodeError as e:
+            raise PromptFormatError(f"Error decoding '{self.filename}'. It might be corrupted.") from e
+        if not isinstance(index, dict) or index.get("version") != self.VERSION:
+            raise PromptFormatError(f"File '{self.filename}' found but has an unexpected format.")
+        return index
+
+    def load(self) -> dict[str, None]:
+        base_signature = self._snapshot_signature()
+        index = self._read_index()
+        names, bodies, chunks = index["names"], index["bodies"], index["chunks"]
+        records = []
+        stale = False
+        log_end = None
+        if os.path.exists(self.log_path):
+            # Same rules as the journal backend: a torn final line ends the
+            # replay, and a log started against a different index.json is
+            # replayed unless a fold that crashed midway already wrote it.
+            with open(self.log_path, 'rb') as f:
+                first = f.readline()
+                header = JournalBackend._read_record(first.decode('utf-8', 'replace'))
+                end = len(first)
+                for line in f:
+                    record = JournalBackend._read_record(line.decode('utf-8', 'replace'))
+                    if record is None:
+                        stale, log_end = True, end
+                        break
+                    records.append(record)
+                    end += len(line)
+            if first and not header:
+                stale, log_end = True, 0
+            if header and header.get("snapshot") != base_signature:
+                if records and records[-1].get("op") == "folded" and records[-1].get("snapshot") == base_signature:
+                    records = []
+                else:
+                    stale = True
+            for record in records:
+                self._replay(record, names, bodies, chunks)
+        with self._lock:
+            self._close_pack()
+            self._names, self._bodies, self._chunks = names, bodies, chunks
+            self._pack_name = index["pack"]
+            self._base_signature = base_signature
+            self._log_records = len(records)
+            self._log_stale = stale
+            self._log_end = log_end
+            return dict.fromkeys(self._names)
+
+    @staticmethod
+    def _replay(record, names, bodies, chunks):
+        op = record.get("op")
+        name = record.get("name")
+        if op == "put":
+            names[name] = record["hash"]
+            if "recipe" in record:
+                bodies[record["hash"]] = record["recipe"]
+            chunks.update(record.get("chunks", ()))
+        elif op == "rename":
+            if name in names:
+                names[record["new_name"]] = names.pop(name)
+        elif op == "delete":
+            names.pop(name, None)
+
+    def read_body(self, name: str) -> str:
+        with self._lock:
+            return self._read_hash(self._names[name])
+
+    def _read_hash(self, body_hash) -> str:
+        recipe = self._bodies.get(body_hash)
+        if recipe is None:
+            return self._read_chunk(body_hash).decode('utf-8')
+        return b"".join(self._read_chunk(chunk_hash) for chunk_hash in recipe).decode('utf-8')
+
+    def versions(self, prompts) -> dict:
+        # The body hash is a version token in itself.
+        with self._lock:
+            names = self._names or {}
+            return {name: names[name] for name in prompts if name in names}
+
+    # --- Saving ---
+
+    def save(self, prompts: dict[str, str | None], changes: list[Change]) -> None:
+        if self._names is None:
+            self._write_all(prompts)
+            return
+        if not self.exists():
+            # index.json went missing after a load: start over from the
+            # bodies, reading the ones not in memory from the old pack.
+            self._write_all(self._materialize(prompts, changes))
+            return
+        if not changes:
+            return
+        # Work on copies: readers keep using the current index until the
+        # change is on disk, and a failed write leaves it intact.
+        with self._lock:
+            names, bodies, chunks = dict(self._names), dict(self._bodies), dict(self._chunks)
+            pack_name = self._pack_name
+        new_data = {}
+        records = []
+        for change in changes:
+            record = {"op": change.op, "name": change.name}
+            if change.op == "put":
+                new_recipe = len(bodies)
+                body_hash = names[change.name] = self._add_body(change.body, bodies, chunks, new_data)
+                record["hash"] = body_hash
+                if len(bodies) > new_recipe:
+                    record["recipe"] = bodies[body_hash]
+            elif change.op == "rename":
+                names[change.new_name] = names.pop(change.name)  # Metadata only
+                record["new_name"] = change.new_name
+            elif change.op == "delete":
+                names.pop(change.name, None)
+            records.append(record)
+
+        # Chunks are appended past the end of the pack, where no reader looks;
+        # each is then logged with the first put that uses it.
+        self._append_chunks(pack_name, new_data.items(), chunks)
+        logged = set()
+        for record in records:
+            if record["op"] == "put":
+                new_chunks = {chunk_hash: chunks[chunk_hash]
+                              for chunk_hash in bodies.get(record["hash"], (record["hash"],))
+                              if chunk_hash in new_data and chunk_hash not in logged}
+                if new_chunks:
+                    record["chunks"] = new_chunks
+                    logged.update(new_chunks)
+
+        if self._log_stale or self._snapshot_signature() != self._base_signature:
+            # index.json was rewritten behind our back, or the log cannot be
+            # appended to: replace index.json outright (names already holds
+            # everything the log did).
+            self._write_snapshot(pack_name, names, bodies, chunks)
+        else:
+            self._append_log(records)
+        with self._lock:
+            self._names, self._bodies, self._chunks = names, bodies, chunks
+        if self._should_fold():
+            self._write_snapshot(pack_name, names, bodies, chunks)
+
+    def _append_log(self, records):
+        new_log = self._log_records == 0
+        with open(self.log_path, 'w' if new_log else 'a', encoding='utf-8') as f:
+            if new_log:
+                f.write(json.dumps({"snapshot": self._base_signature}) + "\n")
+            f.writelines(json.dumps(record, separators=(',', ':')) + "\n" for record in records)
+            f.flush()
+            os.fsync(f.fileno())
+        self._log_records += len(records)
+
+    def _should_fold(self) -> bool:
+        if self._log_records >= self.FOLD_MAX_RECORDS:
+            return True
+        try:
+            log_size = os.path.getsize(self.log_path)
+            index_size = os.path.getsize(self.path)
+        except OSError:
+            return False
+        return log_size >= self.FOLD_MIN_BYTES and log_size >= self.FOLD_RATIO * index_size
+
+    def _append_chunks(self, pack_name, items, chunks):
+        """Append (hash, bytes) items to the pack, recording their places in chunks."""
+        with open(self._pack_path(pack_name), 'ab') as f:
+            offset = f.seek(0, os.SEEK_END)
+            for chunk_hash, data in items:
+                f.write(data)
+                chunks[chunk_hash] = [offset, len(data)]
+                offset += len(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_snapshot(self, pack_name, names, bodies, chunks):
+        """Write index.json and empty the log."""
+        # Until index.json is replaced, other readers see the previous state
+        # and newly appended chunks are simply unreferenced.
+        with atomic_write(self.path, encoding='utf-8') as f:
+            json.dump({"version": self.VERSION, "pack": pack_name, "names": names,
+                       "bodies": bodies, "chunks": chunks}, f, separators=(',', ':'))
+            f.flush()
+            if self._log_records:
+                # Name the new index.json in the log before it replaces the
+                # old one, as the journal backend does.
+                st = os.fstat(f.fileno())
+                with open(self.log_path, 'r+', encoding='utf-8') as log:
+                    if self._log_end is not None:
+                        log.truncate(self._log_end)  # Cut a torn line off first
+                    log.seek(0, os.SEEK_END)
+                    log.write(json.dumps({"op": "folded", "snapshot": [st.st_size, st.st_mtime_ns]}) + "\n")
+                    log.flush()
+                    os.fsync(log.fileno())
+        self._base_signature = self._snapshot_signature()
+        with open(self.log_path, 'w', encoding='utf-8'):
+            pass
+        self._log_records = 0
+        self._log_stale = False
+        self._log_end = None
+
+    def _materialize(self, prompts, changes):
+        """prompts with every lazy placeholder replaced by its body from the pack."""
+        with self._lock:
+            names = dict(self._names)
+        for change in changes:
+            if change.op == "rename" and change.name in names:
+                names[change.new_name] = names.pop(change.name)
+        result = {}
+        for name, body in prompts.items():
+            if body is None:
+                try:
+                    with self._lock:
+                        body = self._read_hash(names[name])
+                except (OSError, KeyError) as e:
+                    raise PromptStoreError(f"Cannot rewrite '{self.filename}': the body of '{name}' "
+                                           f"is no longer in '{self._pack_name}' ({e}).") from e
+            result[name] = body
+        return result
+
+    def _write_all(self, prompts):
+        """Start a new pack holding prompts (first save, or after a reset)."""
+        os.makedirs(self.blob_directory, exist_ok=True)
+        names, bodies, chunks, new_data = {}, {}, {}, {}
+        for name, body in prompts.items():
+            names[name] = self._add_body(body, bodies, chunks, new_data)
+        self._switch_pack(names, bodies, new_data.items())
+
+    def _switch_pack(self, names, bodies, items):
+        """Write items into a fresh pack, point the index at it and delete the old pack."""
+        old_pack = self._pack_name
+        number = int(old_pack[6:10]) + 1 if old_pack else 1
+        pack_name = f"blobs-{number:04d}.pack"
+        if os.path.exists(self._pack_path(pack_name)):
+            os.remove(self._pack_path(pack_name))  # Left over from an interrupted rewrite
+        chunks = {}
+        self._append_chunks(pack_name, items, chunks)
+        self._write_snapshot(pack_name, names, bodies, chunks)
+        with self._lock:
+            self._close_pack()
+            self._names, self._bodies, self._chunks, self._pack_name = names, bodies, chunks, pack_name
+        if old_pack and old_pack != pack_name and os.path.exists(self._pack_path(old_pack)):
+            os.remove(self._pack_path(old_pack))
+
+    # --- Garbage collection ---
+
+    def _live(self):
+        """(live body hashes, live chunk hashes) of the loaded index."""
+        live_bodies = set(self._names.values())
+        live_chunks = set()
+        for body_hash in live_bodies:
+            live_chunks.update(self._bodies.get(body_hash, (body_hash,)))
+        return live_bodies, live_chunks
+
+    def garbage_bytes(self) -> int:
+        """Bytes in the pack that no prompt refers to any more."""
+        with self._lock:
+            if self._names is None:
+                return 0
+            _, live_chunks = self._live()
+            return sum(length for chunk_hash, (_, length) in self._chunks.items() if chunk_hash not in live_chunks)
+
+    def collect_garbage(self) -> int:
+        """Copy the referenced chunks into a new pack; returns the bytes freed.
+
+        Must not run concurrently with save(); PromptStore serializes both.
+        """
+        garbage = self.garbage_bytes()
+        if not garbage:
+            return 0
+        with self._lock:
+            live_bodies, live_chunks = self._live()
+            bodies = {body_hash: recipe for body_hash, recipe in self._bodies.items() if body_hash in live_bodies}
+            names = dict(self._names)
+            live = [chunk_hash for chunk_hash in self._chunks if chunk_hash in live_chunks]
+
+        def copied():
+            for chunk_hash in live:
+                with self._lock:
+                    data = self._read_chunk(chunk_hash)
+                yield chunk_hash, data
+
+        self._switch_pack(names, bodies, copied())
+        return garbage
+
+    def compact(self, prompts) -> None:
+        """Collect garbage if there is enough of it, else fold the log into index.json."""
+        if self._names is None or self._pack_name is None:
+            return
+        pack_size = os.path.getsize(self._pack_path(self._pack_name))
+        garbage = self.garbage_bytes()
+        if garbage >= self.GC_MIN_BYTES and garbage >= self.GC_RATIO * pack_size:
+            self.collect_garbage()
+        elif self._log_records or self._log_stale:
+            with self._lock:
+                names, bodies, chunks = dict(self._names), dict(self._bodies), dict(self._chunks)
+            self._write_snapshot(self._pack_name, names, bodies, chunks)
+
+    def _close_pack(self):
+        if self._pack is not None:
+            self._pack.close()
+            self._pack = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_pack()
+
+    # --- Import ---
+
+    def import_json(self, json_path: str, overwrite: bool = True) -> int:
+        """Add the prompts of a promptData.json file; returns the number of prompts imported.
+
+        With overwrite=False prompts that already exist keep their current body.
+        """
+        source = JsonFileBackend(os.path.dirname(json_path))
+        source.filename = os.path.basename(json_path)
+        imported = source.load()
+        if not self.exists():
+            self._write_all(imported)
+            return len(imported)
+        existing = self.load()
+        self.save({}, [Change("put", name, body=body) for name, body in imported.items()
+                       if overwrite or name not in existing])
+        return len(imported)
@@ -0,0 +1,208 @@
+# Lazily loaded promptData.json with a byte-offset sidecar.
+#
+# The data file keeps the usual promptData.json format. A promptData.offsets
+# sidecar records where each body's string literal sits in that file, tagged
+# with the data file's size/mtime. Startup reads only the sidecar (names and
+# offsets); bodies are decoded on demand from a memory map of the data file.
+# A save streams a new file, copying unchanged bodies as raw byte ranges
+# instead of re-serializing them, and writes new offsets alongside it. Each
+# sidecar entry also carries a CRC of its literal, used as the entry's version.
+
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import tempfile
+import threading
+import zlib
+
+from PromptStore import (Change, JsonFileBackend, PromptFormatError, StorageBackend,
+                         atomic_write, file_signature, scan_json_object)
+
+
+class IndexedJsonBackend(JsonFileBackend):
+    """promptData.json read through a memory map and an offsets sidecar."""
+
+    name = "indexed"
+    lazy = True
+    offsets_filename = "promptData.offsets"
+    VERSION = 2
+
+    def __init__(self, directory: str):
+        super().__init__(directory)
+        self._lock = threading.Lock()   # guards the mapping, _offsets and _crcs
+        self._file = None
+        self._map = None
+        self._offsets: dict[str, tuple[int, int]] = {}
+        self._crcs: dict[str, int] = {}   # name -> CRC-32 of its body literal
+
+    @classmethod
+    def detect(cls, directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, cls.offsets_filename))
+
+    @property
+    def offsets_path(self) -> str:
+        return os.path.join(self.directory, self.offsets_filename)
+
+    # --- Loading ---
+
+    def load(self) -> dict[str, None]:
+        with self._lock:
+            self._open_map()
+            entries = self._read_sidecar()
+            if entries is None:
+                entries = self._scan()
+                self._write_sidecar(entries)
+            self._offsets, self._crcs = entries
+            return dict.fromkeys(self._offsets)
+
+    # load() only reads the sidecar, so there is nothing worth streaming.
+    iter_load = StorageBackend.iter_load
+
+    def _open_map(self):
+        self._close_map()
+        self._file = open(self.path, 'rb')
+        if os.fstat(self._file.fileno()).st_size:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _close_map(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _read_sidecar(self):
+        try:
+            with open(self.offsets_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != self.VERSION or data.get("signature") != file_signature(self.path):
+            return None
+        offsets, crcs = {}, {}
+        for name, start, end, crc in data["entries"]:
+            offsets[name] = (start, end)
+            crcs[name] = crc
+        return offsets, crcs
+
+    def _write_sidecar(self, entries):
+        offsets, crcs = entries
+        entries = [[name, start, end, crcs[name]] for name, (start, end) in offsets.items()]
+        with atomic_write(self.offsets_path, encoding='utf-8') as f:
+            json.dump({"version": self.VERSION, "signature": file_signature(self.path), "entries": entries}, f)
+
+    def _scan(self):
+        """Build byte offsets (and literal CRCs) by scanning the data file once."""
+        raw = self._map[:] if self._map is not None else b""
+        try:
+            text = raw.decode('utf-8')
+        except UnicodeDecodeError as e:
+            raise PromptFormatError(f"File '{self.filename}' is not valid UTF-8.") from e
+        if not text.strip():
+            raise PromptFormatError(f"Error decoding JSON file '{self.filename}'. It might be corrupted.")
+
+        offsets = {}
+        if raw.isascii():
+            for name, start, end in scan_json_object(text):
+                offsets[name] = (start, end)
+            return offsets, self._literal_crcs(raw, offsets)
+
+        # Character and byte offsets differ; convert incrementally.
+        char_pos = byte_pos = 0
+
+        def to_bytes(pos):
+            nonlocal char_pos, byte_pos
+            byte_pos += len(text[char_pos:pos].encode('utf-8'))
+            char_pos = pos
+            return byte_pos
+
+        for name, start, end in scan_json_object(text):
+            offsets[name] = (to_bytes(start), to_bytes(end))
+        return offsets, self._literal_crcs(raw, offsets)
+
+    @staticmethod
+    def _literal_crcs(raw, offsets):
+        return {name: zlib.crc32(raw[start:end]) for name, (start, end) in offsets.items()}
+
+    def read_body(self, name: str) -> str:
+        with self._lock:
+            start, end = self._offsets[name]
+            return json.loads(self._map[start:end])
+
+    def fetch(self, name: str) -> str | None:
+        with self._lock:
+            entries = self._read_sidecar()
+        if entries is None:
+            return super().fetch(name)  # Stale or missing sidecar: load() rescans and rewrites it
+        span = entries[0].get(name)
+        if span is None:
+            return None
+        start, end = span
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            return json.loads(f.read(end - start))
+
+    def versions(self, prompts) -> dict:
+        with self._lock:
+            return {name: self._crcs[name] for name in prompts if name in self._crcs}
+
+    # --- Saving ---
+
+    def save(self, prompts: dict[str, str | None], changes: list[Change]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f".{self.filename}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                new_entries = self._write_entries(f, prompts)
+                f.flush()
+                os.fsync(f.fileno())
+            with self._lock:
+                # The old mapping must be closed before the file can be
+                # replaced on Windows; readers wait on the lock meanwhile.
+                self._close_map()
+                os.replace(tmp_path, self.path)
+                self._open_map()
+                self._offsets, self._crcs = new_entries
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        self._write_sidecar(new_entries)
+
+    def _write_entries(self, f, prompts):
+        """Write prompts in json.dump(indent=4) layout; return the new offsets and CRCs."""
+        if not prompts:
+            f.write(b"{}")
+            return {}, {}
+        offsets, crcs = {}, {}
+        pos = 0
+
+        def write(data):
+            nonlocal pos
+            f.write(data)
+            pos += len(data)
+
+        write(b"{\n")
+        for i, (name, body) in enumerate(prompts.items()):
+            write((",\n    " if i else "    ").encode('ascii') + json.dumps(name).encode('ascii') + b": ")
+            if body is None:
+                # Unchanged body: copy its literal straight from the old file.
+                with self._lock:
+                    start, end = self._offsets[name]
+                    literal = self._map[start:end]
+            else:
+                literal = json.dumps(body).encode('ascii')
+            offsets[name] = (pos, pos + len(literal))
+            crcs[name] = zlib.crc32(literal)
+            write(literal)
+        write(b"\n}")
+        return offsets, crcs
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_map()
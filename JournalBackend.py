@@ -0,0 +1,205 @@
+# Append-only journal storage for PromptStore.
+#
+# The library lives in a promptData.json snapshot (same format as the plain
+# JSON backend) plus a promptData.journal operation log next to it. A save
+# appends one JSON line per put/rename/delete, so its cost follows the size of
+# the change rather than the size of the library. Compaction folds the journal
+# back into the snapshot once it grows past a threshold, or at shutdown.
+#
+# The journal's first line names the snapshot it applies to. Before a
+# compaction replaces the snapshot it appends a "folded" record naming the new
+# one, so a journal left behind by a crash in between is recognized as already
+# folded. A journal whose snapshot changed for any other reason (touched,
+# restored, rewritten by a sync tool) is still replayed, and the next save
+# folds it into a fresh snapshot rather than discarding it.
+
+from __future__ import annotations
+
+import json
+import os
+
+from PromptStore import Change, JsonFileBackend, StorageBackend, atomic_write, file_signature
+
+
+class JournalBackend(JsonFileBackend):
+    """Snapshot plus operation log; see the module comment for the layout."""
+
+    name = "journal"
+    journal_filename = "promptData.journal"
+    incremental_save = True
+
+    # Compact once the journal is both larger than COMPACT_MIN_BYTES and larger
+    # than COMPACT_RATIO times the snapshot, or holds COMPACT_MAX_RECORDS ops.
+    COMPACT_MIN_BYTES = 1024 * 1024
+    COMPACT_RATIO = 0.5
+    COMPACT_MAX_RECORDS = 10000
+
+    def __init__(self, directory: str, compact_min_bytes=None, compact_ratio=None, compact_max_records=None):
+        super().__init__(directory)
+        if compact_min_bytes is not None:
+            self.COMPACT_MIN_BYTES = compact_min_bytes
+        if compact_ratio is not None:
+            self.COMPACT_RATIO = compact_ratio
+        if compact_max_records is not None:
+            self.COMPACT_MAX_RECORDS = compact_max_records
+        self._journal_records = 0
+        # Signature of the snapshot this instance loaded or last wrote; the
+        # journal is only ever appended on top of that exact snapshot.
+        self._base_signature = None
+        # The journal on disk cannot take appends (a torn final line, or a
+        # header naming another snapshot); the next save writes a snapshot.
+        self._journal_stale = False
+        self._journal_end = None  # Bytes of intact journal lines, if a torn line follows them
+
+    @classmethod
+    def detect(cls, directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, cls.journal_filename))
+
+    @property
+    def journal_path(self) -> str:
+        return os.path.join(self.directory, self.journal_filename)
+
+    def _snapshot_signature(self):
+        """Identifies the snapshot a journal was started against."""
+        return file_signature(self.path)
+
+    def signature(self):
+        return [self._snapshot_signature(), file_signature(self.journal_path)]
+
+    # --- Loading ---
+
+    def load(self) -> dict[str, str]:
+        prompts = super().load()
+        self._journal_records = 0
+        self._journal_stale = False
+        self._journal_end = None
+        self._base_signature = self._snapshot_signature()
+        if not os.path.exists(self.journal_path):
+            return prompts
+
+        with open(self.journal_path, 'rb') as f:
+            first = f.readline()
+            header = self._read_record(first.decode('utf-8', 'replace'))
+            end = len(first)
+            records = []
+            for line in f:
+                record = self._read_record(line.decode('utf-8', 'replace'))
+                if record is None:
+                    # Torn final write; everything before it is intact, but
+                    # appending after it would strand the new records.
+                    self._journal_stale = True
+                    self._journal_end = end
+                    break
+                records.append(record)
+                end += len(line)
+        if first and not header:
+            self._journal_stale = True
+            self._journal_end = 0
+        if header and header.get("snapshot") != self._base_signature:
+            if records and records[-1].get("op") == "folded" and records[-1].get("snapshot") == self._base_signature:
+                return prompts  # A compaction wrote this snapshot, then crashed before emptying the journal
+            self._journal_stale = True
+        for record in records:
+            self._replay(prompts, record)
+        self._journal_records = len(records)
+        return prompts
+
+    # Records can delete or rename prompts seen earlier, so nothing can be
+    # handed out before the journal has been replayed.
+    iter_load = StorageBackend.iter_load
+
+    @staticmethod
+    def _read_record(line):
+        if not line.endswith("\n"):
+            return None
+        try:
+            return json.loads(line)
+        except json.JSONDecodeError:
+            return None
+
+    @staticmethod
+    def _replay(prompts, record):
+        op = record.get("op")
+        name = record.get("name")
+        if op == "put":
+            prompts[name] = record["body"]
+        elif op == "rename":
+            if name in prompts:
+                prompts[record["new_name"]] = prompts.pop(name)
+        elif op == "delete":
+            prompts.pop(name, None)
+
+    # --- Saving ---
+
+    def save(self, prompts: dict[str, str], changes: list[Change]) -> None:
+        if (self._snapshot_signature() != self._base_signature or self._base_signature is None
+                or self._journal_stale):
+            # New library, a snapshot we never loaded, one rewritten behind
+            # our back, or a journal that cannot be appended to: start over
+            # from a full snapshot of memory (which includes the journal).
+            self._write_snapshot(prompts)
+            return
+        if not changes:
+            return
+
+        lines = [json.dumps(self._record(change)) + "\n" for change in changes]
+        new_journal = self._journal_records == 0
+        with open(self.journal_path, 'w' if new_journal else 'a', encoding='utf-8') as f:
+            if new_journal:
+                f.write(json.dumps({"snapshot": self._snapshot_signature()}) + "\n")
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_records += len(lines)
+
+        if self._should_compact():
+            self.compact(prompts)
+
+    @staticmethod
+    def _record(change: Change) -> dict:
+        record = {"op": change.op, "name": change.name}
+        if change.op == "put":
+            record["body"] = change.body
+        elif change.op == "rename":
+            record["new_name"] = change.new_name
+        return record
+
+    def _should_compact(self) -> bool:
+        if self._journal_records >= self.COMPACT_MAX_RECORDS:
+            return True
+        try:
+            journal_size = os.path.getsize(self.journal_path)
+            snapshot_size = os.path.getsize(self.path)
+        except OSError:
+            return False
+        return journal_size >= self.COMPACT_MIN_BYTES and journal_size >= self.COMPACT_RATIO * snapshot_size
+
+    def compact(self, prompts: dict[str, str]) -> None:
+        """Rewrite the snapshot from memory and empty the journal."""
+        if self._journal_records == 0 and not self._journal_stale:
+            return
+        self._write_snapshot(prompts)
+
+    def _write_snapshot(self, prompts):
+        with atomic_write(self.path) as f:
+            json.dump(prompts, f, indent=4)
+            f.flush()
+            if self._journal_records:
+                # Name the new snapshot in the journal before it replaces the
+                # old one; see the module comment.
+                st = os.fstat(f.fileno())
+                with open(self.journal_path, 'r+', encoding='utf-8') as journal:
+                    if self._journal_end is not None:
+                        journal.truncate(self._journal_end)  # Cut a torn line off first
+                    journal.seek(0, os.SEEK_END)
+                    journal.write(json.dumps({"op": "folded", "snapshot": [st.st_size, st.st_mtime_ns]}) + "\n")
+                    journal.flush()
+                    os.fsync(journal.fileno())
+        self._base_signature = self._snapshot_signature()
+        # The empty journal file is kept so the directory is still detected
+        # as journal storage the next time it is opened.
+        with open(self.journal_path, 'w', encoding='utf-8'):
+            pass
+        self._journal_records = 0
+        self._journal_stale = False
+        self._journal_end = None
@@ -0,0 +1,394 @@
+# Benchmarks for PromptManager's storage backends, search and prompt list widgets.
+#
+# Generates synthetic libraries (1k/10k/100k prompts by default; 1M on request)
+# with a configurable body-size distribution, times the store, search and list
+# operations the app performs, and writes the timings as JSON so runs from two
+# commits can be compared:
+#
+#     python PromptBenchmark.py --output before.json
+#     ... change things ...
+#     python PromptBenchmark.py --output after.json --compare before.json
+#
+# Search queries are timed with the pure-Python scoring and, if NumPy is
+# installed, with the NumPy one, each right after an edit as the app re-runs
+# the active search then; a query runs on every keystroke, so these should
+# stay well under ~16 ms. Each operation reports its first run, which pays for
+# whatever a later run would find cached; the fastest is kept in the JSON too.
+# Storage and search benchmarks are headless. List benchmarks need a display; on a
+# server run them under a virtual one, e.g. `xvfb-run python PromptBenchmark.py`.
+# They are skipped (and recorded as skipped) when Tk cannot start.
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from PromptStore import BACKENDS, PromptStore
+from PromptLoader import BackgroundLoader
+from PromptStats import PromptStats
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_BODIES = "lognormal:400,1.0"
+DEFAULT_REPEAT = 3
+READ_SAMPLES = 100          # Bodies read per read_body measurement
+REGRESSION_THRESHOLD = 0.20 # Slowdown (fraction) reported as a regression
+NOISE_FLOOR = 0.001         # Ignore differences between timings below 1 ms
+
+WORDS = ("summarize translate explain review refactor draft outline rewrite "
+         "classify extract compare critique plan list describe answer test "
+         "email report code story poem table query document meeting customer").split()
+
+
+# --- Synthetic libraries ---
+
+def parse_body_sizes(spec: str):
+    """Return a function rng -> body length in characters.
+
+    Specs: "fixed:N", "uniform:MIN-MAX" or "lognormal:MEDIAN,SIGMA".
+    """
+    kind, _, params = spec.partition(":")
+    try:
+        if kind == "fixed":
+            size = int(params)
+            return lambda rng: size
+        if kind == "uniform":
+            low, high = (int(v) for v in params.split("-"))
+            return lambda rng: rng.randint(low, high)
+        if kind == "lognormal":
+            median, sigma = (float(v) for v in params.split(","))
+            mu = math.log(median)
+            return lambda rng: max(1, int(rng.lognormvariate(mu, sigma)))
+    except ValueError:
+        pass
+    raise argparse.ArgumentTypeError(f"Invalid body size spec '{spec}' (use fixed:N, uniform:MIN-MAX or lognormal:MEDIAN,SIGMA).")
+
+
+def make_body(rng, length: int) -> str:
+    words = []
+    total = 0
+    while total < length:
+        word = rng.choice(WORDS)
+        words.append(word)
+        total += len(word) + 1
+    return " ".join(words)[:length]
+
+
+def generate_library(count: int, body_size, seed: int = 0) -> dict[str, str]:
+    rng = random.Random(seed)
+    return {f"{rng.choice(WORDS)} prompt {i:07d}": make_body(rng, body_size(rng)) for i in range(count)}
+
+
+def write_library(directory: str, backend: str, prompts: dict[str, str]) -> None:
+    """Create a library in directory using the given backend's format."""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "promptData.json"), 'w') as f:
+        json.dump(prompts, f, indent=4)
+    # The JSON-based backends start from the plain file as it is.
+    store = PromptStore(directory, backend=backend)
+    if hasattr(store.backend, "import_json"):
+        store.backend.import_json(os.path.join(directory, "promptData.json"))
+    store.close(compact=False)
+
+
+# --- Timing ---
+
+def timed(func, repeat: int, setup=None):
+    """Run func() repeat times, after setup() if given; return the durations in seconds."""
+    runs = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    return runs
+
+
+class Results:
+    def __init__(self):
+        self.rows = []
+
+    def add(self, group, target, size, op, runs=None, skipped=None):
+        row = {"group": group, "target": target, "size": size, "op": op}
+        if skipped:
+            row["skipped"] = skipped
+        else:
+            row["seconds"] = runs[0]     # Cold: the first run pays for what later ones find cached
+            row["best"] = min(runs)
+            row["runs"] = runs
+        self.rows.append(row)
+        shown = f"skipped ({skipped})" if skipped else f"{runs[0] * 1000:10.2f} ms"
+        print(f"{group:8} {target:10} {size:>9,} {op:18} {shown}", flush=True)
+
+
+# --- Storage benchmarks ---
+
+def bench_storage(results, backend, size, prompts, repeat, workdir):
+    directory = os.path.join(workdir, f"{backend}-{size}")
+    write_library(directory, backend, prompts)
+    names = list(prompts)
+    rng = random.Random(size)
+
+    def open_store():
+        return PromptStore(directory, backend=backend)
+
+    def load():
+        store = open_store()
+        store.load()
+        store.close(compact=False)
+
+    results.add("storage", backend, size, "load", timed(load, repeat))
+
+    def first_batch():
+        store = open_store()
+        loader = BackgroundLoader(store)
+        loader.start()
+        while not loader.poll() and not loader.finished:
+            time.sleep(0.0005)
+        loader.cancel()
+        loader.join()
+        store.close(compact=False)
+
+    results.add("storage", backend, size, "load_first_batch", timed(first_batch, repeat))
+
+    store = open_store()
+    store.load()
+    sample = rng.sample(names, min(READ_SAMPLES, len(names)))
+
+    def read_bodies():
+        store._cache.clear()
+        for name in sample:
+            store.get(name)
+
+    results.add("storage", backend, size, "read_100_bodies", timed(read_bodies, repeat))
+
+    counter = iter(range(10 ** 9))
+
+    def edit_save():
+        store.put(rng.choice(names), f"edited body {next(counter)}")
+        store.save()
+
+    results.add("storage", backend, size, "edit_save", timed(edit_save, repeat))
+
+    def create_save():
+        store.put(f"zz new prompt {next(counter)}", "new body")
+        store.save()
+
+    results.add("storage", backend, size, "create_save", timed(create_save, repeat))
+
+    live = list(names)  # Kept in step with renames/deletes (store.names() would sort)
+
+    def rename_save():
+        index = rng.randrange(len(live))
+        old, live[index] = live[index], f"{live[index]} renamed {next(counter)}"
+        store.rename(old, live[index])
+        store.save()
+
+    results.add("storage", backend, size, "rename_save", timed(rename_save, repeat))
+
+    def delete_save():
+        index = rng.randrange(len(live))
+        live[index], live[-1] = live[-1], live[index]
+        store.delete(live.pop())
+        store.save()
+
+    results.add("storage", backend, size, "delete_save", timed(delete_save, repeat))
+    results.add("storage", backend, size, "close_compact", timed(lambda: store.close(), 1))
+
+
+# --- Search benchmarks ---
+
+SEARCH_QUERIES = (
+    ("one_word", "review"),          # Matches most prompts
+    ("prefix", "re"),                # Expands to several common words
+    ("two_words", "review draft"),
+    ("rare", "0000042"),             # A single prompt
+)
+
+
+def bench_search(results, size, prompts, repeat):
+    import PromptSearch
+    numpy = PromptSearch.np
+    rng = random.Random(size)
+    names = list(prompts)
+    try:
+        for target, module in (("python", None), ("numpy", numpy)):
+            if target == "numpy" and numpy is None:
+                results.add("search", target, size, "rebuild", skipped="numpy not installed")
+                continue
+            PromptSearch.np = module
+            # Rebuilt per target: what it prepares for queries differs.
+            index = PromptSearch.SearchIndex()
+            results.add("search", target, size, "rebuild", timed(lambda: index.rebuild(prompts.items()), 1))
+
+            def edit():
+                name = rng.choice(names)
+                index.add(name, prompts[name] + " edited")
+
+            for op, query in SEARCH_QUERIES:
+                results.add("search", target, size, op, timed(lambda: index.search(query), repeat, setup=edit))
+    finally:
+        PromptSearch.np = numpy
+
+
+# --- List benchmarks ---
+
+def bench_lists(results, size, names, repeat):
+    try:
+        import tkinter as tk
+        from PromptListView import STAT_COLUMNS, SortedTreeList, VirtualTreeList
+        root = tk.Tk()
+    except Exception as e:  # No tkinter, or no display to open
+        for target in ("tree", "virtual"):
+            results.add("list", target, size, "set_names", skipped=str(e).splitlines()[0])
+        return
+    root.geometry("600x450")
+    rng = random.Random(size)
+    counter = iter(range(10 ** 9))
+    stats = PromptStats()
+    stats.rebuild((name, "word " * rng.randrange(1, 400)) for name in names)
+    try:
+        for target, list_class in (("tree", SortedTreeList), ("virtual", VirtualTreeList)):
+            widget = list_class(root, columns=STAT_COLUMNS, row_values=lambda name: (name, *stats.get(name)))
+            widget.grid(row=0, column=0, sticky='nsew')
+
+            def set_names():
+                widget.set_names(names)
+                root.update()
+
+            results.add("list", target, size, "set_names", timed(set_names, repeat))
+            reverse = iter(range(10 ** 9))
+
+            def sort_by_size():
+                widget.set_order(stats.order("size", reverse=next(reverse) % 2 == 1))
+                root.update()
+
+            results.add("list", target, size, "sort_by_size", timed(sort_by_size, repeat))
+            widget.set_order(None)
+            live = list(names)
+
+            def insert():
+                widget.insert(f"{rng.choice(WORDS)} inserted {next(counter)}")
+                root.update()
+
+            results.add("list", target, size, "insert", timed(insert, repeat))
+
+            def rename():
+                index = rng.randrange(len(live))
+                old, live[index] = live[index], f"{live[index]} renamed {next(counter)}"
+                widget.rename(old, live[index])
+                root.update()
+
+            results.add("list", target, size, "rename", timed(rename, repeat))
+
+            def remove():
+                index = rng.randrange(len(live))
+                live[index], live[-1] = live[-1], live[index]
+                widget.remove(live.pop())
+                root.update()
+
+            results.add("list", target, size, "remove", timed(remove, repeat))
+            widget.frame.destroy()
+    finally:
+        root.destroy()
+
+
+# --- Comparing runs ---
+
+def _key(row):
+    return (row["group"], row["target"], row["size"], row["op"])
+
+
+def compare(old_path, rows, threshold=REGRESSION_THRESHOLD):
+    """Print timing ratios against an earlier results file; return the regressions."""
+    with open(old_path, 'r') as f:
+        old = {_key(row): row for row in json.load(f)["results"] if "seconds" in row}
+    regressions = []
+    print(f"\nCompared with {old_path}:")
+    for row in rows:
+        before = old.get(_key(row))
+        if before is None or "seconds" not in row:
+            continue
+        ratio = row["seconds"] / before["seconds"] if before["seconds"] else float("inf")
+        slower = ratio > 1 + threshold and row["seconds"] - before["seconds"] > NOISE_FLOOR
+        flag = "  REGRESSION" if slower else ""
+        print(f"{row['group']:8} {row['target']:10} {row['size']:>9,} {row['op']:18} "
+              f"{before['seconds'] * 1000:10.2f} -> {row['seconds'] * 1000:10.2f} ms  x{ratio:.2f}{flag}")
+        if slower:
+            regressions.append(row)
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark PromptManager storage, search and list operations.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="Library sizes to generate (e.g. 1000 10000 100000 1000000).")
+    parser.add_argument("--bodies", type=parse_body_sizes, default=parse_body_sizes(DEFAULT_BODIES),
+                        metavar="SPEC", help="Body length distribution: fixed:N, uniform:MIN-MAX or "
+                                             f"lognormal:MEDIAN,SIGMA (default {DEFAULT_BODIES}).")
+    parser.add_argument("--backends", nargs="+", choices=sorted(BACKENDS), default=sorted(BACKENDS))
+    parser.add_argument("--no-storage", action="store_true", help="Skip the storage benchmarks.")
+    parser.add_argument("--no-search", action="store_true", help="Skip the search benchmarks.")
+    parser.add_argument("--no-lists", action="store_true", help="Skip the list widget benchmarks.")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Runs per operation; the first is reported.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results to this JSON file.")
+    parser.add_argument("--compare", metavar="OLD_JSON", help="Compare with an earlier results file; exit 1 on regressions.")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="Slowdown fraction counted as a regression (default 0.2).")
+    parser.add_argument("--workdir", help="Where to generate libraries (default: a temporary directory, removed afterwards).")
+    args = parser.parse_args(argv)
+
+    results = Results()
+    workdir = args.workdir or tempfile.mkdtemp(prefix="prompt-bench-")
+    try:
+        for size in args.sizes:
+            prompts = generate_library(size, args.bodies, args.seed)
+            if not args.no_storage:
+                for backend in args.backends:
+                    bench_storage(results, backend, size, prompts, args.repeat, workdir)
+            if not args.no_search:
+                bench_search(results, size, prompts, args.repeat)
+            if not args.no_lists:
+                bench_lists(results, size, list(prompts), args.repeat)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "argv": sys.argv[1:] if argv is None else list(argv),
+        },
+        "results": results.rows,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare and compare(args.compare, results.rows, args.threshold):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+# Body display for the view/edit screen.
+#
+# BodyView wraps the screen's Text widget. Bodies are inserted in chunks from
+# idle callbacks so multi-megabyte prompts do not freeze the window, unsaved
+# edits are tracked with the Text widget's modified flag instead of comparing
+# the whole buffer with the stored body, and bodies above PREVIEW_CHARS can be
+# shown as a read-only, paged preview until the full text is actually needed.
+
+import tkinter as tk
+from tkinter import ttk
+
+from PromptMetrics import metrics
+
+
+class BodyView:
+    """Scrollable Text for one prompt body, filled incrementally."""
+
+    CHUNK_CHARS = 64 * 1024           # Characters inserted per idle callback
+    PAGE_CHARS = 200 * 1024           # Characters per preview page
+    PREVIEW_CHARS = 2 * 1024 * 1024   # Bodies longer than this open as a paged preview
+
+    def __init__(self, parent):
+        self.frame = ttk.Frame(parent)
+        self.frame.columnconfigure(0, weight=1)
+        self.frame.rowconfigure(0, weight=1)
+        scrollbar = tk.Scrollbar(self.frame)
+        scrollbar.grid(row=0, column=1, sticky='ns')
+        self.text = tk.Text(self.frame, height=15, width=60, wrap=tk.WORD, state=tk.DISABLED, yscrollcommand=scrollbar.set)
+        self.text.grid(row=0, column=0, sticky='nsew')
+        scrollbar.config(command=self.text.yview)
+
+        # Page controls, only shown for paged previews.
+        self.page_bar = ttk.Frame(self.frame)
+        self.prev_button = ttk.Button(self.page_bar, text="< Previous", command=lambda: self.show_page(self.page - 1))
+        self.prev_button.pack(side=tk.LEFT, padx=5)
+        self.page_label = ttk.Label(self.page_bar)
+        self.page_label.pack(side=tk.LEFT, padx=5)
+        self.next_button = ttk.Button(self.page_bar, text="Next >", command=lambda: self.show_page(self.page + 1))
+        self.next_button.pack(side=tk.LEFT, padx=5)
+        ttk.Button(self.page_bar, text="Show Full Body", command=self.show_full).pack(side=tk.LEFT, padx=5)
+
+        self.body = ""
+        self.page = None          # Current preview page, None when showing the whole body
+        self._editable = False
+        self._after_id = None
+        self._on_loaded = None
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    # --- Filling ---
+
+    @property
+    def loading(self) -> bool:
+        """True while chunks of the body are still being inserted."""
+        return self._after_id is not None
+
+    @property
+    def paged(self) -> bool:
+        return self.page is not None
+
+    def show(self, body: str, preview: bool | None = None, on_loaded=None) -> None:
+        """Display body; preview=None pages bodies longer than PREVIEW_CHARS.
+
+        on_loaded() is called once the whole body is in the widget (not for
+        a preview, which never holds the whole body).
+        """
+        self.body = body
+        if preview is None:
+            preview = len(body) > self.PREVIEW_CHARS
+        if preview:
+            self.cancel()
+            self.show_page(0)
+        else:
+            self.show_full(on_loaded)
+
+    def show_full(self, on_loaded=None) -> None:
+        """Insert the whole body, chunk by chunk from idle callbacks."""
+        self.cancel()
+        self.page = None
+        self.page_bar.grid_forget()
+        self._on_loaded = on_loaded
+        self._replace("")
+        self._insert_from(0)
+
+    def _insert_from(self, pos):
+        body = self.body
+        end = min(len(body), pos + self.CHUNK_CHARS)
+        if end < len(body):
+            # Break after a newline where possible; Tk re-lays out the whole
+            # line each time text is appended to it.
+            newline = body.rfind("\n", pos, end)
+            if newline > pos:
+                end = newline + 1
+        with metrics.span("ui.body_chunk"):
+            self.text.config(state=tk.NORMAL)
+            self.text.insert(tk.END, body[pos:end])
+            if not self._editable:
+                self.text.config(state=tk.DISABLED)
+        if end < len(body):
+            self._after_id = self.text.after_idle(self._insert_from, end)
+            return
+        self._after_id = None
+        self.text.edit_modified(False)
+        self.text.edit_reset()
+        on_loaded, self._on_loaded = self._on_loaded, None
+        if on_loaded is not None:
+            on_loaded()
+
+    def show_page(self, page: int) -> None:
+        pages = self.page_count()
+        self.page = max(0, min(page, pages - 1))
+        start = self.page * self.PAGE_CHARS
+        self._replace(self.body[start:start + self.PAGE_CHARS])
+        self.text.edit_modified(False)
+        self.page_label.config(text=f"Preview page {self.page + 1} of {pages} ({len(self.body):,} characters)")
+        self.prev_button.config(state=tk.NORMAL if self.page > 0 else tk.DISABLED)
+        self.next_button.config(state=tk.NORMAL if self.page < pages - 1 else tk.DISABLED)
+        self.page_bar.grid(row=1, column=0, columnspan=2, pady=(5, 0))
+
+    def page_count(self) -> int:
+        return max(1, -(-len(self.body) // self.PAGE_CHARS))
+
+    def _replace(self, text):
+        self.text.config(state=tk.NORMAL)
+        self.text.delete("1.0", tk.END)
+        if text:
+            self.text.insert("1.0", text)
+        if not self._editable:
+            self.text.config(state=tk.DISABLED)
+        self.text.yview_moveto(0)
+
+    def cancel(self):
+        """Stop inserting chunks of the current body."""
+        if self._after_id is not None:
+            self.text.after_cancel(self._after_id)
+            self._after_id = None
+        self._on_loaded = None
+
+    # --- Editing ---
+
+    def set_editable(self, editable: bool) -> None:
+        self._editable = editable
+        self.text.config(state=tk.NORMAL if editable else tk.DISABLED)
+
+    @property
+    def modified(self) -> bool:
+        """True if the user changed the text since it was shown."""
+        return bool(self.text.edit_modified())
+
+    def get(self) -> str:
+        return self.text.get("1.0", "end-1c")
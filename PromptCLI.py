@@ -0,0 +1,328 @@
+# Command-line access to a prompt library, without the GUI.
+#
+#     python PromptCLI.py list
+#     python PromptCLI.py get "Code review"
+#     python PromptCLI.py render "Code review" -v language=Python --wrap
+#     echo "New body" | python PromptCLI.py put "Scratch"
+#
+# The library is the one in --dir (default: $PROMPT_DIR, else the current
+# directory), in whatever storage format PromptManager finds there. tkinter is
+# never imported, and modules a command does not use (search, templates, the
+# storage backends of other formats) are imported only when needed. Lookups
+# (get, render, search) read just what they need from disk instead of loading
+# the whole library where the storage format allows it.
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+from PromptStore import PromptNotFoundError, PromptStore, PromptStoreError, StorageBackend
+
+DIR_ENV_VAR = "PROMPT_DIR"
+
+
+class _DiskPrompts:
+    """The parts of PromptStore a TemplateEngine uses, reading each prompt from disk."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def get(self, name):
+        return self.store.read(name)
+
+    def __contains__(self, name):
+        return self.store.backend.fetch(name) is not None
+
+    def add_listener(self, callback):
+        pass  # Nothing changes underneath a one-off command.
+
+    def remove_listener(self, callback):
+        pass
+
+
+def _open(args, must_exist=True):
+    store = PromptStore(args.dir, backend=args.backend)
+    if must_exist and not store.exists():
+        raise PromptStoreError(f"No prompt library in '{args.dir}'.")
+    return store
+
+
+def _loaded(args, must_exist=True):
+    store = _open(args, must_exist)
+    if store.exists():
+        store.load()
+    return store
+
+
+def _fetches_cheaply(store):
+    """True if the backend can read one prompt without loading the whole library."""
+    return type(store.backend).fetch is not StorageBackend.fetch
+
+
+def _write(text):
+    sys.stdout.write(text)
+    if not text.endswith("\n"):
+        sys.stdout.write("\n")
+
+
+# --- Commands ---
+
+def cmd_list(args):
+    store = _loaded(args)
+    for name in store.names():
+        if name.startswith(args.prefix):
+            print(name)
+
+
+def cmd_get(args):
+    _write(_open(args).read(args.name))
+
+
+def cmd_search(args):
+    from PromptSearch import BackendSearch, SearchIndex
+    store = _open(args)
+    if getattr(store.backend, "has_fts", False):
+        index = BackendSearch(store)
+    else:
+        index = SearchIndex.open_persisted(store)
+        if index is None:
+            # No current index on disk: build one and keep it for next time.
+            store.load()
+            index = SearchIndex(store)
+            index.rebuild(store.items())
+            index.persist()
+    for name in index.search(args.query, args.limit):
+        print(name)
+
+
+def _similarity_index(args):
+    from PromptSimilarity import SimilarityIndex
+    store = _open(args)
+    index = SimilarityIndex.open_persisted(store)
+    if index is None:
+        # No current index on disk: build one and keep it for next time.
+        store.load()
+        index = SimilarityIndex(store)
+        index.rebuild(store.items())
+        index.persist()
+    return index
+
+
+def cmd_similar(args):
+    index = _similarity_index(args)
+    if args.name not in index:
+        raise PromptNotFoundError(args.name)
+    for name, score in index.similar(args.name, args.threshold, args.limit):
+        print(f"{score:.0%}\t{name}")
+
+
+def cmd_duplicates(args):
+    for group in _similarity_index(args).duplicate_groups(args.threshold):
+        print("\t".join(group))
+
+
+def cmd_render(args):
+    from PromptTemplate import DEFAULT_WRAPPER, TemplateEngine
+    values = {}
+    for assignment in args.var:
+        key, sep, value = assignment.partition("=")
+        if not sep:
+            raise ValueError(f"Expected NAME=VALUE, got '{assignment}'.")
+        values[key] = value
+    wrapper = args.wrapper or (DEFAULT_WRAPPER if args.wrap else None)
+    store = _open(args)
+    if _fetches_cheaply(store):
+        source = _DiskPrompts(store)
+    else:
+        store.load()  # Once, rather than once per included prompt
+        source = store
+    engine = TemplateEngine(source)
+    _write(engine.render_wrapped(args.name, values, wrapper, strict=args.strict))
+
+
+def _history(store):
+    from PromptHistory import PromptHistory
+    history = PromptHistory(store.directory)
+    history.attach(store)  # Renames and deletes carry the history along
+    return history
+
+
+def cmd_put(args):
+    body = (args.body if args.body is not None else sys.stdin.read()).strip()  # Stripped like the GUI does
+    if not body:
+        raise ValueError("Prompt body cannot be empty.")
+    store = _loaded(args, must_exist=False)
+    previous = store.get(args.name) if args.name in store else None
+    store.put(args.name, body, overwrite=not args.no_overwrite)
+    store.save()
+    store.close(compact=False)
+    if previous is not None:
+        _history(store).record(args.name, body, previous)  # Edits are kept like the GUI's
+
+
+def cmd_rename(args):
+    store = _loaded(args)
+    _history(store)
+    store.rename(args.old_name, args.new_name)
+    store.save()
+    store.close(compact=False)
+
+
+def cmd_delete(args):
+    store = _loaded(args)
+    _history(store)
+    store.delete(args.name)
+    store.save()
+    store.close(compact=False)
+
+
+def cmd_history(args):
+    from PromptHistory import PromptHistory
+    store = _open(args)
+    history = PromptHistory(store.directory)
+    if args.show is not None:
+        _write(history.body(args.name, args.show))
+        return
+    for revision in reversed(history.revisions(args.name)):
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(revision.time))
+        print(f"{revision.number}\t{stamp}\t{revision.size}")
+
+
+def cmd_serve(args):
+    from PromptServer import PromptServer, PromptService
+    service = PromptService.open(args.dir, args.backend)
+    server = PromptServer(service, host=args.host, port=args.port, socket_path=args.socket, verbose=args.verbose)
+    print(f"Serving {len(service.store)} prompts on {server.address} (Ctrl+C to stop).", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+def cmd_import(args):
+    from PromptTransfer import import_prompts, iter_file
+    store = _loaded(args, must_exist=False)
+    replaced = []
+    result = import_prompts(store, iter_file(args.file), policy=args.on_conflict,
+                            dedup=not args.keep_duplicates, batch_size=args.batch_size, replaced=replaced)
+    store.close(compact=False)
+    if replaced:
+        history = _history(store)
+        for name, body, previous in replaced:
+            history.record(name, body, previous)  # Overwritten bodies stay in the history, like put's
+    print(f"Imported from '{args.file}': {result}.", file=sys.stderr)
+
+
+def cmd_export(args):
+    from PromptTransfer import export_json, export_jsonl, export_file
+    store = _loaded(args)
+    if args.file in (None, "-"):
+        (export_jsonl if args.jsonl else export_json)(store, sys.stdout)
+    else:
+        export_file(store, args.file)
+
+
+# --- Entry point ---
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Work with a PromptManager prompt library from the command line.")
+    parser.add_argument("--dir", default=os.environ.get(DIR_ENV_VAR, "."),
+                        help=f"Prompt directory (default: ${DIR_ENV_VAR}, else the current directory).")
+    parser.add_argument("--backend", default=None,
+                        help="Storage format (json, journal, indexed, sqlite, sharded, blobs); detected by default.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    sub = commands.add_parser("list", help="Print all prompt names.")
+    sub.add_argument("--prefix", default="", help="Only names starting with this.")
+    sub.set_defaults(func=cmd_list)
+
+    sub = commands.add_parser("get", help="Print one prompt's body.")
+    sub.add_argument("name")
+    sub.set_defaults(func=cmd_get)
+
+    sub = commands.add_parser("search", help="Print the names of prompts matching a query, best first.")
+    sub.add_argument("query")
+    sub.add_argument("--limit", type=int, default=20)
+    sub.set_defaults(func=cmd_search)
+
+    sub = commands.add_parser("similar", help="Print the prompts whose bodies are most like a prompt's, with their similarity.")
+    sub.add_argument("name")
+    sub.add_argument("--threshold", type=float, default=0.5, help="Minimum estimated similarity, 0 to 1 (default: 0.5).")
+    sub.add_argument("--limit", type=int, default=20)
+    sub.set_defaults(func=cmd_similar)
+
+    sub = commands.add_parser("duplicates", help="Print groups of near-identical prompts, one tab-separated group per line.")
+    sub.add_argument("--threshold", type=float, default=0.8, help="Minimum estimated similarity, 0 to 1 (default: 0.8).")
+    sub.set_defaults(func=cmd_duplicates)
+
+    sub = commands.add_parser("render", help="Print a prompt with includes expanded and variables filled in.")
+    sub.add_argument("name")
+    sub.add_argument("-v", "--var", action="append", default=[], metavar="NAME=VALUE", help="A variable value (repeatable).")
+    sub.add_argument("--wrap", action="store_true", help="Add the Copy Prompt button's default wrapper.")
+    sub.add_argument("--wrapper", metavar="NAME", help="Wrap the result with this wrapper prompt instead.")
+    sub.add_argument("--strict", action="store_true", help="Fail if a variable has no value.")
+    sub.set_defaults(func=cmd_render)
+
+    sub = commands.add_parser("put", help="Create or replace a prompt; the body is read from stdin if not given.")
+    sub.add_argument("name")
+    sub.add_argument("body", nargs="?")
+    sub.add_argument("--no-overwrite", action="store_true", help="Fail if the prompt already exists.")
+    sub.set_defaults(func=cmd_put)
+
+    sub = commands.add_parser("rename", help="Rename a prompt.")
+    sub.add_argument("old_name")
+    sub.add_argument("new_name")
+    sub.set_defaults(func=cmd_rename)
+
+    sub = commands.add_parser("delete", help="Delete a prompt.")
+    sub.add_argument("name")
+    sub.set_defaults(func=cmd_delete)
+
+    sub = commands.add_parser("history", help="List a prompt's stored versions (number, time, characters), newest first.")
+    sub.add_argument("name")
+    sub.add_argument("--show", type=int, metavar="NUMBER", help="Print the body of this version instead.")
+    sub.set_defaults(func=cmd_history)
+
+    sub = commands.add_parser("serve", help="Keep the library loaded and answer lookups from other programs "
+                                            "over localhost HTTP or a Unix socket (see PromptServer.py).")
+    sub.add_argument("--host", default="127.0.0.1")
+    sub.add_argument("--port", type=int, default=8765)
+    sub.add_argument("--socket", metavar="PATH", help="Listen on this Unix domain socket instead of TCP.")
+    sub.add_argument("--verbose", action="store_true", help="Log every request to standard error.")
+    sub.set_defaults(func=cmd_serve)
+
+    sub = commands.add_parser("import", help="Add prompts from a .jsonl file (one {\"name\", \"body\"} object per line) "
+                                             "or a JSON dictionary file like promptData.json.")
+    sub.add_argument("file")
+    sub.add_argument("--on-conflict", choices=("skip", "overwrite", "rename"), default="skip",
+                     help="What to do when a name already exists (default: skip; rename adds 'Name (2)').")
+    sub.add_argument("--keep-duplicates", action="store_true", help="Also import prompts whose body is already in the library.")
+    sub.add_argument("--batch-size", type=int, default=None,
+                     help="Save after this many prompts (0: only at the end). By default only the journal, SQLite "
+                          "and blobs formats save in batches; the others rewrite whole files on every save.")
+    sub.set_defaults(func=cmd_import)
+
+    sub = commands.add_parser("export", help="Write every prompt to a .jsonl file, or a JSON dictionary for other extensions.")
+    sub.add_argument("file", nargs="?", help="Output file (default: standard output).")
+    sub.add_argument("--jsonl", action="store_true", help="Write JSON Lines to standard output instead of a dictionary.")
+    sub.set_defaults(func=cmd_export)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        args.func(args)
+    except (PromptStoreError, OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+# Diagnostics window: live view of the PromptMetrics timings and counters.
+
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
+
+from PromptMetrics import metrics
+
+
+class DiagnosticsWindow(tk.Toplevel):
+    """Table of span latencies and counters, refreshed while the window is open."""
+
+    REFRESH_MS = 1000
+    COLUMNS = (("count", "Count", 70), ("p50_ms", "p50 ms", 80), ("p95_ms", "p95 ms", 80),
+               ("max_ms", "Max ms", 80), ("total_ms", "Total ms", 90))
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.title("Prompt Manager Diagnostics")
+        self.geometry("620x380")
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(1, weight=1)
+
+        self.enabled_var = tk.BooleanVar(value=metrics.enabled)
+        ttk.Checkbutton(self, text="Record timings", variable=self.enabled_var,
+                        command=lambda: metrics.enable(self.enabled_var.get())).grid(row=0, column=0, sticky='w', padx=10, pady=(10, 5))
+
+        table_frame = ttk.Frame(self)
+        table_frame.grid(row=1, column=0, sticky='nsew', padx=10)
+        table_frame.columnconfigure(0, weight=1)
+        table_frame.rowconfigure(0, weight=1)
+        self.table = ttk.Treeview(table_frame, columns=[key for key, _, _ in self.COLUMNS], selectmode='none')
+        self.table.heading('#0', text="Operation", anchor='w')
+        self.table.column('#0', width=200, stretch=True)
+        for key, title, width in self.COLUMNS:
+            self.table.heading(key, text=title, anchor='e')
+            self.table.column(key, width=width, anchor='e', stretch=False)
+        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.table.yview)
+        self.table.configure(yscrollcommand=scrollbar.set)
+        self.table.grid(row=0, column=0, sticky='nsew')
+        scrollbar.grid(row=0, column=1, sticky='ns')
+
+        button_frame = ttk.Frame(self)
+        button_frame.grid(row=2, column=0, pady=10)
+        ttk.Button(button_frame, text="Reset", command=self.reset).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Save JSON...", command=self.save_json).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Save Chrome Trace...", command=self.save_trace).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Close", command=self.destroy).pack(side=tk.LEFT, padx=5)
+
+        self._after_id = None
+        self.refresh()
+
+    def destroy(self):
+        if self._after_id is not None:
+            self.after_cancel(self._after_id)
+            self._after_id = None
+        super().destroy()
+
+    def refresh(self):
+        if self._after_id is not None:
+            self.after_cancel(self._after_id)
+        snapshot = metrics.snapshot()
+        self.table.delete(*self.table.get_children())
+        for name, summary in snapshot["spans"].items():
+            self.table.insert('', tk.END, text=name, values=(
+                summary["count"], f"{summary['p50_ms']:.2f}", f"{summary['p95_ms']:.2f}",
+                f"{summary['max_ms']:.2f}", f"{summary['total_ms']:.1f}"))
+        for name, value in snapshot["counters"].items():
+            self.table.insert('', tk.END, text=name, values=(value, "", "", "", ""))
+        self._after_id = self.after(self.REFRESH_MS, self.refresh)
+
+    def reset(self):
+        metrics.reset()
+        self.refresh()
+
+    def save_json(self):
+        self._save(metrics.dump_json, "Save Timings", ".json", "metrics.json")
+
+    def save_trace(self):
+        self._save(metrics.dump_chrome_trace, "Save Chrome Trace", ".json", "trace.json")
+
+    def _save(self, dump, title, extension, initialfile):
+        path = filedialog.asksaveasfilename(parent=self, title=title, defaultextension=extension,
+                                            initialfile=initialfile, filetypes=[("JSON files", "*.json")])
+        if not path:
+            return
+        try:
+            dump(path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Error writing '{path}': {e}", parent=self)
@@ -0,0 +1,290 @@
+# Revision history for prompt bodies.
+#
+# Each prompt with a history has its own file in promptHistory/, named after
+# a hash of the prompt name, holding one JSON line per revision:
+#
+#     {"n": 7, "time": 1760781234.5, "size": 5120, "hash": "...", "key": true, "data": "..."}
+#
+# "data" is the zlib-compressed, base64-encoded revision: the whole body for a
+# keyframe ("key": true), otherwise the line edits that turn the previous
+# revision into this one, as [first line, end line, replacement text] triples.
+# Recording an edit appends one line whose size follows the size of the edit.
+# Every KEYFRAME_INTERVAL-th revision (and any edit bigger than half the
+# body) is a keyframe, so restoring a revision decodes at most
+# KEYFRAME_INTERVAL records, starting from the byte offset of its keyframe.
+# Once a prompt has more than MAX_REVISIONS revisions, the oldest keyframe
+# and its deltas are dropped. Revision numbers do not change when that happens.
+
+from __future__ import annotations
+
+import base64
+import difflib
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from typing import NamedTuple
+
+from PromptMetrics import metrics
+from PromptStore import PromptFormatError, PromptStoreError, atomic_write, file_signature
+
+HISTORY_DIRNAME = "promptHistory"
+
+
+class Revision(NamedTuple):
+    """One stored revision of a prompt body, as listed by PromptHistory.revisions()."""
+    number: int
+    time: float       # Seconds since the epoch
+    size: int         # Characters in the body
+    keyframe: bool
+
+
+class _Entry(NamedTuple):
+    revision: Revision
+    hash: str
+    offset: int       # Byte offset of the record's line in the history file
+
+
+def _digest(body: str) -> str:
+    return hashlib.blake2b(body.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def _pack(payload) -> str:
+    return base64.b64encode(zlib.compress(json.dumps(payload).encode('utf-8'))).decode('ascii')
+
+
+def _unpack(data: str):
+    return json.loads(zlib.decompress(base64.b64decode(data)))
+
+
+def diff_lines(old: str, new: str) -> list:
+    """Line edits turning old into new: [first line, end line, replacement text] triples."""
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    return [[i1, i2, "".join(new_lines[j1:j2])]
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != "equal"]
+
+
+def apply_diff(old: str, edits: list) -> str:
+    old_lines = old.splitlines(keepends=True)
+    pieces = []
+    pos = 0
+    for start, end, text in edits:
+        pieces.extend(old_lines[pos:start])
+        pieces.append(text)
+        pos = end
+    pieces.extend(old_lines[pos:])
+    return "".join(pieces)
+
+
+class PromptHistory:
+    """Per-prompt revision files in one prompt directory.
+
+    attach() a store so histories follow its renames and deletes; edits are
+    recorded explicitly with record(), since only the editor knows which
+    changes are worth keeping.
+    """
+
+    KEYFRAME_INTERVAL = 16
+    MAX_REVISIONS = 64
+
+    def __init__(self, directory: str, keyframe_interval: int | None = None, max_revisions: int | None = None):
+        self.directory = directory
+        if keyframe_interval is not None:
+            self.KEYFRAME_INTERVAL = keyframe_interval
+        if max_revisions is not None:
+            self.MAX_REVISIONS = max_revisions
+        self._lock = threading.Lock()
+        self.store = None                  # The attached store, if any
+        # name -> (file signature, entries) as last read or written, so an
+        # append does not have to re-read the file.
+        self._entries: dict[str, tuple] = {}
+
+    @property
+    def history_directory(self) -> str:
+        return os.path.join(self.directory, HISTORY_DIRNAME)
+
+    def path_for(self, name: str) -> str:
+        digest = hashlib.blake2b(name.encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(self.history_directory, digest + ".hist")
+
+    # --- Following a store ---
+
+    def attach(self, store) -> None:
+        self.store = store
+        store.add_listener(self.on_change)
+
+    def detach(self) -> None:
+        if self.store is not None:
+            self.store.remove_listener(self.on_change)
+            self.store = None
+
+    def on_change(self, change) -> None:
+        if change.op == "rename":
+            self.rename(change.name, change.new_name)
+        elif change.op == "delete":
+            self.delete(change.name)
+
+    def rename(self, old_name: str, new_name: str) -> None:
+        with self._lock:
+            old_path = self.path_for(old_name)
+            if os.path.exists(old_path):
+                os.replace(old_path, self.path_for(new_name))
+            self._entries.pop(old_name, None)
+            self._entries.pop(new_name, None)
+
+    def delete(self, name: str) -> None:
+        with self._lock:
+            try:
+                os.remove(self.path_for(name))
+            except FileNotFoundError:
+                pass
+            self._entries.pop(name, None)
+
+    # --- Reading ---
+
+    def _load_entries(self, name) -> list[_Entry]:
+        """Entries of name's history file, re-read only if the file changed on disk."""
+        path = self.path_for(name)
+        signature = file_signature(path)
+        cached = self._entries.get(name)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        entries = []
+        torn = False
+        if signature is not None:
+            with open(path, 'rb') as f:
+                offset = 0
+                for line in f:
+                    record = self._read_record(line)
+                    if record is None:
+                        torn = True
+                        break
+                    entries.append(_Entry(Revision(record["n"], record["time"], record["size"], bool(record.get("key"))),
+                                          record["hash"], offset))
+                    offset += len(line)
+        if torn:
+            # A torn final write: cut it off so later appends are not
+            # stranded behind it.
+            with open(path, 'r+b') as f:
+                f.truncate(offset)
+            signature = file_signature(path)
+        self._entries[name] = (signature, entries)
+        return entries
+
+    @staticmethod
+    def _read_record(line: bytes):
+        if not line.endswith(b"\n"):
+            return None
+        try:
+            return json.loads(line)
+        except json.JSONDecodeError:
+            return None
+
+    def revisions(self, name: str) -> list[Revision]:
+        """Stored revisions of name, oldest first."""
+        with self._lock:
+            return [entry.revision for entry in self._load_entries(name)]
+
+    @metrics.timed("history.restore")
+    def body(self, name: str, number: int) -> str:
+        """The body of revision number of name."""
+        with self._lock:
+            entries = self._load_entries(name)
+            target = next((i for i, entry in enumerate(entries) if entry.revision.number == number), None)
+            if target is None:
+                raise PromptStoreError(f"'{name}' has no revision {number}.")
+            start = target
+            while not entries[start].revision.keyframe:
+                start -= 1
+            with open(self.path_for(name), 'rb') as f:
+                f.seek(entries[start].offset)
+                body = None
+                for entry in entries[start:target + 1]:
+                    record = json.loads(f.readline())
+                    payload = _unpack(record["data"])
+                    body = payload if record.get("key") else apply_diff(body, payload)
+            if _digest(body) != entries[target].hash:
+                raise PromptFormatError(f"The history of '{name}' is damaged at revision {number}.")
+            return body
+
+    # --- Writing ---
+
+    @metrics.timed("history.record")
+    def record(self, name: str, body: str, previous: str | None = None) -> bool:
+        """Add body as the newest revision of name; returns False if it is already the newest.
+
+        previous is the body being replaced. If the history does not end with
+        it (the prompt is new to the history, or was changed by something that
+        does not record history), it is stored first so the change itself is
+        kept as well.
+        """
+        with self._lock:
+            entries = self._load_entries(name)
+            last_hash = entries[-1].hash if entries else None
+            pending = []
+            if previous is not None and _digest(previous) != last_hash:
+                pending.append(self._record(previous, None, entries, pending))
+                last_hash = pending[-1]["hash"]
+            if _digest(body) == last_hash:
+                if not pending:
+                    return False
+            else:
+                # Without previous the newest revision is unknown here, so body is stored whole.
+                pending.append(self._record(body, previous, entries, pending))
+            self._append(name, entries, pending)
+            return True
+
+    def _record(self, body, base, entries, pending) -> dict:
+        """A record for body, a delta against base where that is allowed and worth it."""
+        keyframes = [entry.revision.keyframe for entry in entries] + [bool(r.get("key")) for r in pending]
+        number = (pending[-1]["n"] if pending else entries[-1].revision.number if entries else 0) + 1
+        since_key = keyframes[::-1].index(True) if True in keyframes else None
+        # Trimming drops whole keyframe groups, so a group must fit in MAX_REVISIONS.
+        interval = min(self.KEYFRAME_INTERVAL, self.MAX_REVISIONS)
+        record = {"n": number, "time": time.time(), "size": len(body), "hash": _digest(body)}
+        if base is not None and since_key is not None and since_key + 1 < interval:
+            edits = diff_lines(base, body)
+            if sum(len(text) for _, _, text in edits) * 2 < len(body):
+                record["data"] = _pack(edits)
+                return record
+        record["key"] = True
+        record["data"] = _pack(body)
+        return record
+
+    def _append(self, name, entries, records):
+        path = self.path_for(name)
+        os.makedirs(self.history_directory, exist_ok=True)
+        with open(path, 'ab') as f:
+            offset = f.seek(0, os.SEEK_END)
+            for record in records:
+                line = (json.dumps(record, separators=(',', ':')) + "\n").encode('utf-8')
+                f.write(line)
+                entries.append(_Entry(Revision(record["n"], record["time"], record["size"], bool(record.get("key"))),
+                                      record["hash"], offset))
+                offset += len(line)
+        if len(entries) > self.MAX_REVISIONS:
+            self._trim(name, entries)
+        self._entries[name] = (file_signature(path), entries)
+
+    def _trim(self, name, entries):
+        """Drop the oldest keyframe groups until at most MAX_REVISIONS remain."""
+        keep = len(entries)
+        for i, entry in enumerate(entries):
+            if entry.revision.keyframe and len(entries) - i <= self.MAX_REVISIONS:
+                keep = len(entries) - i
+                break
+        if keep == len(entries):
+            return
+        path = self.path_for(name)
+        kept = entries[-keep:]
+        with open(path, 'rb') as f:
+            f.seek(kept[0].offset)
+            data = f.read()
+        with atomic_write(path, mode='wb') as f:
+            f.write(data)
+        shift = kept[0].offset
+        entries[:] = [entry._replace(offset=entry.offset - shift) for entry in kept]
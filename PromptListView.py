@@ -0,0 +1,613 @@
+# Prompt list widgets for the main screen.
+#
+# SortedTreeList keeps the Treeview in sync with a sorted Python list of names
+# and applies single-row diffs (insert at the bisected position, delete, move
+# on rename) instead of clearing and re-inserting every row after each edit.
+# VirtualTreeList shows the same sorted index through a fixed pool of rows, for
+# libraries too large to hold one Treeview item per prompt.
+#
+# Both can show extra columns (e.g. the PromptStats columns) through a
+# row_values callback and report heading clicks through on_sort. Given a
+# ColumnOrder instead of the default name order, they take the whole order
+# from its precomputed index and place single inserts with order.position().
+# Rows are found by bisecting in name order, and through a name -> position
+# dict (_Positions) in a column or search-rank order.
+
+import tkinter as tk
+from tkinter import ttk
+from tkinter import font as tkfont
+from bisect import bisect_left
+
+from PromptMetrics import metrics
+
+NAME_KEY = "name"   # The sort key on_sort reports for the name column
+
+# Extra columns the main screen shows: (sort key, heading, width).
+STAT_COLUMNS = (("size", "Size", 70), ("tokens", "Tokens", 70), ("modified", "Modified", 125), ("uses", "Uses", 50))
+
+_ARROWS = {False: " \u25b2", True: " \u25bc"}
+
+
+def _name_values(name):
+    return (name,)
+
+
+def _setup_columns(tree, name_column, columns, on_sort):
+    tree.heading(name_column, text=name_column)
+    tree.column(name_column, anchor='w')
+    for key, title, width in columns:
+        tree.heading(key, text=title)
+        tree.column(key, anchor='e', width=width, stretch=False)
+    if on_sort:
+        tree.heading(name_column, command=lambda: on_sort(NAME_KEY))
+        for key, _, _ in columns:
+            tree.heading(key, command=lambda key=key: on_sort(key))
+
+
+def _show_order(tree, name_column, columns, order):
+    """Mark the sorted column's heading with an arrow."""
+    sorted_key = order.column if order is not None else NAME_KEY
+    reverse = order is not None and order.reverse
+    for key, title in ((NAME_KEY, name_column),) + tuple((key, title) for key, title, _ in columns):
+        column = name_column if key == NAME_KEY else key
+        tree.heading(column, text=title + _ARROWS[reverse] if key == sorted_key and columns else title)
+
+
+class SortedTreeList:
+    """A Treeview of prompt names kept in sorted order (by name unless given a ColumnOrder)."""
+
+    COLUMN = 'Prompt Name'
+
+    def __init__(self, parent, on_select=None, on_activate=None, columns=(), row_values=None, on_sort=None):
+        self.frame = ttk.Frame(parent)
+        self.frame.columnconfigure(0, weight=1)
+        self.frame.rowconfigure(0, weight=1)
+
+        self.columns = tuple(columns)
+        self.row_values = row_values or _name_values
+        scroll = ttk.Scrollbar(self.frame, orient=tk.VERTICAL)
+        self.tree = ttk.Treeview(
+            self.frame,
+            columns=(self.COLUMN,) + tuple(key for key, _, _ in self.columns),
+            show='headings', # Don't show the default '#' column
+            yscrollcommand=scroll.set,
+            selectmode='browse' # Only allow selecting one item
+        )
+        scroll.config(command=self.tree.yview)
+        _setup_columns(self.tree, self.COLUMN, self.columns, on_sort)
+        self.tree.grid(row=0, column=0, sticky='nsew')
+        scroll.grid(row=0, column=1, sticky='ns')
+
+        if on_activate:
+            self.tree.bind("<Double-1>", on_activate)
+        if on_select:
+            self.tree.bind("<<TreeviewSelect>>", on_select)
+
+        self._names = []           # Sorted index; position == Treeview row index
+        self._positions = _Positions()
+        self._ranked = False       # True while showing search results in rank order
+        self._order = None         # ColumnOrder, or None for name order
+        self._iid_by_name = {}
+        self._name_by_iid = {}
+        self._next_iid = 0
+
+    def grid(self, **kwargs):
+        self.frame.grid(**kwargs)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._iid_by_name
+
+    # --- Selection ---
+
+    def selected_name(self):
+        selection = self.tree.selection()
+        if not selection:
+            return None
+        return self._name_by_iid.get(selection[0])
+
+    def select(self, name):
+        iid = self._iid_by_name.get(name)
+        if iid is not None:
+            self.tree.selection_set(iid)
+            self.tree.see(iid)
+
+    # --- Updates ---
+
+    @metrics.timed("list.set_names")
+    def set_names(self, names, ranked=False):
+        """Replace the whole list (used when a library is loaded).
+
+        With ranked=True the names are shown in the given order (search
+        results); later inserts then go to the end instead of being bisected.
+        """
+        selected = self.selected_name()
+        self.tree.delete(*self.tree.get_children())
+        self._ranked = ranked
+        self._names = _ordered(names, ranked, self._order)
+        self._positions.reset(self._names)
+        self._iid_by_name.clear()
+        self._name_by_iid.clear()
+        for name in self._names:
+            self.tree.insert('', tk.END, iid=self._new_iid(name), values=self.row_values(name))
+        if selected is not None:
+            self.select(selected)
+
+    @metrics.timed("list.set_order")
+    def set_order(self, order):
+        """Sort by a ColumnOrder (None: by name), moving the existing rows instead of re-inserting them.
+
+        The order must cover exactly the listed names unless search results
+        are shown, which keep their own order.
+        """
+        self._order = order
+        _show_order(self.tree, self.COLUMN, self.columns, order)
+        if self._ranked:
+            return
+        names = order.names() if order is not None else sorted(self._names)
+        iids = [self._iid_by_name.get(name) for name in names]
+        if len(iids) != len(self._iid_by_name) or None in iids:
+            self.set_names(names)  # The order lists other names (e.g. just imported ones)
+            return
+        self._names = names
+        self._positions.reset(names)
+        self.tree.set_children('', *iids)
+        selected = self.selected_name()
+        if selected is not None:
+            self.tree.see(self._iid_by_name[selected])
+
+    def insert(self, name):
+        """Add one name at its sorted position (no-op if already listed)."""
+        if name in self._iid_by_name:
+            return
+        index = self._insert_index(name)
+        top = self._top_index()
+        self._names.insert(index, name)
+        self._positions.inserted(name, index)
+        self.tree.insert('', index, iid=self._new_iid(name), values=self.row_values(name))
+        if index < top:
+            self._scroll_to(top + 1)
+
+    def refresh(self, name):
+        """Show name's current values, moving the row if its sort position changed."""
+        iid = self._iid_by_name.get(name)
+        if iid is None:
+            return
+        self.tree.item(iid, values=self.row_values(name))
+        if self._ranked or self._order is None:
+            return
+        old_index = self._index_of(name)
+        del self._names[old_index]
+        self._positions.removed(name, old_index)
+        new_index = self._insert_index(name)
+        self._names.insert(new_index, name)
+        self._positions.inserted(name, new_index)
+        if new_index != old_index:
+            self.tree.move(iid, '', new_index)
+
+    @metrics.timed("list.extend")
+    def extend(self, names):
+        """Add a batch of names, e.g. while a library is still streaming in."""
+        names = sorted(name for name in set(names) if name not in self._iid_by_name)
+        if not names:
+            return
+        if self._ranked or (self._order is None and (not self._names or names[0] > self._names[-1])):
+            # Everything goes after the current last row: append in one pass.
+            for name in names:
+                self._positions.inserted(name, len(self._names))
+                self._names.append(name)
+                self.tree.insert('', tk.END, iid=self._new_iid(name), values=self.row_values(name))
+        else:
+            for name in names:
+                self.insert(name)
+
+    def remove(self, name):
+        iid = self._iid_by_name.pop(name, None)
+        if iid is None:
+            return
+        index = self._index_of(name)
+        top = self._top_index()
+        del self._names[index]
+        self._positions.removed(name, index)
+        del self._name_by_iid[iid]
+        self.tree.delete(iid)
+        if index < top:
+            self._scroll_to(top - 1)
+
+    def rename(self, old_name, new_name):
+        """Move one row to the new name's position, keeping its item and selection."""
+        iid = self._iid_by_name.pop(old_name, None)
+        if iid is None:
+            self.insert(new_name)
+            return
+        top = self._top_index()
+        old_index = self._index_of(old_name)
+        del self._names[old_index]
+        self._positions.removed(old_name, old_index)
+        new_index = old_index if self._ranked else self._insert_index(new_name)
+        self._names.insert(new_index, new_name)
+        self._positions.inserted(new_name, new_index)
+        self._iid_by_name[new_name] = iid
+        self._name_by_iid[iid] = new_name
+        self.tree.item(iid, values=self.row_values(new_name))
+        self.tree.move(iid, '', new_index)
+        if old_index < top <= new_index:
+            self._scroll_to(top - 1)
+        elif new_index < top <= old_index:
+            self._scroll_to(top + 1)
+
+    # --- Internals ---
+
+    def _index_of(self, name):
+        if self._ranked or self._order is not None:
+            return self._positions.index(self._names, name)
+        return bisect_left(self._names, name)
+
+    def _insert_index(self, name):
+        return _insert_index(self._names, name, self._ranked, self._order)
+
+    def _new_iid(self, name):
+        iid = f"p{self._next_iid}"
+        self._next_iid += 1
+        self._iid_by_name[name] = iid
+        self._name_by_iid[iid] = name
+        return iid
+
+    def _top_index(self):
+        """Row index of the first visible row."""
+        if not self._names:
+            return 0
+        return int(round(self.tree.yview()[0] * len(self._names)))
+
+    def _scroll_to(self, index):
+        # Keeps the same rows on screen when a row is added or removed above them.
+        if self._names:
+            self.tree.yview_moveto(index / len(self._names))
+
+
+class VirtualTreeList:
+    """Prompt list that only materializes the rows currently on screen.
+
+    The full sorted name index lives in a Python list; the Treeview holds a
+    small pool of rows (viewport plus BUFFER_ROWS) whose values are swapped as
+    the user scrolls. Startup and memory no longer depend on library size.
+    Exposes the same interface as SortedTreeList; set_order() only swaps the
+    index, since rows are materialized on demand.
+    """
+
+    COLUMN = SortedTreeList.COLUMN
+    BUFFER_ROWS = 2
+    WHEEL_ROWS = 3
+    STYLE = 'Virtual.Treeview'
+
+    def __init__(self, parent, on_select=None, on_activate=None, columns=(), row_values=None, on_sort=None):
+        self.frame = ttk.Frame(parent)
+        self.frame.columnconfigure(0, weight=1)
+        self.frame.rowconfigure(0, weight=1)
+        self.columns = tuple(columns)
+        self.row_values = row_values or _name_values
+
+        # A fixed row height lets us turn the widget height into a row count.
+        linespace = tkfont.nametofont('TkDefaultFont').metrics('linespace')
+        self.row_height = linespace + 4
+        ttk.Style(parent).configure(self.STYLE, rowheight=self.row_height)
+
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.tree = ttk.Treeview(
+            self.frame,
+            columns=(self.COLUMN,) + tuple(key for key, _, _ in self.columns),
+            show='headings',
+            selectmode='browse',
+            style=self.STYLE,
+        )
+        _setup_columns(self.tree, self.COLUMN, self.columns, on_sort)
+        self.tree.grid(row=0, column=0, sticky='nsew')
+        self.scrollbar.grid(row=0, column=1, sticky='ns')
+
+        self._on_select = on_select
+        if on_activate:
+            self.tree.bind("<Double-1>", on_activate)
+        self.tree.bind("<<TreeviewSelect>>", self._on_tree_select)
+        self.tree.bind("<Configure>", lambda event: self._render())
+        self.tree.bind("<MouseWheel>", self._on_mousewheel)
+        self.tree.bind("<Button-4>", lambda event: self._scroll_by(-self.WHEEL_ROWS))
+        self.tree.bind("<Button-5>", lambda event: self._scroll_by(self.WHEEL_ROWS))
+        for key, handler in (
+            ("<Up>", lambda event: self._move_selection(-1)),
+            ("<Down>", lambda event: self._move_selection(1)),
+            ("<Prior>", lambda event: self._move_selection(-self._visible_rows())),
+            ("<Next>", lambda event: self._move_selection(self._visible_rows())),
+            ("<Home>", lambda event: self._move_selection(-len(self._names))),
+            ("<End>", lambda event: self._move_selection(len(self._names))),
+        ):
+            self.tree.bind(key, handler)
+
+        self._names = []         # Sorted index of every name
+        self._positions = _Positions()
+        self._ranked = False     # True while showing search results in rank order
+        self._order = None       # ColumnOrder, or None for name order
+        self._offset = 0         # Index of the first row on screen
+        self._selected = None    # Selected name; may be scrolled out of view
+        self._pool = []          # Treeview iids of the materialized rows
+        self._pool_names = []    # Name currently shown in each pooled row
+
+    def grid(self, **kwargs):
+        self.frame.grid(**kwargs)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._positions
+
+    def _index_of(self, name):
+        if name not in self._positions:
+            return None
+        if self._ranked or self._order is not None:
+            return self._positions.index(self._names, name)
+        return bisect_left(self._names, name)
+
+    # --- Selection ---
+
+    def selected_name(self):
+        return self._selected
+
+    def select(self, name):
+        if name not in self:
+            return
+        self._selected = name
+        self._ensure_visible(self._index_of(name))
+        self._render()
+
+    # --- Updates ---
+
+    @metrics.timed("list.set_names")
+    def set_names(self, names, ranked=False):
+        self._ranked = ranked
+        self._names = _ordered(names, ranked, self._order)
+        self._positions.reset(self._names)
+        if self._selected is not None and self._selected not in self:
+            self._selected = None
+        self._render()
+
+    @metrics.timed("list.set_order")
+    def set_order(self, order):
+        self._order = order
+        _show_order(self.tree, self.COLUMN, self.columns, order)
+        if self._ranked:
+            return
+        self._names = order.names() if order is not None else sorted(self._names)
+        self._positions.reset(self._names)
+        if self._selected is not None:
+            self._ensure_visible(self._index_of(self._selected))
+        self._render()
+
+    def insert(self, name):
+        if name in self:
+            return
+        index = _insert_index(self._names, name, self._ranked, self._order)
+        self._names.insert(index, name)
+        self._positions.inserted(name, index)
+        if index < self._offset:
+            self._offset += 1
+        self._render()
+
+    def refresh(self, name):
+        """Show name's current values, moving the row if its sort position changed."""
+        if name in self._pool_names:
+            self._pool_names[self._pool_names.index(name)] = None  # Re-read on the next render
+        if not self._ranked and self._order is not None and name in self:
+            index = self._index_of(name)
+            del self._names[index]
+            self._positions.removed(name, index)
+            index = _insert_index(self._names, name, False, self._order)
+            self._names.insert(index, name)
+            self._positions.inserted(name, index)
+        self._render()
+
+    @metrics.timed("list.extend")
+    def extend(self, names):
+        """Add a batch of names, e.g. while a library is still streaming in."""
+        names = [name for name in set(names) if name not in self]
+        if not names:
+            return
+        top = self._names[self._offset] if self._offset < len(self._names) else None
+        if self._ranked:
+            self._names.extend(sorted(names))
+        elif self._order is not None:
+            self._names = self._order.names()  # The order already holds the new names
+        else:
+            self._names = sorted(self._names + names)  # Merges two sorted runs
+        self._positions.reset(self._names)
+        if top is not None:
+            self._offset = self._index_of(top)  # Keep the same first row on screen
+        self._render()
+
+    def remove(self, name):
+        index = self._index_of(name)
+        if index is None:
+            return
+        del self._names[index]
+        self._positions.removed(name, index)
+        if index < self._offset:
+            self._offset -= 1
+        if self._selected == name:
+            self._selected = None
+        self._render()
+
+    def rename(self, old_name, new_name):
+        was_selected = self._selected == old_name
+        self.remove(old_name)
+        self.insert(new_name)
+        if was_selected:
+            self._selected = new_name
+            self._render()
+
+    # --- Viewport ---
+
+    def _visible_rows(self):
+        height = self.tree.winfo_height()
+        if height <= 1:  # Not laid out yet; fall back to the requested height.
+            height = int(self.tree.cget('height')) * self.row_height
+        # The heading takes roughly one row.
+        return max(1, height // self.row_height - 1)
+
+    def _clamp_offset(self):
+        max_offset = max(0, len(self._names) - self._visible_rows())
+        self._offset = min(max(0, self._offset), max_offset)
+
+    def _ensure_visible(self, index):
+        rows = self._visible_rows()
+        if index < self._offset:
+            self._offset = index
+        elif index >= self._offset + rows:
+            self._offset = index - rows + 1
+
+    def _render(self):
+        """Point the pooled rows at names[offset:offset + viewport + buffer]."""
+        self._clamp_offset()
+        rows = self._visible_rows()
+        wanted = self._names[self._offset:self._offset + rows + self.BUFFER_ROWS]
+
+        while len(self._pool) < len(wanted):
+            self._pool.append(self.tree.insert('', tk.END, values=('',) * (1 + len(self.columns))))
+            self._pool_names.append(None)
+        while len(self._pool) > len(wanted):
+            self.tree.delete(self._pool.pop())
+            self._pool_names.pop()
+
+        selected_iid = None
+        for i, name in enumerate(wanted):
+            if self._pool_names[i] != name:
+                self.tree.item(self._pool[i], values=self.row_values(name))
+                self._pool_names[i] = name
+            if name == self._selected:
+                selected_iid = self._pool[i]
+
+        current = self.tree.selection()
+        if selected_iid is None:
+            if current:
+                self.tree.selection_remove(*current)
+        elif current != (selected_iid,):
+            self.tree.selection_set(selected_iid)
+        self.tree.yview_moveto(0)
+
+        total = len(self._names)
+        if total:
+            self.scrollbar.set(self._offset / total, min(1.0, (self._offset + rows) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _scroll_by(self, rows):
+        self._offset += rows
+        self._render()
+        return "break"
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == 'moveto':
+            self._offset = int(float(amount) * len(self._names))
+            self._render()
+        elif action == 'scroll':
+            step = self._visible_rows() if unit == 'pages' else 1
+            self._scroll_by(int(amount) * step)
+
+    def _on_mousewheel(self, event):
+        # Windows reports multiples of 120 per notch; macOS reports small deltas.
+        notches = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        return self._scroll_by(-notches * self.WHEEL_ROWS)
+
+    def _move_selection(self, step):
+        if not self._names:
+            return "break"
+        index = None if self._selected is None else self._index_of(self._selected)
+        if index is None:
+            index = self._offset
+        else:
+            index += step
+        index = min(max(0, index), len(self._names) - 1)
+        self._selected = self._names[index]
+        self._ensure_visible(index)
+        self._render()
+        if self._on_select:
+            self._on_select()
+        return "break"
+
+    def _on_tree_select(self, event=None):
+        selection = self.tree.selection()
+        if selection and selection[0] in self._pool:
+            name = self._pool_names[self._pool.index(selection[0])]
+            if name is not None:
+                self._selected = name
+        # An empty Treeview selection just means the selected row scrolled
+        # out of view, so _selected is kept.
+        if self._on_select:
+            self._on_select(event)
+
+
+def _ordered(names, ranked, order):
+    if ranked:
+        return list(names)
+    if order is not None:
+        return order.names()
+    return sorted(names)
+
+
+class _Positions:
+    """Name -> index in a list of names, kept up to date as the list changes.
+
+    The list's owner reports every insert and removal. Entries from the first
+    changed index on are renumbered on the next lookup rather than straight
+    away, so a run of changes costs one pass at most.
+    """
+
+    def __init__(self, names=()):
+        self.reset(names)
+
+    def reset(self, names):
+        self._index = {name: i for i, name in enumerate(names)}
+        self._valid = len(self._index)  # Entries below this index are current
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def inserted(self, name, index):
+        self._index[name] = index
+        self._valid = min(self._valid, index)
+
+    def removed(self, name, index):
+        del self._index[name]
+        self._valid = min(self._valid, index)
+
+    def index(self, names, name):
+        """name's index in names (the list these positions follow), or None if it is not listed."""
+        position = self._index.get(name)
+        if position is None or position < self._valid:
+            return position
+        self._index.update(zip(names[self._valid:], range(self._valid, len(names))))
+        self._valid = len(names)
+        return self._index[name]
+
+
+def _insert_index(names, name, ranked, order):
+    """Where name goes in the listed names, which do not include it yet."""
+    if ranked:
+        return len(names)
+    if order is not None:
+        # The order already includes name, so its position counts every other listed name.
+        return order.position(name)
+    return bisect_left(names, name)
+
+
+LIST_MODES = ("auto", "tree", "virtual")
+
+# In "auto" mode libraries with at least this many prompts use VirtualTreeList.
+VIRTUAL_LIST_THRESHOLD = 5000
+
+
+def list_class_for(mode, count):
+    """Pick the list widget class for a list mode and library size."""
+    if mode == "virtual" or (mode == "auto" and count >= VIRTUAL_LIST_THRESHOLD):
+        return VirtualTreeList
+    return SortedTreeList
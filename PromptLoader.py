@@ -0,0 +1,112 @@
+# Background loading for PromptStore.
+#
+# A worker thread reads the library through the backend's iter_load() and
+# adds prompts to the store in batches. Each batch's names are queued for the
+# UI thread, which polls with poll() (from Tk's after()) so names can be shown
+# and selected while the rest of the file is still being read. Once everything
+# is read, an optional prepare(store) callback runs on the worker as well, for
+# work that needs the whole library (such as building indexes over it); the UI
+# thread gets its result as `prepared`.
+
+from __future__ import annotations
+
+import queue
+import threading
+
+from PromptMetrics import metrics
+
+
+class BackgroundLoader:
+    """Streams one PromptStore load on a worker thread."""
+
+    BATCH_SIZE = 2000
+
+    def __init__(self, store, batch_size: int = BATCH_SIZE, prepare=None):
+        self.store = store
+        self.batch_size = batch_size
+        self.prepare = prepare
+        self.progress = 0.0          # Fraction of the library read so far
+        self.count = 0               # Prompts handed to the UI so far
+        self.error = None            # Exception that ended the load, if any
+        self.preparing = False       # Everything is read and prepare() is running
+        self.prepared = None         # What prepare() returned; None if it failed
+        self.finished = False
+        self._queue = queue.Queue()
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        self.store.begin_load()
+        self._thread = threading.Thread(target=self._run, name="PromptLoader", daemon=True)
+        self._thread.start()
+
+    def cancel(self) -> None:
+        """Ask the worker to stop after its current batch."""
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def join(self, timeout: float | None = None) -> None:
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # --- Called from the UI thread ---
+
+    def poll(self) -> list[str]:
+        """Names added since the last poll. Sets finished once the worker is done.
+
+        When it finishes, the store's load is ended here (on the polling
+        thread, so store listeners run there): kept if the whole library was
+        read, dropped if it was cancelled or failed.
+        """
+        names = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self.finished = True
+                self.store.end_load(complete=self.error is None and not self.cancelled)
+                break
+            batch, self.progress = item
+            if not self.cancelled:
+                names.extend(batch)
+        self.count += len(names)
+        return names
+
+    # --- Worker thread ---
+
+    @metrics.timed("loader.run")
+    def _run(self):
+        batch = {}
+        try:
+            for name, body, progress in self.store.backend.iter_load():
+                batch[name] = body
+                if len(batch) >= self.batch_size:
+                    self._deliver(batch, progress)
+                    batch = {}
+                    if self._cancel.is_set():
+                        return
+            self._deliver(batch, 1.0)
+            if self.prepare is not None and not self._cancel.is_set():
+                self._prepare()
+        except Exception as e:
+            self.error = e
+        finally:
+            self._queue.put(None)
+
+    def _prepare(self):
+        self.preparing = True
+        try:
+            with metrics.span("loader.prepare"):
+                self.prepared = self.prepare(self.store)
+        except Exception:
+            pass  # The library itself loaded fine; the UI thread does the work instead.
+
+    def _deliver(self, batch, progress):
+        metrics.count("loader.prompts", len(batch))
+        self.store.add_loaded(batch)
+        self._queue.put((list(batch), progress))
@@ -1,20 +1,55 @@
 # Modified PromptManager.py using ttk.Treeview
 
+import os
+import time
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import json
-import os
+
+from PromptStore import PromptStore, PromptFormatError, PromptStoreError, ExternalChangeError
+from PromptWriter import WriteBehindWriter
+from PromptLoader import BackgroundLoader
+from PromptListView import NAME_KEY, STAT_COLUMNS, list_class_for
+from PromptBodyView import BodyView
+from PromptSearch import open_search
+from PromptSimilarity import SimilarityIndex
+from PromptStats import PromptStats
+from PromptTemplate import TemplateEngine, TemplateError, DEFAULT_WRAPPER
+from PromptHistory import PromptHistory
+from PromptTransfer import POLICIES, export_file, import_prompts, iter_file, unique_name
+from PromptMetrics import metrics
 
 class PromptManagerApp(tk.Tk):
     PROMPT_FILENAME = "promptData.json"
 
-    def __init__(self):
+    WRITER_POLL_MS = 250
+    LOAD_POLL_MS = 50 # How often names read by the background loader are added to the list
+    SEARCH_DELAY_MS = 100 # Run the search once typing pauses this long
+    WATCH_MS = 2000 # How often to check the prompt files for changes made by other programs
+    DEFAULT_WRAPPER_CHOICE = "Default wrapper"
+    NO_WRAPPER_CHOICE = "No wrapper"
+
+    def __init__(self, backend=None, save_delay=0.5, list_mode="auto"):
         super().__init__()
         self.title("Prompt Manager")
         self.geometry("600x450")
 
+        self.backend_name = backend # None lets PromptStore detect the format in each directory
         self.prompt_directory = None
-        self.prompts = {}
+        self.save_delay = save_delay # Seconds of quiet before a burst of edits is written
+        self.list_mode = list_mode # "tree", "virtual" or "auto" (virtual for large libraries)
+        self.store = PromptStore()
+        self.writer = WriteBehindWriter(self.store, delay=save_delay)
+        self.search_index = None
+        self.templates = None # TemplateEngine for the current store, see _template_engine
+        self.history = None # PromptHistory for the current store's directory, see _prompt_history
+        self.similarity = None # SimilarityIndex for the current store, see _similarity_index
+        self.stats = None # PromptStats (size, tokens, modified, uses) for the list columns
+        self.sort_key = NAME_KEY # List column the prompts are sorted by
+        self.sort_reverse = False
+        self.loader = None # BackgroundLoader while a library is being read
+        self.diagnostics_window = None
+        self._body_before_edit = None # Body when editing started, to spot changes made elsewhere meanwhile
+        self._search_after_id = None
         self.current_prompt_name = None
 
         self.main_frame = ttk.Frame(self)
@@ -31,8 +66,121 @@ class PromptManagerApp(tk.Tk):
         self.setup_create_prompt_screen()
         self.setup_view_edit_screen()
 
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
         self.switch_frame("main")
         self.load_prompts()
+        self.after(self.WRITER_POLL_MS, self._poll_writer)
+        self.after(self.WATCH_MS, self._poll_external)
+
+    def _close_store(self):
+        """Flush the background writer and close the store. Raises on failure.
+
+        The store is only closed once everything has been written, so after a
+        failure it is still open and the writer can be restarted to retry.
+        """
+        if self.loader is not None:
+            # Nothing can have changed while loading, so there is nothing to save.
+            self.loader.cancel()
+            self.loader.join()
+            self.loader = None
+            self.store.end_load(complete=False)
+            self.writer.close()
+            self.store.close(compact=False)
+            return
+        self.writer.close()
+        error = self.writer.take_error()
+        if isinstance(error, ExternalChangeError):
+            self.store.merge_external()
+            self.store.save()
+        elif error is not None:
+            raise error
+        if self.prompt_directory:
+            self.store.compact() # Before persisting, as the indexes are tagged with the files' signature
+            if self.search_index is not None:
+                self.search_index.persist()
+            if self.stats is not None:
+                self.stats.persist()
+            if self.similarity is not None:
+                self.similarity.persist()
+            self.store.close(compact=False)
+
+    def on_close(self):
+        """Save and compact the store (folds any journal into the snapshot) before exiting."""
+        try:
+            self._close_store()
+        except Exception as e:
+            if not messagebox.askyesno("Error", f"Error saving prompts on exit: {e}\n\nExit anyway?"):
+                return
+        self.destroy()
+
+    def _poll_writer(self):
+        """Show pending background writes in the title bar and report failed ones."""
+        status = self.writer.status()
+        if status == WriteBehindWriter.IDLE:
+            self.title("Prompt Manager")
+        else:
+            self.title("Prompt Manager (saving...)")
+        error = self.writer.take_error()
+        if isinstance(error, ExternalChangeError):
+            # Someone else saved first: take in their changes, then write ours.
+            if self._merge_external():
+                self.writer.schedule()
+        elif error is not None:
+            messagebox.showerror("Error", f"Error saving prompts to '{self.store.path}': {error}")
+        self.after(self.WRITER_POLL_MS, self._poll_writer)
+
+    # --- Changes made by other programs (e.g. another PromptManager on a synced folder) ---
+
+    def _poll_external(self):
+        if self.prompt_directory and self.loader is None:
+            self._merge_external()
+        self.after(self.WATCH_MS, self._poll_external)
+
+    def _merge_external(self):
+        """Merge changed prompt files into the store and patch the list. Returns False on failure."""
+        try:
+            result = self.store.merge_external()
+        except Exception:
+            # Most likely the other program was still writing; try again on the next poll.
+            return False
+        if result:
+            self._apply_external_changes(result)
+        return True
+
+    @metrics.timed("ui.external_merge")
+    def _apply_external_changes(self, result):
+        if self._search_query():
+            self.apply_search()
+        elif self._sort_order() is not None and self.sort_key != NAME_KEY:
+            # Several rows may move at once; the column's index already has the new order.
+            self.prompt_list.set_names(self.store)
+            self.on_tree_select()
+        else:
+            self.prompt_list.extend(result.added)
+            for name in result.removed:
+                self.prompt_list.remove(name)
+            for name in result.changed:
+                self.prompt_list.refresh(name)
+            self.on_tree_select()
+
+        name = self.current_prompt_name
+        if name is None or not self.view_edit_frame.winfo_ismapped():
+            return
+        if name in result.conflicts:
+            messagebox.showwarning("Prompt Changed Elsewhere", f"'{name}' was also changed by someone else. Your version is kept and will replace theirs.")
+        elif name in result.removed:
+            if self.editing_body:
+                messagebox.showwarning("Prompt Deleted Elsewhere", f"'{name}' was deleted by someone else. Saving your changes will create it again.")
+            else:
+                messagebox.showinfo("Prompt Deleted Elsewhere", f"'{name}' was deleted by someone else.")
+                self.current_prompt_name = None
+                self.body_view.cancel()
+                self.switch_frame("main")
+        elif name in result.changed:
+            if self.editing_body:
+                messagebox.showwarning("Prompt Changed Elsewhere", f"'{name}' was changed by someone else while you were editing it. You will be asked before your changes replace theirs.")
+            else:
+                self.view_prompt_body(name) # Show their new version
 
     def switch_frame(self, frame_name):
         for name, frame in self.frames.items():
@@ -43,16 +191,25 @@ class PromptManagerApp(tk.Tk):
 
     # --- Directory and File Handling Logic (Unchanged from previous correct version) ---
     def _get_full_prompt_path(self):
-        if self.prompt_directory:
-            return os.path.join(self.prompt_directory, self.PROMPT_FILENAME)
-        return None
+        return self.store.path
 
     def select_directory_and_load(self):
         dir_path = filedialog.askdirectory(
             title="Select Directory Containing (or to contain) promptData.json"
         )
         if dir_path:
+            try:
+                self._close_store()
+            except Exception as e:
+                if not messagebox.askyesno(
+                        "Error", f"Error saving prompts to '{self.store.path}': {e}\n\n"
+                                 f"Open '{dir_path}' anyway? Unsaved changes will be lost."):
+                    # Stay on the current library (its store is still open) and restart the writer to retry.
+                    self.writer.schedule()
+                    return
             self.prompt_directory = dir_path
+            self.store = PromptStore(dir_path, backend=self.backend_name)
+            self.writer = WriteBehindWriter(self.store, delay=self.save_delay)
             self.load_prompts()
         else:
             messagebox.showinfo("Info", "Directory selection cancelled.")
@@ -63,42 +220,95 @@ class PromptManagerApp(tk.Tk):
             self.select_directory_and_load()
             if not self.prompt_directory:
                 messagebox.showwarning("Warning", "No directory selected. Cannot load or save prompts.")
-                self.prompts = {}
+                self.store.clear()
+                self._open_search_index()
+                self._open_prompt_stats()
+                self._open_similarity_index()
                 self.update_prompt_list()
                 return
 
-        target_file_path = self._get_full_prompt_path()
-        if not target_file_path:
-             messagebox.showerror("Internal Error", "Prompt directory is set but path couldn't be constructed.")
-             self.prompts = {}
-             self.update_prompt_list()
-             return
+        self._close_search_index()
+        self._close_prompt_stats()
+        self._close_similarity_index()
+        self.store.clear()
+        if self.store.exists() or self._offer_json_import():
+            self._start_load()
+        else:
+            self._finish_load(load_successful=False, file_exists=False)
 
-        self.prompts = {}
-        file_exists = os.path.exists(target_file_path)
-        load_successful = False
-        create_new_file = False
+    def _start_load(self):
+        """Read the library on a worker thread; _poll_loader lists names as they arrive."""
+        self.loader = BackgroundLoader(self.store, prepare=self._prepare_indexes)
+        self.loader.start()
+        self.update_prompt_list()
+        self.cancel_load_button.pack(side=tk.LEFT, padx=5)
+        self._poll_loader()
 
-        if file_exists:
-            try:
-                with open(target_file_path, 'r') as f:
-                    data = json.load(f)
-                    if isinstance(data, dict):
-                        self.prompts = data
-                        load_successful = True
-                    else:
-                        messagebox.showwarning("Warning", f"File '{self.PROMPT_FILENAME}' found but has an unexpected format (expected a JSON dictionary).")
-            except json.JSONDecodeError:
-                messagebox.showerror("Error", f"Error decoding JSON file '{self.PROMPT_FILENAME}'. It might be corrupted.")
-            except Exception as e:
-                messagebox.showerror("Error", f"Error loading prompts from '{self.PROMPT_FILENAME}': {e}")
+    def _poll_loader(self):
+        loader = self.loader
+        if loader is None:
+            return
+        names = loader.poll()
+        if names:
+            self._list_loaded(names)
+        if not loader.finished:
+            if loader.preparing:
+                status = f"Indexing {loader.count:,} prompts..."
+            else:
+                status = f"Loading {self.store.filename}... {loader.progress:.0%} ({loader.count:,} prompts)"
+            self.file_path_label.config(text=f"Directory: {self.prompt_directory}\n{status}")
+            self.after(self.LOAD_POLL_MS, self._poll_loader)
+            return
+
+        self.loader = None
+        self.cancel_load_button.pack_forget()
+        if loader.cancelled:
+            # The library was only partly read, so saving anything now could
+            # overwrite the rest of it. Drop the directory until it is reloaded.
+            self.store.close(compact=False)
+            self.prompt_directory = None
+            self.store = PromptStore()
+            self.writer = WriteBehindWriter(self.store, delay=self.save_delay)
+            self.update_prompt_list()
+            messagebox.showinfo("Info", "Loading cancelled. Select a directory to load prompts again.")
+        elif loader.error is not None:
+            if isinstance(loader.error, PromptFormatError):
+                messagebox.showerror("Error", str(loader.error))
+            else:
+                messagebox.showerror("Error", f"Error loading prompts from '{self.store.filename}': {loader.error}")
+            self._finish_load(load_successful=False, file_exists=True)
+        else:
+            self._finish_load(load_successful=True, file_exists=True, prepared=loader.prepared)
+
+    @metrics.timed("ui.list_loaded")
+    def _list_loaded(self, names):
+        """Add a batch of freshly loaded names to the list."""
+        list_class = list_class_for(self.list_mode, len(self.store))
+        if not isinstance(self.prompt_list, list_class):
+            self._create_prompt_list(list_class)
+            self.prompt_list.set_names(self.store)
+        else:
+            self.prompt_list.extend(names)
 
+    def cancel_load(self):
+        if self.loader is not None:
+            self.loader.cancel()
+
+    def _loading_blocks_edits(self):
+        """Tell the user to wait (and return True) while a library is still loading."""
+        if self.loader is None:
+            return False
+        messagebox.showinfo("Loading", "Prompts are still loading. Please wait until loading finishes before making changes.")
+        return True
+
+    def _finish_load(self, load_successful, file_exists, prepared=None):
+        create_new_file = False
         if not load_successful:
             prompt_message = ""
             if file_exists:
-                 prompt_message = f"Could not load prompts from '{self.PROMPT_FILENAME}' in the selected directory.\n\nDo you want to create a new (or overwrite the existing) '{self.PROMPT_FILENAME}' file here?"
+                 prompt_message = f"Could not load prompts from '{self.store.filename}' in the selected directory.\n\nDo you want to create a new (or overwrite the existing) '{self.store.filename}' file here?"
             else:
-                 prompt_message = f"File '{self.PROMPT_FILENAME}' not found in the selected directory.\n\nDo you want to create it now?"
+                 prompt_message = f"File '{self.store.filename}' not found in the selected directory.\n\nDo you want to create it now?"
 
             if messagebox.askyesno("Create Prompt File?", prompt_message, parent=self):
                 create_new_file = True
@@ -107,72 +317,205 @@ class PromptManagerApp(tk.Tk):
                 create_new_file = False
 
         if create_new_file:
-            self.prompts = {}
-            try:
-                self.save_prompts()
-                messagebox.showinfo("File Created", f"New file '{self.PROMPT_FILENAME}' created successfully in '{self.prompt_directory}'.")
-            except Exception as e:
-                 messagebox.showerror("Creation Failed", f"Failed to create '{self.PROMPT_FILENAME}'. Error: {e}")
-
+            self.store.clear()
+            if self.save_prompts(wait=True):
+                messagebox.showinfo("File Created", f"New file '{self.store.filename}' created successfully in '{self.prompt_directory}'.")
+
+        if prepared is not None:
+            self._open_search_index(prepared[0])
+            self._open_prompt_stats(prepared[1])
+            self._open_similarity_index(prepared[2])
+        else:
+            self._open_search_index()
+            self._open_prompt_stats()
+            self._open_similarity_index()
+        self._prompt_history()
+        # Also fills in the stats columns of the rows listed while loading;
+        # the chosen column's index supplies the order, so nothing is sorted.
         self.update_prompt_list()
 
-    def save_prompts(self):
-        target_file_path = self._get_full_prompt_path()
-        if target_file_path:
+    def _offer_json_import(self):
+        """Offer to fill a new database from a promptData.json in the same directory.
+
+        Returns True if prompts were imported (they are loaded afterwards).
+        """
+        import_json = getattr(self.store.backend, "import_json", None)
+        json_path = os.path.join(self.prompt_directory, self.PROMPT_FILENAME)
+        if import_json is None or not os.path.exists(json_path):
+            return False
+        if not messagebox.askyesno("Import Prompts?", f"'{self.store.filename}' not found, but '{self.PROMPT_FILENAME}' exists in the selected directory.\n\nDo you want to import its prompts?", parent=self):
+            return False
+        try:
+            count = import_json(json_path)
+        except Exception as e:
+            messagebox.showerror("Error", f"Error importing prompts from '{self.PROMPT_FILENAME}': {e}")
+            return False
+        messagebox.showinfo("Import Complete", f"Imported {count} prompts into '{self.store.filename}'.")
+        return True
+
+    def _prepare_indexes(self, store):
+        """The search index, list stats and near-duplicate index for a store just read, not yet attached.
+
+        Runs on the loader's worker thread, as opening them may read and index
+        every body; _finish_load attaches them on the Tk thread.
+        """
+        return (open_search(store, self.writer, attach=False), PromptStats.open(store, attach=False),
+                SimilarityIndex.open(store, attach=False))
+
+    def _open_search_index(self, search_index=None):
+        """Attach a search index to the current store (loading the persisted one if current).
+
+        search_index is one _prepare_indexes made for it, if any.
+        """
+        self._close_search_index()
+        if search_index is None:
+            search_index = open_search(self.store, self.writer, attach=False)
+        search_index.attach()
+        self.search_index = search_index
+
+    def _template_engine(self):
+        """The template engine for the current store, created on first use after a store change."""
+        if self.templates is None or self.templates.store is not self.store:
+            if self.templates is not None:
+                self.templates.detach()
+            self.templates = TemplateEngine(self.store)
+        return self.templates
+
+    def _prompt_history(self):
+        """Revision history for the current store's directory (None without one), created on first use."""
+        if not self.store.directory:
+            return None
+        if self.history is None or self.history.store is not self.store:
+            if self.history is not None:
+                self.history.detach()
+            self.history = PromptHistory(self.store.directory)
+            self.history.attach(self.store) # Histories follow renames and deletes
+        return self.history
+
+    def _record_revision(self, name, body, previous):
+        """Add body to name's history; a failure is reported but does not undo the edit."""
+        self._record_revisions([(name, body, previous)])
+
+    def _record_revisions(self, revisions):
+        """Add (name, body, previous) edits to their histories, reporting the first failure only."""
+        history = self._prompt_history()
+        if history is None:
+            return
+        try:
+            for name, body, previous in revisions:
+                history.record(name, body, previous)
+        except (OSError, PromptStoreError) as e:
+            messagebox.showwarning("History", f"The change was saved, but could not be added to the prompt's history: {e}")
+
+    def _close_search_index(self):
+        if self.search_index is not None:
+            self.search_index.detach()
+            self.search_index = None
+
+    def _open_prompt_stats(self, stats=None):
+        """Attach list column stats to the current store (loading the persisted ones if current).
+
+        stats are ones _prepare_indexes made for it, if any.
+        """
+        self._close_prompt_stats()
+        if stats is None:
+            with metrics.span("ui.open_stats"):
+                stats = PromptStats.open(self.store, attach=False)
+        stats.attach()
+        self.stats = stats
+
+    def _close_prompt_stats(self):
+        if self.stats is not None:
+            self.stats.detach()
+            self.stats = None
+        if self.prompt_list is not None:
+            self.prompt_list.set_order(None) # Name order until stats are back
+
+    def _open_similarity_index(self, similarity=None):
+        """Attach a near-duplicate index to the current store (loading the persisted one if current).
+
+        similarity is one _prepare_indexes made for it, if any.
+        """
+        self._close_similarity_index()
+        if similarity is None:
+            with metrics.span("ui.open_similarity"):
+                similarity = SimilarityIndex.open(self.store, attach=False)
+        similarity.attach()
+        self.similarity = similarity
+
+    def _similarity_index(self):
+        """The near-duplicate index for the current store; None while a library is loading.
+
+        It is normally opened with the search index once loading finishes;
+        a store replaced since then gets one opened here.
+        """
+        if self.loader is not None:
+            return None
+        if self.similarity is None or self.similarity.store is not self.store:
+            self.config(cursor="watch")
+            self.update_idletasks()
             try:
-                os.makedirs(self.prompt_directory, exist_ok=True)
-                with open(target_file_path, 'w') as f:
-                    json.dump(self.prompts, f, indent=4)
-            except Exception as e:
-                messagebox.showerror("Error", f"Error saving prompts to '{target_file_path}': {e}")
-        else:
+                self._open_similarity_index()
+            finally:
+                self.config(cursor="")
+        return self.similarity
+
+    def _close_similarity_index(self):
+        if self.similarity is not None:
+            self.similarity.detach()
+            self.similarity = None
+
+    def save_prompts(self, wait=False):
+        """Hand pending store changes to the background writer.
+
+        With wait=True the write happens synchronously and errors are shown
+        immediately. Returns False if saving was not possible.
+        """
+        if not self.prompt_directory:
             messagebox.showwarning("Warning", "No prompt directory selected. Cannot save prompts. Please select a directory first.")
+            return False
+        if not wait:
+            self.writer.schedule()
+            return True
+        try:
+            self.store.save()
+            return True
+        except Exception as e:
+            messagebox.showerror("Error", f"Error saving prompts to '{self.store.path}': {e}")
+            return False
 
     # --- UI Setup and Logic (Adjusted for Treeview) ---
 
     def setup_main_screen(self):
         main_frame = self.main_frame
         main_frame.columnconfigure(0, weight=1) # Make treeview column expandable
-        main_frame.rowconfigure(2, weight=1) # Make treeview row expandable
+        main_frame.rowconfigure(3, weight=1) # Make treeview row expandable
 
         ttk.Label(main_frame, text="Saved Prompts", font=('Arial', 14)).grid(row=0, column=0, pady=(10,0), sticky='w', padx=10)
 
         self.file_path_label = ttk.Label(main_frame, text="Directory: None Selected", wraplength=580, anchor='w', justify=tk.LEFT)
         self.file_path_label.grid(row=1, column=0, pady=(0, 5), padx=10, sticky='ew')
 
-        # --- Treeview Setup ---
-        tree_frame = ttk.Frame(main_frame)
-        tree_frame.grid(row=2, column=0, pady=5, padx=10, sticky='nsew')
-        tree_frame.columnconfigure(0, weight=1)
-        tree_frame.rowconfigure(0, weight=1)
-
-        tree_scroll = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL)
-        self.prompt_tree = ttk.Treeview(
-            tree_frame,
-            columns=('Prompt Name',),
-            show='headings', # Don't show the default '#' column
-            yscrollcommand=tree_scroll.set,
-            selectmode='browse' # Only allow selecting one item
-        )
-        tree_scroll.config(command=self.prompt_tree.yview)
-
-        # Define headings
-        self.prompt_tree.heading('Prompt Name', text='Prompt Name')
-        self.prompt_tree.column('Prompt Name', anchor='w') # Stretch not needed if only one column
+        # --- Search Box ---
+        search_frame = ttk.Frame(main_frame)
+        search_frame.grid(row=2, column=0, pady=(5, 0), padx=10, sticky='ew')
+        search_frame.columnconfigure(1, weight=1)
+        ttk.Label(search_frame, text="Search:").grid(row=0, column=0, padx=(0, 5))
+        self.search_var = tk.StringVar()
+        self.search_entry = ttk.Entry(search_frame, textvariable=self.search_var)
+        self.search_entry.grid(row=0, column=1, sticky='ew')
+        ttk.Button(search_frame, text="Clear", command=lambda: self.search_var.set("")).grid(row=0, column=2, padx=(5, 0))
+        self.search_var.trace_add("write", self._on_search_changed)
 
-        self.prompt_tree.grid(row=0, column=0, sticky='nsew')
-        tree_scroll.grid(row=0, column=1, sticky='ns')
-
-        # Bind double-click to view/edit
-        self.prompt_tree.bind("<Double-1>", self.view_selected_prompt)
-        # Update button states on selection change
-        self.prompt_tree.bind("<<TreeviewSelect>>", self.on_tree_select)
+        # --- Treeview Setup ---
+        self.prompt_list = None
+        self._create_prompt_list(list_class_for(self.list_mode, 0))
         # --- End Treeview Setup ---
 
 
         # --- Action Buttons Frame ---
         button_frame = ttk.Frame(main_frame)
-        button_frame.grid(row=3, column=0, pady=10)
+        button_frame.grid(row=4, column=0, pady=10)
 
         self.view_edit_button = ttk.Button(button_frame, text="View/Edit", command=self.view_selected_prompt, state=tk.DISABLED)
         self.view_edit_button.pack(side=tk.LEFT, padx=5)
@@ -182,12 +525,177 @@ class PromptManagerApp(tk.Tk):
 
         ttk.Button(button_frame, text="New Prompt", command=self.go_to_create_prompt).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="Select Directory", command=self.select_directory_and_load).pack(side=tk.LEFT, padx=5) # Renamed for clarity
+        ttk.Button(button_frame, text="Diagnostics", command=self.open_diagnostics).pack(side=tk.LEFT, padx=5)
+        self.cancel_load_button = ttk.Button(button_frame, text="Cancel Loading", command=self.cancel_load) # Only shown while loading
+
+        transfer_frame = ttk.Frame(main_frame)
+        transfer_frame.grid(row=5, column=0, pady=(0, 10))
+        ttk.Button(transfer_frame, text="Import Prompts...", command=self.import_prompts_from_file).pack(side=tk.LEFT, padx=5)
+        ttk.Button(transfer_frame, text="Export Prompts...", command=self.export_prompts_to_file).pack(side=tk.LEFT, padx=5)
+        ttk.Button(transfer_frame, text="Find Duplicates...", command=self.show_duplicate_report).pack(side=tk.LEFT, padx=5)
+
+
+    # --- Bulk Import/Export ---
+
+    IMPORT_POLICY_LABELS = {
+        "skip": "Keep the existing prompt",
+        "overwrite": "Replace it with the imported one",
+        "rename": "Keep both (imported one gets a number, e.g. 'Name (2)')",
+    }
 
+    def import_prompts_from_file(self):
+        if not self.prompt_directory:
+            messagebox.showerror("Error", "Cannot import prompts. No directory selected.")
+            return
+        if self._loading_blocks_edits():
+            return
+        path = filedialog.askopenfilename(title="Import Prompts", filetypes=[
+            ("JSON Lines files", "*.jsonl"), ("JSON files", "*.json"), ("All files", "*.*")])
+        if not path:
+            return
+        options = self._ask_import_options()
+        if options is None:
+            return
+        policy, dedup = options
+
+        added = []
+        replaced = []
+        self.config(cursor="watch")
+        self.update_idletasks()
+        try:
+            result = import_prompts(self.store, iter_file(path), policy=policy, dedup=dedup,
+                                    added_names=added, replaced=replaced)
+        except Exception as e:
+            result = None
+            messagebox.showerror("Import Error", f"Error importing '{os.path.basename(path)}': {e}")
+            self.save_prompts() # Whatever was imported before the error still gets written
+        finally:
+            self.config(cursor="")
+        self._record_revisions(replaced) # Overwritten bodies stay in the history
+
+        # One list update for the whole import
+        list_class = list_class_for(self.list_mode, len(self.store))
+        if self._search_query() or not isinstance(self.prompt_list, list_class) or policy == "overwrite":
+            self.update_prompt_list() # Also shows the new sizes of replaced prompts
+        else:
+            self.prompt_list.extend(added)
+            self.on_tree_select()
+        if result is not None:
+            messagebox.showinfo("Import Complete", f"Imported from '{os.path.basename(path)}': {result}.")
+
+    def _ask_import_options(self):
+        """Ask how to handle name clashes and duplicates; returns (policy, dedup) or None if cancelled."""
+        dialog = tk.Toplevel(self)
+        dialog.title("Import Options")
+        ttk.Label(dialog, text="When a prompt with the same name already exists:").pack(pady=(10, 5), padx=10, anchor='w')
+        policy_var = tk.StringVar(value=POLICIES[0])
+        for policy in POLICIES:
+            ttk.Radiobutton(dialog, text=self.IMPORT_POLICY_LABELS[policy], variable=policy_var, value=policy).pack(padx=20, anchor='w')
+        dedup_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(dialog, text="Skip prompts whose text is already in the library", variable=dedup_var).pack(pady=10, padx=10, anchor='w')
+        result = None
+
+        def accept():
+            nonlocal result
+            result = (policy_var.get(), dedup_var.get())
+            dialog.destroy()
+
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(pady=10)
+        ttk.Button(button_frame, text="Import", command=accept).pack(side=tk.LEFT, padx=10)
+        ttk.Button(button_frame, text="Cancel", command=dialog.destroy).pack(side=tk.LEFT, padx=10)
+
+        dialog.transient(self)
+        dialog.grab_set()
+        self.wait_window(dialog)
+        return result
+
+    def export_prompts_to_file(self):
+        if not self.prompt_directory:
+            messagebox.showerror("Error", "Cannot export prompts. No directory selected.")
+            return
+        if self.loader is not None:
+            messagebox.showinfo("Loading", "Prompts are still loading. Please wait until loading finishes before exporting.")
+            return
+        path = filedialog.asksaveasfilename(title="Export Prompts", defaultextension=".jsonl", initialfile="prompts.jsonl",
+                                            filetypes=[("JSON Lines files", "*.jsonl"), ("JSON files", "*.json")])
+        if not path:
+            return
+        self.config(cursor="watch")
+        self.update_idletasks()
+        try:
+            count = export_file(self.store, path)
+        except Exception as e:
+            messagebox.showerror("Export Error", f"Error exporting to '{path}': {e}")
+            return
+        finally:
+            self.config(cursor="")
+        messagebox.showinfo("Export Complete", f"Exported {count} prompts to '{path}'.")
+
+    def show_duplicate_report(self):
+        """List groups of near-identical prompts across the whole library."""
+        index = self._similarity_index()
+        if index is None:
+            messagebox.showinfo("Loading", "Prompts are still loading. Please try again once loading finishes.")
+            return
+        self.config(cursor="watch")
+        self.update_idletasks()
+        try:
+            groups = index.duplicate_groups()
+        finally:
+            self.config(cursor="")
+        if not groups:
+            messagebox.showinfo("Find Duplicates", "No near-duplicate prompts found.")
+            return
+        dialog, tree = self._prompt_match_dialog("Near-Duplicate Prompts",
+                                                 f"{len(groups):,} groups of prompts that are nearly the same. Double-click a prompt to open it.")
+        for number, group in enumerate(groups, 1):
+            parent = tree.insert("", tk.END, text=f"Group {number}", values=(f"{len(group)} prompts",), open=True)
+            for name in group:
+                tree.insert(parent, tk.END, text=name, values=("",), tags=("prompt",))
+        self.wait_window(dialog)
+
+    def _prompt_match_dialog(self, title, heading):
+        """A dialog with a two-column tree of prompts; double-clicking a "prompt" row opens it."""
+        dialog = tk.Toplevel(self)
+        dialog.title(title)
+        dialog.geometry("500x400")
+        ttk.Label(dialog, text=heading, wraplength=480).pack(pady=(10, 5), padx=10, anchor='w')
+        frame = ttk.Frame(dialog)
+        frame.pack(fill="both", expand=True, padx=10)
+        tree = ttk.Treeview(frame, columns=("detail",))
+        tree.heading("#0", text="Prompt")
+        tree.heading("detail", text="")
+        tree.column("detail", width=120, stretch=False)
+        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side=tk.LEFT, fill="both", expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill="y")
+
+        def open_selected(event=None):
+            item = tree.focus()
+            if not item or "prompt" not in tree.item(item, "tags"):
+                return
+            name = tree.item(item, "text")
+            dialog.destroy()
+            self.view_prompt_body(name)
+
+        tree.bind("<Double-1>", open_selected)
+        ttk.Button(dialog, text="Close", command=dialog.destroy).pack(pady=10)
+        dialog.transient(self)
+        return dialog, tree
+
+    def open_diagnostics(self):
+        """Show the timing diagnostics window (only one at a time)."""
+        from PromptDiagnostics import DiagnosticsWindow
+        if self.diagnostics_window is not None and self.diagnostics_window.winfo_exists():
+            self.diagnostics_window.lift()
+        else:
+            self.diagnostics_window = DiagnosticsWindow(self)
 
     def on_tree_select(self, event=None):
         """Enable/disable buttons based on Treeview selection."""
-        selected_items = self.prompt_tree.selection()
-        if selected_items: # If something is selected
+        if self.prompt_list.selected_name() is not None: # If something is selected
             self.view_edit_button.config(state=tk.NORMAL)
             self.delete_button.config(state=tk.NORMAL)
         else:
@@ -196,53 +704,132 @@ class PromptManagerApp(tk.Tk):
 
     def _get_selected_prompt_name(self):
         """Helper to get the name of the currently selected prompt in the Treeview."""
-        selected_items = self.prompt_tree.selection()
-        if not selected_items:
-            # messagebox.showinfo("Information", "Please select a prompt from the list first.")
-            return None
-        # Get the first (and only, due to 'browse' mode) selected item identifier
-        item_id = selected_items[0]
-        # Retrieve the value associated with the 'Prompt Name' column for that item
-        item_data = self.prompt_tree.item(item_id)
-        # Depending on how data is inserted, it might be in 'text' or 'values'
-        # We inserted using values=(name,), so it should be in values[0]
-        if 'values' in item_data and item_data['values']:
-             return item_data['values'][0]
-        # Fallback if inserted differently (less likely with current code)
-        elif 'text' in item_data:
-             return item_data['text']
-        return None # Should not happen if selection exists
-
-
-    def update_prompt_list(self):
-        """ Updates the Treeview and the directory path label """
+        return self.prompt_list.selected_name()
+
+    def _create_prompt_list(self, list_class):
+        """(Re)create the prompt list widget in the main screen's list slot."""
+        if self.prompt_list is not None:
+            self.prompt_list.frame.destroy()
+        self.prompt_list = list_class(self.main_frame, on_select=self.on_tree_select, on_activate=self.view_selected_prompt,
+                                      columns=STAT_COLUMNS, row_values=self._row_values, on_sort=self.sort_prompt_list)
+        self.prompt_list.grid(row=3, column=0, pady=5, padx=10, sticky='nsew')
+        self.prompt_tree = self.prompt_list.tree
+        self.prompt_list.set_order(self._sort_order())
+
+    def _row_values(self, name):
+        stat = self.stats.get(name) if self.stats is not None else None
+        if stat is None:
+            return (name, "", "", "", "")
+        modified = time.strftime("%Y-%m-%d %H:%M", time.localtime(stat.modified))
+        return (name, f"{stat.size:,}", f"{stat.tokens:,}", modified, stat.uses)
+
+    def update_directory_label(self):
         if self.prompt_directory:
-            display_path = f"Directory: {self.prompt_directory}\nFile: {self.PROMPT_FILENAME}"
+            display_path = f"Directory: {self.prompt_directory}\nFile: {self.store.filename} ({self.store.backend_name} storage)"
             self.file_path_label.config(text=display_path)
         else:
             self.file_path_label.config(text="Directory: None Selected")
 
-        # Clear previous items in the Treeview
-        if self.prompt_tree.winfo_exists():
-            for item in self.prompt_tree.get_children():
-                self.prompt_tree.delete(item)
-
-            # Populate Treeview
-            if not self.prompts:
-                # Optionally display a message *in* the tree (less common)
-                # self.prompt_tree.insert('', tk.END, text="No prompts found or loaded.", tags=('empty',))
-                # self.prompt_tree.tag_configure('empty', foreground='grey')
-                # Or just leave it empty and rely on button states
-                pass
-            else:
-                sorted_prompt_names = sorted(self.prompts.keys())
-                for name in sorted_prompt_names:
-                    # Insert item, using the name for both the display and the value
-                    self.prompt_tree.insert('', tk.END, values=(name,))
+    @metrics.timed("ui.update_prompt_list")
+    def update_prompt_list(self):
+        """ Rebuilds the Treeview from the store and updates the directory path label.
+
+        Only used when a whole library is (re)loaded; single edits go through
+        the _list_added/_list_removed/_list_renamed diffs instead.
+        """
+        self.update_directory_label()
+        list_class = list_class_for(self.list_mode, len(self.store))
+        if not isinstance(self.prompt_list, list_class):
+            self._create_prompt_list(list_class)
+        self.prompt_list.set_order(self._sort_order())
+        if self._search_query():
+            self.apply_search()
+        else:
+            self.prompt_list.set_names(self.store)
 
         # Update button states after list update
         self.on_tree_select()
 
+    # --- Search ---
+
+    def _search_query(self):
+        return self.search_var.get().strip()
+
+    def _on_search_changed(self, *args):
+        if self._search_after_id is not None:
+            self.after_cancel(self._search_after_id)
+        self._search_after_id = self.after(self.SEARCH_DELAY_MS, self.apply_search)
+
+    @metrics.timed("ui.apply_search")
+    def apply_search(self):
+        """Show the ranked search results for the current query (or every prompt if empty)."""
+        self._search_after_id = None
+        query = self._search_query()
+        if query and self.search_index is not None:
+            results = self.search_index.search(query)
+            order = self._sort_order()
+            if order is not None and (self.sort_key, self.sort_reverse) != (NAME_KEY, False):
+                results = order.sort(results) # A heading was clicked: that beats relevance
+            self.prompt_list.set_names(results, ranked=True)
+        else:
+            self.prompt_list.set_names(self.store)
+        self.on_tree_select()
+
+    # --- Single-row list updates after an edit ---
+    # While a search is active the results are re-queried instead, since an
+    # edit can change which prompts match and how they rank.
+
+    def _list_added(self, name):
+        if self._search_query():
+            self.apply_search()
+        else:
+            self.prompt_list.insert(name)
+            self.on_tree_select()
+
+    def _list_removed(self, name):
+        if self._search_query():
+            self.apply_search()
+        else:
+            self.prompt_list.remove(name)
+            self.on_tree_select()
+
+    def _list_renamed(self, old_name, new_name):
+        if self._search_query():
+            self.apply_search()
+        else:
+            self.prompt_list.rename(old_name, new_name)
+            self.on_tree_select()
+
+    def _list_changed(self, name):
+        """Show a prompt's new size, tokens, modified time or use count."""
+        if self._search_query():
+            self.apply_search()
+        else:
+            self.prompt_list.refresh(name)
+
+    # --- Sorting by column ---
+
+    def _sort_order(self):
+        """The ColumnOrder for the chosen column, or None (name order) while there are no stats."""
+        if self.stats is None or self.loader is not None:
+            return None
+        return self.stats.order(self.sort_key, self.sort_reverse)
+
+    def sort_prompt_list(self, key):
+        """Heading click: sort by that column, or reverse the order if it already is."""
+        if key == self.sort_key:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_key = key
+            self.sort_reverse = key != NAME_KEY # Biggest, newest and most used first
+        self._apply_sort()
+
+    @metrics.timed("ui.sort")
+    def _apply_sort(self):
+        self.prompt_list.set_order(self._sort_order())
+        if self._search_query():
+            self.apply_search()
+
 
     # --- Methods using Treeview selection ---
 
@@ -257,6 +844,8 @@ class PromptManagerApp(tk.Tk):
 
     def delete_selected_prompt(self):
         """Handles Delete button click."""
+        if self._loading_blocks_edits():
+            return
         prompt_name = self._get_selected_prompt_name()
         if prompt_name:
             self.delete_prompt(prompt_name) # Call the existing delete logic
@@ -266,6 +855,8 @@ class PromptManagerApp(tk.Tk):
     # --- Other methods mostly unchanged, but ensure they call update_prompt_list ---
 
     def go_to_create_prompt(self):
+        if self._loading_blocks_edits():
+            return
         if not self.prompt_directory:
             messagebox.showwarning("Directory Required", "Please select a prompt directory before creating new prompts.")
             self.select_directory_and_load()
@@ -316,15 +907,39 @@ class PromptManagerApp(tk.Tk):
             messagebox.showerror("Validation Error", "Prompt body cannot be empty.")
             return
 
-        if name in self.prompts:
-            if not messagebox.askyesno("Overwrite Confirmation", f"Prompt name '{name}' already exists. Overwrite it?"):
-                 return
+        if name in self.store:
+            # Same choices as the import conflict policies: overwrite, keep both, or cancel
+            answer = messagebox.askyesnocancel("Prompt Name Exists", f"Prompt name '{name}' already exists.\n\n"
+                                               f"Yes: overwrite it\nNo: keep both and save this one as '{unique_name(name, self.store)}'")
+            if answer is None:
+                return
+            if not answer:
+                name = unique_name(name, self.store)
 
-        self.prompts[name] = body
+        if not self._confirm_not_duplicate(name, body):
+            return
+        previous_body = self.store.get(name) if name in self.store else None
+        self.store.put(name, body)
+        if previous_body is not None:
+            self._record_revision(name, body, previous_body)
         self.save_prompts()
-        self.update_prompt_list() # Refresh the Treeview
+        if previous_body is not None:
+            self._list_changed(name)
+        else:
+            self._list_added(name)
         self.switch_frame("main")
 
+    def _confirm_not_duplicate(self, name, body):
+        """Warn if body is nearly the same as other prompts; returns False if the user cancels."""
+        index = self._similarity_index()
+        if index is None:
+            return True
+        matches = [(other, score) for other, score in index.similar_to_body(body, limit=4) if other != name][:3]
+        if not matches:
+            return True
+        listing = "\n".join(f"  {other} ({score:.0%} similar)" for other, score in matches)
+        return messagebox.askyesno("Similar Prompt Exists", f"This prompt is nearly the same as:\n\n{listing}\n\nSave it anyway?")
+
     def cancel_create_prompt(self):
         name = self.create_name_entry.get().strip()
         body = self.create_body_text.get("1.0", tk.END).strip()
@@ -335,18 +950,18 @@ class PromptManagerApp(tk.Tk):
              self.switch_frame("main")
 
     def view_prompt_body(self, prompt_name): # Now called with name from selection handlers
-        if not self.prompt_directory or prompt_name not in self.prompts:
+        if not self.prompt_directory or prompt_name not in self.store:
              messagebox.showerror("Error", f"Prompt '{prompt_name}' not found or directory not loaded.")
              self.update_prompt_list()
              return
 
         self.current_prompt_name = prompt_name # Still useful for edit screen logic
         self.view_edit_name_label.config(text=f"Viewing/Editing: {prompt_name}")
-        self.view_edit_body_text.config(state=tk.NORMAL)
-        self.view_edit_body_text.delete("1.0", tk.END)
-        self.view_edit_body_text.insert("1.0", self.prompts[prompt_name])
-        self.view_edit_body_text.config(state=tk.DISABLED)
-        self.edit_body_button.config(text="Edit Body")
+        self.body_view.set_editable(False)
+        with metrics.span("ui.show_body"):
+            self.body_view.show(self.store.get(prompt_name)) # Large bodies fill in over idle callbacks, huge ones open paged
+        self.edit_body_button.config(text="Edit Body", state=tk.NORMAL)
+        self._refresh_wrapper_choices()
         self.rename_button.config(state=tk.NORMAL) # Rename button on view screen
         self.save_body_button.pack_forget()
         self.edit_body_button.pack(side=tk.LEFT, padx=5) # Ensure edit button is shown
@@ -360,13 +975,9 @@ class PromptManagerApp(tk.Tk):
         self.view_edit_name_label = ttk.Label(view_edit_frame, text="Viewing/Editing: Prompt Name", font=('Arial', 14), wraplength=580)
         self.view_edit_name_label.pack(pady=10, padx=10, anchor='w')
 
-        body_frame = ttk.Frame(view_edit_frame)
-        body_frame.pack(pady=5, padx=20, fill="both", expand=True)
-        body_scrollbar = tk.Scrollbar(body_frame)
-        body_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.view_edit_body_text = tk.Text(body_frame, height=15, width=60, wrap=tk.WORD, state=tk.DISABLED, yscrollcommand=body_scrollbar.set)
-        self.view_edit_body_text.pack(side=tk.LEFT, fill="both", expand=True)
-        body_scrollbar.config(command=self.view_edit_body_text.yview)
+        self.body_view = BodyView(view_edit_frame)
+        self.body_view.pack(pady=5, padx=20, fill="both", expand=True)
+        self.view_edit_body_text = self.body_view.text
 
         button_frame = ttk.Frame(view_edit_frame)
         button_frame.pack(pady=10)
@@ -386,37 +997,124 @@ class PromptManagerApp(tk.Tk):
         self.copy_prompt_button.pack(side=tk.LEFT, padx=5)
         # --- End NEW: Copy Prompt Button ---
 
+        self.history_button = ttk.Button(button_frame, text="History...", command=self.show_prompt_history)
+        self.history_button.pack(side=tk.LEFT, padx=5)
+
+        ttk.Button(button_frame, text="Find Similar", command=self.show_similar_prompts).pack(side=tk.LEFT, padx=5)
+
+        wrapper_frame = ttk.Frame(view_edit_frame)
+        wrapper_frame.pack(pady=(0, 10))
+        ttk.Label(wrapper_frame, text="Copy with:").pack(side=tk.LEFT, padx=5)
+        self.wrapper_var = tk.StringVar(value=self.DEFAULT_WRAPPER_CHOICE)
+        self.wrapper_combo = ttk.Combobox(wrapper_frame, textvariable=self.wrapper_var, state="readonly", width=40)
+        self.wrapper_combo.pack(side=tk.LEFT, padx=5)
+
         self.editing_body = False
 
     # --- NEW: Copy Prompt to Clipboard Function ---
     def copy_prompt_to_clipboard(self):
-        if self.current_prompt_name and self.current_prompt_name in self.prompts:
-            prompt_body = self.prompts[self.current_prompt_name]
-            formatted_prompt = f"(Important) Follow These Additional Instructions to Provide your Answer: [ {prompt_body} ]"
+        name = self.current_prompt_name
+        if not name or name not in self.store:
+            messagebox.showerror("Error", "No prompt selected or prompt not found.")
+            return
+        engine = self._template_engine()
+        wrapper = self._selected_wrapper()
+        try:
+            needed = engine.variables(name, wrapper)
+            values = {}
+            if needed:
+                values = self._ask_template_values(name, needed)
+                if values is None:
+                    return
+            with metrics.span("ui.render_prompt"):
+                formatted_prompt = engine.render_wrapped(name, values, wrapper)
+        except TemplateError as e:
+            messagebox.showerror("Template Error", str(e))
+            return
+        with metrics.span("ui.clipboard_copy"):
             self.clipboard_clear()
             self.clipboard_append(formatted_prompt)
             self.update() # Needed on some systems to make clipboard work immediately
-            messagebox.showinfo("Copied", "Prompt copied to clipboard!")
-        else:
-            messagebox.showerror("Error", "No prompt selected or prompt not found.")
+        if self.stats is not None:
+            self.stats.record_use(name)
+            self._list_changed(name)
+        messagebox.showinfo("Copied", "Prompt copied to clipboard!")
+
+    def _refresh_wrapper_choices(self):
+        choices = [self.DEFAULT_WRAPPER_CHOICE, self.NO_WRAPPER_CHOICE] + self._template_engine().wrappers()
+        self.wrapper_combo.config(values=choices)
+        if self.wrapper_var.get() not in choices: # The chosen wrapper prompt was renamed or deleted
+            self.wrapper_var.set(self.DEFAULT_WRAPPER_CHOICE)
+
+    def _selected_wrapper(self):
+        choice = self.wrapper_var.get()
+        if choice == self.NO_WRAPPER_CHOICE:
+            return None
+        if choice == self.DEFAULT_WRAPPER_CHOICE or choice not in self.store:
+            return DEFAULT_WRAPPER
+        return choice
+
+    def _ask_template_values(self, name, variables):
+        """Ask for a value per template variable; returns None if cancelled.
+
+        Variables left blank are copied as written ({$name}).
+        """
+        dialog = tk.Toplevel(self)
+        dialog.title("Fill In Prompt")
+        ttk.Label(dialog, text=f"Values for '{name}':").grid(row=0, column=0, columnspan=2, pady=5, padx=10, sticky='w')
+        entries = {}
+        for row, variable in enumerate(variables, start=1):
+            ttk.Label(dialog, text=variable).grid(row=row, column=0, padx=(10, 5), pady=2, sticky='e')
+            entry = ttk.Entry(dialog, width=40)
+            entry.grid(row=row, column=1, padx=(0, 10), pady=2, sticky='we')
+            entries[variable] = entry
+        entries[variables[0]].focus_set()
+        result = None
+
+        def accept(event=None):
+            nonlocal result
+            result = {variable: entry.get() for variable, entry in entries.items() if entry.get()}
+            dialog.destroy()
+
+        button_frame = ttk.Frame(dialog)
+        button_frame.grid(row=len(variables) + 1, column=0, columnspan=2, pady=10)
+        ttk.Button(button_frame, text="Copy", command=accept).pack(side=tk.LEFT, padx=10)
+        ttk.Button(button_frame, text="Cancel", command=dialog.destroy).pack(side=tk.LEFT, padx=10)
+        dialog.bind("<Return>", accept)
+        dialog.bind("<Escape>", lambda event: dialog.destroy())
+
+        dialog.transient(self)
+        dialog.grab_set()
+        self.wait_window(dialog)
+        return result
     # --- End NEW: Copy Prompt to Clipboard Function ---
 
 
     def toggle_edit_body(self):
         if not self.editing_body:
-            self.view_edit_body_text.config(state=tk.NORMAL)
+            if self._loading_blocks_edits():
+                return
+            if self.body_view.paged or self.body_view.loading:
+                # Editing needs the whole body in the widget; come back here once it is.
+                self.edit_body_button.config(state=tk.DISABLED)
+                self.body_view.show_full(on_loaded=self._body_ready_for_edit)
+                return
+            self.body_view.set_editable(True)
             self.edit_body_button.pack_forget()
             self.save_body_button.pack(side=tk.LEFT, padx=5)
             self.rename_button.config(state=tk.DISABLED)
             self.copy_prompt_button.config(state=tk.DISABLED) # Disable copy button during edit
+            self.history_button.config(state=tk.DISABLED)
             self.view_edit_body_text.focus_set()
             self.editing_body = True
+            self._body_before_edit = self.store.get(self.current_prompt_name)
         else: # This 'else' was missing in the original code for toggle_edit_body. Added for completeness, though not directly related to the new feature.
-            self.view_edit_body_text.config(state=tk.DISABLED) # Re-disable if toggling off edit mode without saving (hypothetical scenario from button logic point of view)
+            self.body_view.set_editable(False) # Re-disable if toggling off edit mode without saving (hypothetical scenario from button logic point of view)
             self.save_body_button.pack_forget() # Hide save button again if toggling off edit mode
             self.edit_body_button.pack(side=tk.LEFT, padx=5) # Show edit button again
             self.rename_button.config(state=tk.NORMAL) # Re-enable rename
             self.copy_prompt_button.config(state=tk.NORMAL) # Re-enable copy button
+            self.history_button.config(state=tk.NORMAL)
             self.editing_body = False # Ensure editing_body flag is set correctly if toggling off
 
     def save_edited_body(self):
@@ -426,48 +1124,166 @@ class PromptManagerApp(tk.Tk):
 
         # Use self.current_prompt_name which was set when view_prompt_body was called
         if self.current_prompt_name and self.editing_body:
-            new_body = self.view_edit_body_text.get("1.0", tk.END).strip()
+            if not self.body_view.modified:
+                self.toggle_edit_body() # Nothing typed; just leave edit mode
+                return
+            new_body = self.body_view.get().strip()
             if not new_body:
                  messagebox.showerror("Validation Error", "Prompt body cannot be empty.")
                  return
 
-            self.prompts[self.current_prompt_name] = new_body
+            if self.current_prompt_name not in self.store:
+                if not messagebox.askyesno("Prompt Deleted Elsewhere", f"'{self.current_prompt_name}' was deleted by someone else while you were editing it.\n\nSave your version anyway?"):
+                    return
+                self.store.put(self.current_prompt_name, new_body)
+                self._list_added(self.current_prompt_name)
+                self._record_revision(self.current_prompt_name, new_body, None)
+            else:
+                previous_body = self.store.get(self.current_prompt_name)
+                if previous_body != self._body_before_edit:
+                    if not messagebox.askyesno("Prompt Changed Elsewhere", f"'{self.current_prompt_name}' was changed by someone else while you were editing it.\n\nReplace their version with yours?"):
+                        return
+                self.store.put(self.current_prompt_name, new_body)
+                self._list_changed(self.current_prompt_name)
+                self._record_revision(self.current_prompt_name, new_body, previous_body)
             self.save_prompts()
-            self.view_edit_body_text.config(state=tk.DISABLED)
+            self.body_view.set_editable(False)
+            self.body_view.text.edit_modified(False)
             self.save_body_button.pack_forget()
             self.edit_body_button.pack(side=tk.LEFT, padx=5)
             self.rename_button.config(state=tk.NORMAL)
             self.copy_prompt_button.config(state=tk.NORMAL) # Re-enable copy button after save
+            self.history_button.config(state=tk.NORMAL)
             self.editing_body = False
             messagebox.showinfo("Success", f"Prompt '{self.current_prompt_name}' body updated.")
         elif not self.current_prompt_name:
             messagebox.showerror("Error", "Internal error: No prompt name tracked for saving body.")
 
 
+    def show_prompt_history(self):
+        """List the stored revisions of the current prompt, with a preview and restore."""
+        name = self.current_prompt_name
+        history = self._prompt_history()
+        if not name or name not in self.store or history is None:
+            messagebox.showerror("Error", "No prompt selected or prompt not found.")
+            return
+        try:
+            revisions = history.revisions(name)[::-1] # Newest first
+        except (OSError, PromptStoreError) as e:
+            messagebox.showerror("Error", f"Could not read the history of '{name}': {e}")
+            return
+        if not revisions:
+            messagebox.showinfo("History", f"'{name}' has no earlier versions yet. A version is kept each time you save body changes.")
+            return
+
+        dialog = tk.Toplevel(self)
+        dialog.title(f"History: {name}")
+        dialog.geometry("640x480")
+        pane = ttk.Frame(dialog)
+        pane.pack(fill="both", expand=True, padx=10, pady=10)
+        revision_list = tk.Listbox(pane, width=30, exportselection=False)
+        revision_list.pack(side=tk.LEFT, fill="y")
+        for revision in revisions:
+            stamp = time.strftime("%Y-%m-%d %H:%M", time.localtime(revision.time))
+            revision_list.insert(tk.END, f"#{revision.number}  {stamp}  ({revision.size:,} chars)")
+        preview = BodyView(pane)
+        preview.pack(side=tk.LEFT, fill="both", expand=True, padx=(10, 0))
+        preview.set_editable(False)
+
+        def selected_body():
+            selection = revision_list.curselection()
+            if not selection:
+                return None
+            try:
+                return history.body(name, revisions[selection[0]].number)
+            except (OSError, PromptStoreError) as e:
+                messagebox.showerror("Error", f"Could not read this version: {e}", parent=dialog)
+                return None
+
+        def close():
+            preview.cancel() # Stop filling in a large version before its widget goes away
+            dialog.destroy()
+
+        def on_select(event=None):
+            body = selected_body()
+            if body is not None:
+                preview.show(body)
+
+        def restore():
+            if self._loading_blocks_edits():
+                return
+            body = selected_body()
+            if body is None or name not in self.store:
+                return
+            previous_body = self.store.get(name)
+            if body == previous_body:
+                messagebox.showinfo("History", "This version is the current one.", parent=dialog)
+                return
+            if not messagebox.askyesno("Restore Version", f"Replace the current body of '{name}' with this version?\n\nThe current body stays in the history.", parent=dialog):
+                return
+            self.store.put(name, body)
+            self._list_changed(name)
+            self._record_revision(name, body, previous_body)
+            self.save_prompts()
+            close()
+            self.view_prompt_body(name)
+
+        revision_list.bind("<<ListboxSelect>>", on_select)
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(pady=(0, 10))
+        ttk.Button(button_frame, text="Restore This Version", command=restore).pack(side=tk.LEFT, padx=10)
+        ttk.Button(button_frame, text="Close", command=close).pack(side=tk.LEFT, padx=10)
+        dialog.protocol("WM_DELETE_WINDOW", close)
+        revision_list.selection_set(0)
+        on_select()
+
+        dialog.transient(self)
+        dialog.grab_set()
+        self.wait_window(dialog)
+
+    def show_similar_prompts(self):
+        """List the prompts whose bodies are most like the current one."""
+        name = self.current_prompt_name
+        if self.editing_body:
+            messagebox.showinfo("Info", "Please save or cancel body edits first.")
+            return
+        if not name or name not in self.store:
+            messagebox.showerror("Error", "No prompt selected or prompt not found.")
+            return
+        index = self._similarity_index()
+        if index is None:
+            messagebox.showinfo("Loading", "Prompts are still loading. Please try again once loading finishes.")
+            return
+        matches = index.similar(name)
+        if not matches:
+            messagebox.showinfo("Find Similar", f"No prompts are similar to '{name}'.")
+            return
+        dialog, tree = self._prompt_match_dialog(f"Similar to: {name}", f"Prompts most like '{name}'. Double-click one to open it.")
+        tree.heading("detail", text="Similarity")
+        for other, score in matches:
+            tree.insert("", tk.END, text=other, values=(f"{score:.0%}",), tags=("prompt",))
+        self.wait_window(dialog)
+
+    def _body_ready_for_edit(self):
+        self.edit_body_button.config(state=tk.NORMAL)
+        self.toggle_edit_body()
+
     def return_to_main_screen_from_view(self):
+        if self.editing_body and self.body_view.modified: # Tk's modified flag, no need to compare whole bodies
+            if not messagebox.askyesno("Confirmation", "You have unsaved changes to the body. Return to list and discard changes?"):
+                return
         if self.editing_body:
-             original_body = ""
-             if self.current_prompt_name in self.prompts:
-                 original_body = self.prompts[self.current_prompt_name]
-             current_body_text = self.view_edit_body_text.get("1.0", tk.END).strip()
-
-             if current_body_text != original_body:
-                 if messagebox.askyesno("Confirmation", "You have unsaved changes to the body. Return to list and discard changes?"):
-                     self.editing_body = False
-                     self.switch_frame("main")
-                 else:
-                     return
-             else:
-                 self.editing_body = False
-                 self.switch_frame("main")
-        else:
-            self.switch_frame("main")
+            self.toggle_edit_body()
+        self.body_view.cancel() # Stop filling in a body nobody is looking at
+        self.switch_frame("main")
 
     def edit_prompt_name_from_view(self):
          # Use self.current_prompt_name which was set when view_prompt_body was called
          if not self.prompt_directory:
              messagebox.showerror("Error", "Cannot rename prompt. No directory selected.")
              return
+         if self._loading_blocks_edits():
+             return
          if self.current_prompt_name and not self.editing_body:
              self.edit_prompt_name(self.current_prompt_name) # Call the rename logic
          elif self.editing_body:
@@ -481,7 +1297,7 @@ class PromptManagerApp(tk.Tk):
         if not self.prompt_directory:
              messagebox.showerror("Error", "Cannot rename prompt. No directory selected.")
              return
-        if old_name not in self.prompts:
+        if old_name not in self.store:
              messagebox.showerror("Error", "Cannot rename - prompt no longer exists.")
              self.update_prompt_list()
              return
@@ -506,14 +1322,13 @@ class PromptManagerApp(tk.Tk):
             if new_name == old_name:
                 edit_name_dialog.destroy()
                 return
-            if new_name in self.prompts:
+            if new_name in self.store:
                 messagebox.showerror("Validation Error", f"Prompt name '{new_name}' already exists.", parent=edit_name_dialog)
                 return
 
-            body = self.prompts.pop(old_name)
-            self.prompts[new_name] = body
+            self.store.rename(old_name, new_name)
             self.save_prompts()
-            self.update_prompt_list() # Update the Treeview
+            self._list_renamed(old_name, new_name)
 
             # If the renamed prompt was the one being viewed, update the view screen's state
             if self.current_prompt_name == old_name:
@@ -540,16 +1355,16 @@ class PromptManagerApp(tk.Tk):
         if not self.prompt_directory:
              messagebox.showerror("Error", "Cannot delete prompt. No directory selected.")
              return
-        if name not in self.prompts:
+        if name not in self.store:
              # This might happen if selection changes between clicking delete and confirmation
              messagebox.showerror("Error", "Cannot delete - prompt no longer exists or selection changed.")
              self.update_prompt_list()
              return
 
         if messagebox.askyesno("Confirmation", f"Are you sure you want to delete the prompt '{name}'?"):
-            del self.prompts[name]
+            self.store.delete(name)
             self.save_prompts()
-            self.update_prompt_list() # Update the Treeview
+            self._list_removed(name)
 
             # If deleting the currently viewed prompt, return to main screen
             # Check if view screen is active and name matches
@@ -562,5 +1377,27 @@ class PromptManagerApp(tk.Tk):
 
 
 if __name__ == "__main__":
-    app = PromptManagerApp()
-    app.mainloop()
\ No newline at end of file
+    import argparse
+    from PromptStore import BACKENDS
+    from PromptListView import LIST_MODES
+
+    parser = argparse.ArgumentParser(description="Prompt Manager")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=None,
+                        help="storage format for the prompt directory (default: detect from existing files)")
+    parser.add_argument("--save-delay", type=float, default=0.5,
+                        help="seconds to wait for further edits before writing them to disk (default: 0.5)")
+    parser.add_argument("--list-mode", choices=LIST_MODES, default="auto",
+                        help="'virtual' only creates rows that are on screen; 'auto' uses it for large libraries")
+    parser.add_argument("--metrics", action="store_true",
+                        help="record operation timings from startup (see the Diagnostics window; also PROMPT_METRICS=1)")
+    parser.add_argument("--trace-file", default=None,
+                        help="write recorded timings to this Chrome trace file on exit (implies --metrics)")
+    args = parser.parse_args()
+
+    if args.metrics or args.trace_file:
+        metrics.enable()
+
+    app = PromptManagerApp(backend=args.backend, save_delay=args.save_delay, list_mode=args.list_mode)
+    app.mainloop()
+    if args.trace_file:
+        metrics.dump_chrome_trace(args.trace_file)
\ No newline at end of file
@@ -0,0 +1,178 @@
+# Timing instrumentation for PromptManager's hot paths.
+#
+# Code marks operations with the module-level `metrics` registry:
+#
+#     @metrics.timed("store.save")
+#     def save(self): ...
+#
+#     with metrics.span("list.set_names"):
+#         ...
+#
+#     metrics.count("search.queries")
+#
+# While metrics are disabled (the default) a span is a shared no-op object
+# and timed functions pay one attribute check, so instrumentation can stay in
+# place permanently. Enabled, every span feeds a per-name latency summary
+# (count, total, p50/p95 over recent samples, max) and a bounded event buffer
+# that can be written out as a Chrome trace (chrome://tracing, Perfetto).
+
+from __future__ import annotations
+
+import functools
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+
+ENV_VAR = "PROMPT_METRICS"    # Set to 1 to start with metrics enabled
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.record(self.name, self.start, time.perf_counter_ns() - self.start)
+        return False
+
+
+class Histogram:
+    """Latency summary for one span name."""
+
+    SAMPLES = 2048   # Recent durations kept for the percentiles
+
+    def __init__(self):
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.samples = deque(maxlen=self.SAMPLES)
+
+    def add(self, duration_ns: int) -> None:
+        self.count += 1
+        self.total_ns += duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+        self.samples.append(duration_ns)
+
+    def percentile(self, fraction: float) -> int:
+        if not self.samples:
+            return 0
+        ordered = sorted(self.samples)
+        return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]  # Nearest rank
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "total_ms": self.total_ns / 1e6,
+            "p50_ms": self.percentile(0.50) / 1e6,
+            "p95_ms": self.percentile(0.95) / 1e6,
+            "max_ms": self.max_ns / 1e6,
+        }
+
+
+class Metrics:
+    """Registry of span timings, counters and trace events."""
+
+    MAX_EVENTS = 100000   # Trace events kept for export (oldest dropped first)
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._origin_ns = time.perf_counter_ns()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms: dict[str, Histogram] = {}
+            self._counters: dict[str, int] = {}
+            self._events = deque(maxlen=self.MAX_EVENTS)
+
+    def enable(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+
+    # --- Recording ---
+
+    def span(self, name: str):
+        """Context manager timing the enclosed block under name."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def timed(self, name: str):
+        """Decorator timing every call of a function under name."""
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter_ns()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(name, start, time.perf_counter_ns() - start)
+            return wrapper
+        return decorate
+
+    def count(self, name: str, n: int = 1) -> None:
+        if self.enabled:
+            with self._lock:
+                self._counters[name] = self._counters.get(name, 0) + n
+
+    def record(self, name: str, start_ns: int, duration_ns: int) -> None:
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.add(duration_ns)
+            self._events.append((name, start_ns, duration_ns, threading.get_ident()))
+
+    # --- Reporting ---
+
+    def snapshot(self) -> dict:
+        """Current counters and per-span summaries, sorted by name."""
+        with self._lock:
+            return {
+                "spans": {name: self._histograms[name].summary() for name in sorted(self._histograms)},
+                "counters": dict(sorted(self._counters.items())),
+            }
+
+    def dump_json(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=4)
+
+    def dump_chrome_trace(self, path: str) -> None:
+        """Write the recorded spans in Chrome's Trace Event format."""
+        with self._lock:
+            events = list(self._events)
+        pid = os.getpid()
+        trace = [{
+            "name": name, "cat": name.split(".", 1)[0], "ph": "X", "pid": pid, "tid": tid,
+            "ts": (start_ns - self._origin_ns) / 1000, "dur": duration_ns / 1000,
+        } for name, start_ns, duration_ns, tid in events]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+
+
+metrics = Metrics(enabled=os.environ.get(ENV_VAR, "") not in ("", "0"))
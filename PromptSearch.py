@@ -0,0 +1,736 @@
+# Full-text search over prompt names and bodies.
+#
+# SearchIndex is an inverted index (token -> postings of document ids and
+# weights) that is kept up to date through PromptStore listeners, so a query
+# only touches the postings of its own terms instead of scanning every body.
+# Terms are prefix-matched against a sorted vocabulary, results are ranked by
+# a tf-idf style score, and the index is persisted next to the data file so it
+# does not have to be rebuilt at every startup.
+#
+# Postings are compact arrays of ascending document ids. Re-indexing or
+# deleting a prompt retires its document id instead of editing every array it
+# appears in; retired ids are skipped by queries and dropped when the index is
+# compacted. Later query terms are matched against the candidates of the most
+# selective one by binary search in their postings when that is cheaper than
+# reading them. With NumPy installed a query is scored with array operations
+# instead, which keeps even terms that match most of a large library within a
+# keystroke's time.
+#
+# The persisted index also holds a CRC-32 of every body, so an index left
+# stale by changes made elsewhere is brought up to date by re-indexing only
+# the prompts whose bodies differ, rather than rebuilt.
+
+from __future__ import annotations
+
+import heapq
+import json
+import math
+import os
+import re
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from itertools import compress
+
+from PromptMetrics import metrics
+from PromptStore import atomic_write
+
+try:
+    import numpy as np
+except ImportError:  # Optional: everything works without it, only slower
+    np = None
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def body_crc(body: str) -> int:
+    return zlib.crc32(body.encode('utf-8'))
+
+
+class SearchIndex:
+    """Incrementally maintained inverted index for one PromptStore."""
+
+    FILENAME = "promptSearch.index"
+    MAGIC = b"PSIX"
+    VERSION = 2
+    NAME_WEIGHT = 5          # A token in the name counts as much as 5 in the body
+    MAX_WEIGHT = 0xFFFF      # Weights are stored as unsigned 16-bit values
+    MIN_PREFIX = 2           # Shorter query terms only match whole tokens
+    MAX_EXPANSION = 200      # Cap on vocabulary tokens one prefix may expand to
+    DEFAULT_LIMIT = 500
+    RANK_SLACK = 1024        # Spare name-rank entries for documents added later
+    LONG_POSTINGS = 4096     # Tokens in more documents than this are read best weight first
+
+    def __init__(self, store=None):
+        self.store = store
+        self._names: list[str | None] = []   # doc id -> name, None once retired
+        self._ids: dict[str, int] = {}       # live name -> doc id
+        self._crcs = array('I')              # doc id -> body_crc() of its body
+        self._retired_ids: set[int] = set()
+        self._rank = None                    # doc id -> position of its name in sorted order, once needed
+        self._sorted: list[str] = []         # Live names in sorted order, kept while _rank is
+        self._post_ids: dict[str, array] = {}
+        self._post_weights: dict[str, array] = {}
+        self._impact: dict[str, dict] = {}   # Long-posting token -> weight -> doc ids, once needed
+        self._vocab: list[str] = []          # Sorted tokens, for prefix lookups
+
+    # --- Building ---
+
+    @classmethod
+    def _terms(cls, name: str, body: str) -> Counter:
+        terms = Counter(tokenize(body))
+        for token in tokenize(name):
+            terms[token] += cls.NAME_WEIGHT
+        return terms
+
+    def add(self, name: str, body: str, update_vocab: bool = True) -> None:
+        """Index (or re-index) one prompt."""
+        self.remove(name)
+        doc_id = len(self._names)
+        self._names.append(name)
+        self._ids[name] = doc_id
+        self._crcs.append(body_crc(body))
+        if self._rank is not None:
+            self._rank_insert(doc_id, name)
+        for token, weight in self._terms(name, body).items():
+            ids = self._post_ids.get(token)
+            if ids is None:
+                ids = self._post_ids[token] = array('I')
+                self._post_weights[token] = array('H')
+                if update_vocab:
+                    insort(self._vocab, token)
+            weight = min(weight, self.MAX_WEIGHT)
+            ids.append(doc_id)
+            self._post_weights[token].append(weight)
+            groups = self._impact.get(token)
+            if groups is not None:
+                group = groups.get(weight)
+                if group is None:
+                    group = groups[weight] = array('I')
+                group.append(doc_id)
+
+    def remove(self, name: str) -> None:
+        doc_id = self._ids.pop(name, None)
+        if doc_id is not None:
+            if self._rank is not None:
+                self._rank_remove(name)
+            self._names[doc_id] = None
+            self._retired_ids.add(doc_id)
+            if self._retired() > max(1000, len(self._ids)):
+                self.compact()
+
+    def rename(self, old_name: str, new_name: str, body: str) -> None:
+        # Name tokens are weighted differently from body tokens, so re-index.
+        self.remove(old_name)
+        self.add(new_name, body)
+
+    @metrics.timed("search.rebuild")
+    def rebuild(self, items) -> None:
+        """Index everything from scratch from (name, body) pairs."""
+        self._names = []
+        self._ids = {}
+        self._crcs = array('I')
+        self._retired_ids = set()
+        self._rank = None
+        self._post_ids = {}
+        self._post_weights = {}
+        self._impact = {}
+        for name, body in items:
+            self.add(name, body, update_vocab=False)
+        self._vocab = sorted(self._post_ids)
+        self._prepare()
+
+    def _prepare(self) -> None:
+        """Build what queries would otherwise build on first use.
+
+        That is the name rank with NumPy, else the impact groups of the long
+        postings. Done with the rest of (re)building, which open() runs off
+        the UI thread, so the first keystroke of a search does not pay.
+        """
+        if np is not None:
+            self._name_rank()
+        else:
+            for token, ids in self._post_ids.items():
+                if len(ids) > self.LONG_POSTINGS:
+                    self._impact_groups(token)
+
+    def _retired(self) -> int:
+        return len(self._names) - len(self._ids)
+
+    def compact(self) -> None:
+        """Drop retired document ids and renumber the rest."""
+        remap = array('i', [-1]) * len(self._names)
+        names = []
+        crcs = array('I')
+        for doc_id, name in enumerate(self._names):
+            if name is not None:
+                remap[doc_id] = len(names)
+                names.append(name)
+                crcs.append(self._crcs[doc_id])
+        for token in list(self._post_ids):
+            new_ids, new_weights = array('I'), array('H')
+            for doc_id, weight in zip(self._post_ids[token], self._post_weights[token]):
+                new_id = remap[doc_id]
+                if new_id >= 0:
+                    new_ids.append(new_id)
+                    new_weights.append(weight)
+            if new_ids:
+                self._post_ids[token] = new_ids
+                self._post_weights[token] = new_weights
+            else:
+                del self._post_ids[token]
+                del self._post_weights[token]
+        self._names = names
+        self._ids = {name: doc_id for doc_id, name in enumerate(names)}
+        self._crcs = crcs
+        self._retired_ids = set()
+        self._rank = None
+        self._impact = {}
+        self._vocab = sorted(self._post_ids)
+        self._prepare()
+
+    def __len__(self):
+        return len(self._ids)
+
+    # --- Store integration ---
+
+    @classmethod
+    def open(cls, store, attach: bool = True) -> SearchIndex:
+        """Load the persisted index for store and bring it up to date, else rebuild it.
+
+        The returned index follows further store mutations as they happen.
+        With attach=False it only does so once attach() is called, so the
+        slow part can run on a worker thread while the store is not changing.
+        """
+        index = cls(store)
+        if not index._load_persisted(refresh=True):
+            index.rebuild(store.items())
+        if attach:
+            index.attach()
+        return index
+
+    @classmethod
+    def open_persisted(cls, store) -> SearchIndex | None:
+        """The persisted index for store if it is current, else None.
+
+        Unlike open() this neither needs a loaded store nor follows mutations,
+        which suits one-off queries from scripts.
+        """
+        index = cls(store)
+        return index if index._load_persisted() else None
+
+    def attach(self) -> None:
+        self.store.add_listener(self.on_change)
+
+    def detach(self) -> None:
+        if self.store is not None:
+            self.store.remove_listener(self.on_change)
+
+    def on_change(self, change) -> None:
+        if change.op == "put":
+            self.add(change.name, change.body)
+        elif change.op == "rename":
+            self.rename(change.name, change.new_name, self.store.get(change.new_name))
+        elif change.op == "delete":
+            self.remove(change.name)
+        elif change.op == "reset":
+            self.rebuild(self.store.items())
+
+    @metrics.timed("search.refresh")
+    def refresh(self) -> int:
+        """Re-index the store's prompts whose bodies differ from the indexed ones.
+
+        Reads every body, but only tokenizes the changed ones. Returns the
+        number of prompts added, changed or removed.
+        """
+        self._rank = None  # Cheaper to rebuild on the next query than to update per change
+        removed = [name for name in self._ids if name not in self.store]
+        for name in removed:
+            self.remove(name)
+        changed = 0
+        for name, body in self.store.items():
+            doc_id = self._ids.get(name)
+            if doc_id is None or self._crcs[doc_id] != body_crc(body):
+                self.add(name, body)
+                changed += 1
+        self._prepare()
+        return changed + len(removed)
+
+    # --- Persistence ---
+    #
+    # File layout: MAGIC, then a uint32 length and a JSON header holding the
+    # version, the data file signature, the document names and the tokens with
+    # their posting lengths; then the body CRCs in document order, then every
+    # token's id array followed by its weight array, in header order.
+
+    @property
+    def path(self) -> str | None:
+        if self.store is None or not self.store.directory:
+            return None
+        return os.path.join(self.store.directory, self.FILENAME)
+
+    @metrics.timed("search.persist")
+    def persist(self) -> None:
+        """Write the index next to the data file, tagged with the data's signature.
+
+        Call this after the store has flushed its writes (e.g. at shutdown) so
+        the signature matches what is on disk.
+        """
+        path = self.path
+        if path is None:
+            return
+        if self._retired():
+            self.compact()
+        tokens = self._vocab
+        header = json.dumps({
+            "version": self.VERSION,
+            "signature": self.store.signature(),
+            "names": self._names,
+            "tokens": tokens,
+            "lengths": [len(self._post_ids[token]) for token in tokens],
+            "byteorder": sys.byteorder,
+        }).encode('utf-8')
+        with atomic_write(path, 'wb') as f:
+            f.write(self.MAGIC)
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+            self._crcs.tofile(f)
+            for token in tokens:
+                self._post_ids[token].tofile(f)
+                self._post_weights[token].tofile(f)
+
+    @metrics.timed("search.load")
+    def _load_persisted(self, refresh: bool = False) -> bool:
+        """Read the persisted index; True if it matches the store's files.
+
+        With refresh, an index persisted for an earlier state of the files is
+        read too and brought up to date (see refresh()).
+        """
+        path = self.path
+        if path is None or not os.path.exists(path):
+            return False
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            if data[:4] != self.MAGIC:
+                return False
+            (header_len,) = struct.unpack_from("<I", data, 4)
+            header = json.loads(data[8:8 + header_len])
+        except (OSError, ValueError, struct.error):
+            return False
+        if header.get("version") != self.VERSION:
+            return False
+        current = header.get("signature") == self.store.signature()
+        if not current and not refresh:
+            return False
+
+        view = memoryview(data)
+        pos = 8 + header_len
+        post_ids, post_weights = {}, {}
+        id_size, weight_size = array('I').itemsize, array('H').itemsize
+        crcs = array('I')
+        crcs.frombytes(view[pos:pos + len(header["names"]) * id_size])
+        pos += len(header["names"]) * id_size
+        if header["byteorder"] != sys.byteorder:
+            crcs.byteswap()
+        for token, length in zip(header["tokens"], header["lengths"]):
+            ids, weights = array('I'), array('H')
+            ids.frombytes(view[pos:pos + length * id_size])
+            pos += length * id_size
+            weights.frombytes(view[pos:pos + length * weight_size])
+            pos += length * weight_size
+            if header["byteorder"] != sys.byteorder:
+                ids.byteswap()
+                weights.byteswap()
+            post_ids[token] = ids
+            post_weights[token] = weights
+        if pos != len(data):
+            return False
+
+        self._names = header["names"]
+        self._ids = {name: doc_id for doc_id, name in enumerate(self._names)}
+        self._crcs = crcs
+        self._retired_ids = set()
+        self._rank = None
+        self._post_ids = post_ids
+        self._post_weights = post_weights
+        self._impact = {}
+        self._vocab = header["tokens"]
+        if current:
+            self._prepare()
+        else:
+            self.refresh()
+        return True
+
+    # --- Queries ---
+
+    def _expand(self, term: str) -> list[str]:
+        """Vocabulary tokens matched by one query term."""
+        if len(term) < self.MIN_PREFIX:
+            return [term] if term in self._post_ids else []
+        start = bisect_left(self._vocab, term)
+        end = bisect_left(self._vocab, term + "\uffff", start)
+        return self._vocab[start:min(end, start + self.MAX_EXPANSION)]
+
+    @metrics.timed("search.query")
+    def search(self, query: str, limit: int | None = DEFAULT_LIMIT) -> list[str]:
+        """Names matching every term of query, best match first."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        expansions = [self._expand(term) for term in terms]
+        if not all(expansions):
+            return []
+        # Score the most selective term first; later terms only add to (and
+        # filter) the candidates it produced.
+        expansions.sort(key=lambda tokens: sum(len(self._post_ids[token]) for token in tokens))
+        if np is not None:
+            return self._search_numpy(expansions, limit)
+        if len(expansions) == 1 and len(expansions[0]) == 1:
+            return self._search_token(expansions[0][0], limit)
+
+        if limit is not None and sum(len(self._post_ids[token]) for token in expansions[0]) > self.LONG_POSTINGS:
+            scores = self._top_scores(expansions, limit)
+        else:
+            scores = self._all_scores(expansions)
+
+        names = self._names
+        if limit is not None and len(scores) > limit:
+            # Pick the top scores cheaply, then order them (ties by name).
+            cutoff = heapq.nlargest(limit, scores.values())[-1]
+            best = [(doc_id, score) for doc_id, score in scores.items() if score > cutoff]
+            tied = [names[doc_id] for doc_id, score in scores.items() if score == cutoff]
+            best += [(self._ids[name], cutoff) for name in heapq.nsmallest(limit - len(best), tied)]
+        else:
+            best = scores.items()
+        ranked = sorted((-score, names[doc_id]) for doc_id, score in best)
+        return [name for _, name in ranked[:limit]]
+
+    def _all_scores(self, expansions) -> dict[int, float]:
+        """doc id -> score of every live document matching all expansions."""
+        scores = None
+        for tokens in expansions:
+            term_scores = {}
+            for token in tokens:
+                token_scores = self._token_scores(token, scores)
+                if not term_scores:
+                    term_scores = token_scores
+                else:
+                    get = term_scores.get
+                    for doc_id, score in token_scores.items():
+                        term_scores[doc_id] = get(doc_id, 0.0) + score
+            if scores is None:
+                scores = term_scores
+                for doc_id in self._retired_ids:
+                    scores.pop(doc_id, None)
+            else:
+                scores = {doc_id: scores[doc_id] + score for doc_id, score in term_scores.items()}
+            if not scores:
+                return {}
+        return scores
+
+    def _top_scores(self, expansions, limit) -> dict[int, float]:
+        """Scores of enough documents to hold the best limit of _all_scores(), ties included.
+
+        Every term here matches many documents, so rather than score them
+        all, read the long postings best weight first (see _impact_groups)
+        and score each document met in full. Stop once the limit-th best
+        score beats what any document not met yet could still reach: the
+        sum of the weights the long postings are at, plus the most a
+        document can get from the short ones.
+        """
+        # Per term: the ids with a short posting, then per token (dict.get of
+        # its short posting, or None, ids, weights, idf) for all tokens and
+        # for the long ones only. Tokens stay in order so scores add up
+        # exactly as in _all_scores().
+        lookups = []
+        streams = []   # Per long posting: [its weights, best first; position; _impact_groups(); idf]
+        short_bound = 0.0
+        short_ids = set()
+        for tokens in expansions:
+            term = []
+            short = {}
+            for token in tokens:
+                ids, weights = self._post_ids[token], self._post_weights[token]
+                idf = self._idf(token)
+                if len(ids) > self.LONG_POSTINGS:
+                    groups = self._impact_groups(token)
+                    streams.append([sorted(groups, reverse=True), 0, groups, idf])
+                    term.append((None, ids, weights, idf))
+                else:
+                    term.append((dict(zip(ids, weights)).get, None, None, idf))
+                    get = short.get
+                    for doc_id, weight in zip(ids, weights):
+                        short[doc_id] = get(doc_id, 0.0) + weight * idf
+            lookups.append((short.keys(), term, [lookup for lookup in term if lookup[0] is None]))
+            short_bound += max(short.values(), default=0.0)
+            short_ids.update(short)
+        short_bound *= 1 + 1e-9   # Summed in another order than the scores; stay above them
+
+        retired = self._retired_ids
+        seen = set()
+        scores = {}
+        lowest = []    # Heap of the best limit scores so far
+
+        def score(doc_id):
+            total = 0.0
+            for short, term, long in lookups:
+                term_score = 0.0
+                for get, ids, weights, idf in (term if doc_id in short else long):
+                    if get is not None:
+                        weight = get(doc_id)
+                        if weight:
+                            term_score += weight * idf
+                    else:
+                        i = bisect_left(ids, doc_id)
+                        if i < len(ids) and ids[i] == doc_id:
+                            term_score += weights[i] * idf
+                if not term_score:
+                    return
+                total += term_score
+            scores[doc_id] = total
+            if len(lowest) < limit:
+                heapq.heappush(lowest, total)
+            elif total > lowest[0]:
+                heapq.heapreplace(lowest, total)
+
+        while True:
+            bound = short_bound
+            best = None
+            for stream in streams:
+                order, pos, _, idf = stream
+                if pos < len(order):
+                    reach = order[pos] * idf
+                    bound += reach
+                    if best is None or reach > best_reach:
+                        best, best_reach = stream, reach
+            if len(lowest) == limit and lowest[0] > bound:
+                return scores
+            if best is None:
+                break
+            order, pos, groups, _ = best
+            best[1] += 1
+            for doc_id in groups[order[pos]]:
+                if doc_id not in seen and doc_id not in retired:
+                    seen.add(doc_id)
+                    score(doc_id)
+        # Every long posting read: only documents with short postings are left.
+        for doc_id in short_ids:
+            if doc_id not in seen and doc_id not in retired:
+                score(doc_id)
+        return scores
+
+    def _impact_groups(self, token) -> dict[int, array]:
+        """weight -> ids of the documents with that weight for token, kept up to date by add()."""
+        groups = self._impact.get(token)
+        if groups is None:
+            groups = {}
+            for doc_id, weight in zip(self._post_ids[token], self._post_weights[token]):
+                group = groups.get(weight)
+                if group is None:
+                    group = groups[weight] = array('I')
+                group.append(doc_id)
+            self._impact[token] = groups
+        return groups
+
+    def _search_token(self, token, limit):
+        """search() for a query of one token, whose scores all share one idf: ranked by weight alone."""
+        ids, weights = self._post_ids[token], self._post_weights[token]
+        if limit is not None and len(ids) > self.LONG_POSTINGS:
+            # Read the documents best weight first, only as far as the limit.
+            groups = self._impact_groups(token)
+            names, retired = self._names, self._retired_ids
+            found = []
+            for weight in sorted(groups, reverse=True):
+                group = [names[doc_id] for doc_id in groups[weight] if doc_id not in retired]
+                found += heapq.nsmallest(limit - len(found), group)
+                if len(found) == limit:
+                    break
+            return found
+        counts = Counter(weights)
+        retired = set()
+        for doc_id in self._retired_ids:
+            i = bisect_left(ids, doc_id)
+            if i < len(ids) and ids[i] == doc_id:
+                counts[weights[i]] -= 1
+                retired.add(doc_id)
+        # The lowest weight still within the best limit documents.
+        cutoff = 0
+        if limit is not None:
+            total = 0
+            for weight in sorted(counts, reverse=True):
+                total += counts[weight]
+                if total >= limit:
+                    cutoff = weight
+                    break
+        names = self._names
+        best = []
+        tied = []
+        for weight, doc_id in compress(zip(weights, ids), map(cutoff.__le__, weights)):
+            if doc_id not in retired:
+                if weight > cutoff:
+                    best.append((-weight, names[doc_id]))
+                else:
+                    tied.append(names[doc_id])
+        best.sort()
+        if limit is not None:
+            tied = heapq.nsmallest(limit - len(best), tied)
+        return [name for _, name in best] + sorted(tied)
+
+    def _idf(self, token) -> float:
+        return math.log(1 + (len(self._ids) or 1) / len(self._post_ids[token]))
+
+    def _token_scores(self, token, candidates=None) -> dict[int, float]:
+        """doc id -> score for one token, limited to candidates if given."""
+        ids, weights = self._post_ids[token], self._post_weights[token]
+        idf = self._idf(token)
+        if candidates is None:
+            return dict(zip(ids, map(idf.__mul__, weights)))
+        if len(candidates) * max(1, len(ids).bit_length()) < len(ids):
+            # Few candidates: find each in the ascending ids instead of reading them all.
+            scores = {}
+            for doc_id in candidates:
+                i = bisect_left(ids, doc_id)
+                if i < len(ids) and ids[i] == doc_id:
+                    scores[doc_id] = weights[i] * idf
+            return scores
+        return {doc_id: weight * idf for doc_id, weight in zip(ids, weights) if doc_id in candidates}
+
+    def _search_numpy(self, expansions, limit):
+        size = len(self._names)
+        total = np.zeros(size)
+        matched = None
+        for tokens in expansions:
+            term = np.zeros(size)
+            for token in tokens:
+                ids = np.frombuffer(self._post_ids[token], dtype=np.uint32)
+                term[ids] += np.frombuffer(self._post_weights[token], dtype=np.uint16) * self._idf(token)
+            total += term
+            matched = term > 0 if matched is None else matched & (term > 0)
+        if self._retired_ids:
+            matched[np.fromiter(self._retired_ids, dtype=np.int64, count=len(self._retired_ids))] = False
+        doc_ids = np.flatnonzero(matched)
+        scores = total[doc_ids]
+        if limit is not None and len(doc_ids) > limit:
+            # Same cut as the pure-Python path: everything above the limit-th
+            # score, then the tied documents with the first names.
+            cutoff = np.partition(scores, len(scores) - limit)[len(scores) - limit]
+            rank = self._name_rank()
+            best = doc_ids[scores > cutoff]
+            tied = doc_ids[scores == cutoff]
+            tied_rank = rank[tied]
+            keep = limit - len(best)
+            if keep < len(tied):
+                tied = tied[np.argpartition(tied_rank, keep - 1)[:keep]] if keep else tied[:0]
+            doc_ids = np.concatenate((best, tied))
+            scores = total[doc_ids]
+        order = np.lexsort((self._name_rank()[doc_ids], -scores))
+        names = self._names
+        return [names[doc_id] for doc_id in doc_ids[order].tolist()]
+
+    def _name_rank(self):
+        """doc id -> position of its name among the live names, sorted (NumPy array).
+
+        Built on first use, then kept up to date by add() and remove(), so
+        the query after an edit does not sort every name again. Entries of
+        retired (and not yet used) doc ids are meaningless.
+        """
+        if self._rank is None:
+            rank = np.zeros(len(self._names) + self.RANK_SLACK, dtype=np.int64)
+            ordered = sorted(self._ids.items())
+            rank[np.fromiter((doc_id for _, doc_id in ordered), dtype=np.int64, count=len(ordered))] = \
+                np.arange(len(ordered))
+            self._sorted = [name for name, _ in ordered]
+            self._rank = rank
+        return self._rank
+
+    def _rank_insert(self, doc_id, name):
+        pos = bisect_left(self._sorted, name)
+        self._sorted.insert(pos, name)
+        rank = self._rank
+        if doc_id >= len(rank):
+            rank = self._rank = np.concatenate((rank, np.zeros(len(rank) // 4 + self.RANK_SLACK, dtype=np.int64)))
+        rank[rank >= pos] += 1
+        rank[doc_id] = pos
+
+    def _rank_remove(self, name):
+        pos = bisect_left(self._sorted, name)
+        del self._sorted[pos]
+        rank = self._rank
+        rank[rank > pos] -= 1
+
+
+class BackendSearch:
+    """SearchIndex stand-in that queries a backend's own full-text index.
+
+    The backend only sees edits once they are saved, and saving is left to
+    the writer (a WriteBehindWriter, if any) so that a search never waits
+    for the disk. Until then the prompts edited since everything was last
+    on disk are matched in memory instead: each query token must start a
+    token of the name or body, close to what the backend does. They are
+    dropped from the backend's results and, if they still match, listed
+    first.
+    """
+
+    def __init__(self, store, writer=None):
+        self.store = store
+        self.writer = writer
+        self._unsaved: set[str] = set()   # Names edited since everything was last on disk
+
+    @metrics.timed("search.query")
+    def search(self, query: str, limit: int | None = SearchIndex.DEFAULT_LIMIT) -> list[str]:
+        if self._unsaved and not self.store.dirty and not (self.writer is not None and self.writer.pending):
+            self._unsaved.clear()
+        if not self._unsaved:
+            return self.store.backend.search(query, limit)
+        terms = tokenize(query)
+        if not terms:
+            return []
+        edited = sorted(name for name in self._unsaved if name in self.store and self._matches(terms, name))
+        found = self.store.backend.search(query, None if limit is None else limit + len(self._unsaved))
+        results = edited + [name for name in found if name not in self._unsaved]
+        return results[:limit]
+
+    def _matches(self, terms, name) -> bool:
+        tokens = set(tokenize(name))
+        tokens.update(tokenize(self.store.get(name)))
+        return all(any(token.startswith(term) for token in tokens) for term in terms)
+
+    def on_change(self, change) -> None:
+        if change.op == "reset":
+            self._unsaved.clear()
+        else:
+            self._unsaved.add(change.name)
+            if change.new_name is not None:
+                self._unsaved.add(change.new_name)
+
+    def persist(self) -> None:
+        pass  # The backend keeps its index on disk itself.
+
+    def attach(self) -> None:
+        self.store.add_listener(self.on_change)
+
+    def detach(self) -> None:
+        self.store.remove_listener(self.on_change)
+
+
+def open_search(store, writer=None, attach: bool = True):
+    """The search object for store: the backend's own index if it has one, else a SearchIndex.
+
+    writer is the WriteBehindWriter saving store, if there is one; for attach
+    see SearchIndex.open().
+    """
+    backend = store.backend
+    if backend is not None and getattr(backend, "has_fts", False):
+        search = BackendSearch(store, writer)
+        if attach:
+            search.attach()
+        return search
+    return SearchIndex.open(store, attach)
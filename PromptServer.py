@@ -0,0 +1,388 @@
+# Serving a prompt library to other programs.
+#
+#     python PromptCLI.py serve                       # http://127.0.0.1:8765
+#     python PromptCLI.py serve --socket /tmp/prompts.sock
+#
+# PromptServer keeps one store loaded, together with its search index and
+# compiled templates, and answers HTTP/1.1 requests on localhost or on a Unix
+# domain socket. Connections are kept alive, so a client that holds one open
+# (see PromptClient) pays for a lookup, not for a connection or a file parse:
+#
+#     GET  /names                      all prompt names (JSON list)
+#     GET  /prompt/<name>              one body (text/plain; 404 if missing)
+#     POST /get     {"names": [...]}   {"prompts": {name: body}, "missing": [...]}
+#     GET  /search?q=...&limit=20      matching names, best first (JSON list)
+#     POST /render  {"name": ..., "values": {...}, "wrap": false,
+#                    "wrapper": null, "strict": false}   the rendered text
+#
+# Errors come back as {"error": message} with status 400, 404 for a missing
+# prompt, or 500 if the server itself failed; the connection stays open
+# either way. Before answering, the server checks the store's files at most
+# every CHECK_INTERVAL seconds and merges whatever the GUI, the command line
+# or another program saved (PromptStore.merge_external). The merge notifies
+# the search index and the template cache, so stale entries are dropped
+# rather than the whole library being re-indexed. Nothing here imports tkinter.
+
+from __future__ import annotations
+
+import http.client
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PromptMetrics import metrics
+from PromptStore import PromptNotFoundError, PromptStore, PromptStoreError
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+JSON_TYPE = "application/json"
+TEXT_TYPE = "text/plain; charset=utf-8"
+
+
+class PromptService:
+    """The operations a PromptServer answers, against one loaded store.
+
+    Thread-safe: requests from different connections are served one at a
+    time, each after refresh() has taken in changes saved on disk.
+    """
+
+    CHECK_INTERVAL = 0.1      # Seconds between checks of the store's files
+    CACHE_SIZE = 65536        # Bodies kept in memory for lazy backends
+
+    def __init__(self, store: PromptStore):
+        from PromptSearch import open_search
+        from PromptTemplate import TemplateEngine
+        self.store = store
+        self._lock = threading.RLock()
+        self._checked = time.monotonic()
+        self.search_index = open_search(store)
+        self.templates = TemplateEngine(store)
+
+    @classmethod
+    def open(cls, directory: str, backend: str | None = None) -> PromptService:
+        store = PromptStore(directory, backend=backend, cache_size=cls.CACHE_SIZE)
+        if not store.exists():
+            raise PromptStoreError(f"No prompt library in '{directory}'.")
+        store.load()
+        return cls(store)
+
+    def close(self) -> None:
+        with self._lock:
+            self.search_index.persist()
+            self.search_index.detach()
+            self.templates.detach()
+            self.store.close(compact=False)
+
+    def refresh(self, force: bool = False) -> None:
+        """Merge changes other programs saved, unless that was checked very recently."""
+        now = time.monotonic()
+        if not force and now - self._checked < self.CHECK_INTERVAL:
+            return
+        self._checked = now
+        try:
+            self.store.merge_external()
+        except (PromptStoreError, OSError, ValueError):
+            # Most likely caught mid-write; keep serving what we have and retry next time.
+            self._checked = now - self.CHECK_INTERVAL
+
+    # --- Operations ---
+
+    def names(self) -> list[str]:
+        with self._lock:
+            self.refresh()
+            return self.store.names()
+
+    def get(self, name: str) -> str:
+        with self._lock:
+            self.refresh()
+            return self.store.get(name)
+
+    def get_many(self, names) -> tuple[dict[str, str], list[str]]:
+        """Bodies of the names that exist, and the names that do not."""
+        with self._lock:
+            self.refresh()
+            found = {}
+            missing = []
+            for name in names:
+                if name in self.store:
+                    found[name] = self.store.get(name)
+                else:
+                    missing.append(name)
+            return found, missing
+
+    def search(self, query: str, limit: int | None = 20) -> list[str]:
+        with self._lock:
+            self.refresh()
+            return self.search_index.search(query, limit)
+
+    def render(self, name: str, values: dict | None = None, wrap: bool = False,
+               wrapper: str | None = None, strict: bool = False) -> str:
+        from PromptTemplate import DEFAULT_WRAPPER
+        with self._lock:
+            self.refresh()
+            return self.templates.render_wrapped(name, values, wrapper or (DEFAULT_WRAPPER if wrap else None),
+                                                 strict=strict)
+
+
+class _BadRequest(ValueError):
+    pass
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"    # Keep-alive
+    server_version = "PromptServer"
+
+    @property
+    def service(self) -> PromptService:
+        return self.server.service
+
+    def do_GET(self):
+        self._dispatch({
+            "/names": self._names,
+            "/search": self._search,
+        })
+
+    def do_POST(self):
+        self._dispatch({
+            "/get": self._get_many,
+            "/render": self._render,
+        })
+
+    def _dispatch(self, routes):
+        path, _, query = self.path.partition("?")
+        try:
+            with metrics.span("server.request"):
+                if path.startswith("/prompt/") and self.command == "GET":
+                    self._send(200, self.service.get(urllib.parse.unquote(path[len("/prompt/"):])), TEXT_TYPE)
+                    return
+                route = routes.get(path)
+                if route is None:
+                    self.close_connection = True  # Any request body is left unread
+                    self._send_json(404, {"error": f"No such endpoint: {self.command} {path}"})
+                    return
+                route(urllib.parse.parse_qs(query))
+        except PromptNotFoundError as e:
+            self._send_json(404, {"error": str(e)})
+        except (PromptStoreError, ValueError) as e:
+            self._send_json(400, {"error": str(e)})
+        except Exception as e:  # A bug rather than a bad request; still answer it
+            self.log_error("Error handling %s %s: %r", self.command, path, e)
+            self._send_json(500, {"error": f"Internal error: {e}"})
+
+    # --- Endpoints ---
+
+    def _names(self, params):
+        self._send_json(200, self.service.names())
+
+    def _search(self, params):
+        query = params.get("q", [""])[0]
+        limit = int(params["limit"][0]) if "limit" in params else 20
+        self._send_json(200, self.service.search(query, limit))
+
+    def _get_many(self, params):
+        names = self._read_json().get("names")
+        if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+            raise _BadRequest('Expected {"names": [...]} with a list of strings.')
+        found, missing = self.service.get_many(names)
+        self._send_json(200, {"prompts": found, "missing": missing})
+
+    def _render(self, params):
+        request = self._read_json()
+        if not isinstance(request.get("name"), str):
+            raise _BadRequest('Expected {"name": ...}.')
+        if not isinstance(request.get("values") or {}, dict):
+            raise _BadRequest('"values" must be an object mapping variable names to values.')
+        if not isinstance(request.get("wrapper") or "", str):
+            raise _BadRequest('"wrapper" must be a prompt name or null.')
+        text = self.service.render(request["name"], request.get("values"), bool(request.get("wrap")),
+                                   request.get("wrapper"), bool(request.get("strict")))
+        self._send(200, text, TEXT_TYPE)
+
+    # --- Plumbing ---
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length)) if length else {}
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise _BadRequest(f"Request body is not valid JSON: {e}") from None
+        if not isinstance(request, dict):
+            raise _BadRequest("Request body must be a JSON object.")
+        return request
+
+    def _send_json(self, status, payload):
+        self._send(status, json.dumps(payload, ensure_ascii=False), JSON_TYPE)
+
+    def _send(self, status, text, content_type):
+        data = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class _TcpHandler(_Handler):
+    # Headers and body go out in separate writes; without this, Nagle's
+    # algorithm can hold the body back until the client acknowledges.
+    disable_nagle_algorithm = True
+
+
+class _TcpServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class PromptServer:
+    """A PromptService on localhost TCP (the default) or on a Unix domain socket."""
+
+    def __init__(self, service: PromptService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 socket_path: str | None = None, verbose: bool = False):
+        self.service = service
+        self.socket_path = socket_path
+        if socket_path is not None:
+            _remove_stale_socket(socket_path)
+            self._server = _UnixServer(socket_path, _Handler)
+        else:
+            self._server = _TcpServer((host, port), _TcpHandler)
+        self._server.service = service
+        self._server.verbose = verbose
+        self._thread = None
+
+    @property
+    def address(self) -> str:
+        if self.socket_path is not None:
+            return self.socket_path
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def start(self) -> None:
+        """Serve on a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="PromptServer", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        """Stop serving and close the service's store."""
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+        if self.socket_path is not None:
+            try:
+                os.remove(self.socket_path)
+            except FileNotFoundError:
+                pass
+        self.service.close()
+
+
+def _remove_stale_socket(path):
+    """Remove a socket file left behind by a server that is no longer running."""
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.remove(path)
+    else:
+        raise PromptStoreError(f"A server is already listening on '{path}'.")
+    finally:
+        probe.close()
+
+
+# --- Client ---
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self._socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._socket_path)
+
+
+class PromptClient:
+    """One kept-alive connection to a PromptServer; not thread-safe.
+
+        client = PromptClient(socket_path="/tmp/prompts.sock")
+        body = client.get("Code review")
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, socket_path: str | None = None,
+                 timeout: float = 10.0):
+        if socket_path is not None:
+            self._connection = _UnixConnection(socket_path, timeout)
+        else:
+            self._connection = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def _request(self, method, path, payload=None):
+        body = None if payload is None else json.dumps(payload).encode('utf-8')
+        headers = {"Content-Type": JSON_TYPE} if body is not None else {}
+        for attempt in (1, 2):
+            reused = self._connection.sock is not None
+            try:
+                self._connection.request(method, path, body, headers)
+                response = self._connection.getresponse()
+                data = response.read().decode('utf-8')
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # The server dropped an idle kept-alive connection; reconnect once.
+                # A new connection failing like this is not that, so no retry.
+                self._connection.close()
+                if attempt == 2 or not reused:
+                    raise
+        if response.status != 200:
+            message = json.loads(data).get("error", data)
+            if response.status == 404 and path.startswith("/prompt/"):
+                raise PromptNotFoundError(urllib.parse.unquote(path[len("/prompt/"):]))
+            raise PromptStoreError(message)
+        return json.loads(data) if response.getheader("Content-Type") == JSON_TYPE else data
+
+    def names(self) -> list[str]:
+        return self._request("GET", "/names")
+
+    def get(self, name: str) -> str:
+        return self._request("GET", "/prompt/" + urllib.parse.quote(name, safe=""))
+
+    def get_many(self, names) -> dict[str, str]:
+        """Bodies of those of names that exist, in one round trip."""
+        return self._request("POST", "/get", {"names": list(names)})["prompts"]
+
+    def search(self, query: str, limit: int = 20) -> list[str]:
+        return self._request("GET", "/search?" + urllib.parse.urlencode({"q": query, "limit": limit}))
+
+    def render(self, name: str, values: dict | None = None, wrap: bool = False, wrapper: str | None = None,
+               strict: bool = False) -> str:
+        return self._request("POST", "/render", {"name": name, "values": values, "wrap": wrap,
+                                                 "wrapper": wrapper, "strict": strict})
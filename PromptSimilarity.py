@@ -0,0 +1,565 @@
+# Near-duplicate detection over prompt bodies.
+#
+# Each body is reduced to a MinHash signature of its word 3-grams
+# ("shingles"): two signatures agree in about as many of their NUM_HASHES
+# slots as the two bodies' shingle sets overlap (Jaccard similarity), so
+# similarity is estimated without comparing the bodies themselves.
+#
+# Signatures use one-permutation hashing: every shingle is hashed once to 64
+# bits, the top bits pick one of NUM_HASHES bins and each bin keeps its
+# smallest hash. Bins no shingle fell into borrow from the next filled bin
+# (rotation densification). Each slot keeps the low 16 bits of its hash.
+# With NumPy the work for a batch of bodies is done in a few array
+# operations; without it the same arithmetic runs in pure Python and gives
+# identical signatures, only slower.
+#
+# Candidates are found by LSH banding: the slots are split into BANDS bands
+# of ROWS slots, and two prompts are compared only if some band is identical.
+# For 4 rows of 16 bits a band is exactly one 64-bit word of the signature.
+# With NumPy a lookup compares the query's band keys with every row at once;
+# without it, per-band dicts from band key to doc ids (the LSH buckets) are
+# kept up to date. The library-wide report groups equal band keys by sorting
+# instead of comparing every pair. Signatures are kept in one flat array indexed by
+# document id, retired and compacted like SearchIndex's, and persisted next
+# to the data file.
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import string
+import struct
+import sys
+from array import array
+
+from PromptMetrics import metrics
+from PromptStore import atomic_write
+
+try:
+    import numpy as np
+except ImportError:  # Optional: everything works without it, only slower
+    np = None
+
+# Words are the runs of characters between ASCII whitespace and punctuation.
+_SEPARATORS = str.maketrans(dict.fromkeys(string.punctuation + string.whitespace + "\0", " "))
+
+MASK64 = (1 << 64) - 1
+_M1 = 0x9E3779B97F4A7C15            # Multipliers combining the token hashes of a shingle
+_M2 = 0xC2B2AE3D27D4EB4F
+_MIX1 = 0xBF58476D1CE4E5B9          # splitmix64 finalizer constants
+_MIX2 = 0x94D049BB133111EB
+_ROTATE = 0x9E37                    # Added per bin of distance when densifying
+_P = 0x100000001B3                  # Word hash base (odd, so invertible mod 2 ** 64)
+_P_INVERSE = pow(_P, -1, 1 << 64)
+
+
+class SimilarityIndex:
+    """MinHash signatures of one store's prompts, with LSH candidate lookup."""
+
+    FILENAME = "promptSimilar.index"
+    MAGIC = b"PSIM"
+    VERSION = 1
+    SHINGLE_WORDS = 3
+    BIN_BITS = 7
+    NUM_HASHES = 1 << BIN_BITS      # Slots per signature
+    ROWS = 4                        # Slots per band: 4 x 16 bits = one 64-bit key
+    BANDS = NUM_HASHES // ROWS
+    BATCH_SIZE = 2048               # Bodies hashed per NumPy batch, at most,
+    BATCH_CHARS = 1 << 21           # and characters (bounds the batch's temporary arrays)
+    MAX_BUCKET = 500                # Larger LSH buckets are only compared in a window (see _bucket_pairs)
+    BUCKET_WINDOW = 64
+    SIMILAR_THRESHOLD = 0.5         # Default for similar()
+    DUPLICATE_THRESHOLD = 0.8       # Default for near-duplicate warnings and reports
+
+    def __init__(self, store=None):
+        self.store = store
+        self._names: list[str | None] = []   # doc id -> name, None once retired
+        self._ids: dict[str, int] = {}       # live name -> doc id
+        self._signatures = array('H')        # NUM_HASHES slots per doc id, back to back
+        self._buckets: list[dict] | None = None  # Per band: key -> doc id, or list of them (no NumPy)
+
+    # --- Signatures ---
+
+    @classmethod
+    def _words(cls, body):
+        return [word for word in body.lower().translate(_SEPARATORS).split(" ") if word]
+
+    @staticmethod
+    def _word_hash(word: str) -> int:
+        """Polynomial hash of the word's UTF-8 bytes: sum of byte j * _P ** j, mod 2 ** 64."""
+        value = 0
+        for byte in reversed(word.encode('utf-8')):
+            value = (value * _P + byte) & MASK64
+        return value
+
+    @classmethod
+    def signatures(cls, bodies: list[str], cache: dict | None = None) -> array:
+        """Signatures of bodies, NUM_HASHES slots each, concatenated.
+
+        cache maps words to their hashes for the pure-Python path and may be
+        shared between calls.
+        """
+        if np is not None:
+            return cls._signatures_numpy(bodies)
+        if cache is None:
+            cache = {}
+        result = array('H')
+        for body in bodies:
+            hashes = []
+            for word in cls._words(body):
+                value = cache.get(word)
+                if value is None:
+                    value = cache[word] = cls._word_hash(word)
+                hashes.append(value)
+            if len(hashes) < cls.SHINGLE_WORDS:
+                hashes += [0] * (cls.SHINGLE_WORDS - len(hashes))  # One shingle for short bodies
+            result.extend(cls._signature_python(hashes))
+        return result
+
+    @classmethod
+    def _signature_python(cls, hashes):
+        shift = 64 - cls.BIN_BITS
+        low_mask = (1 << shift) - 1
+        bins = [None] * cls.NUM_HASHES
+        for i in range(len(hashes) - cls.SHINGLE_WORDS + 1):
+            x = (hashes[i] * _M1 + hashes[i + 1] * _M2 + hashes[i + 2]) & MASK64
+            x ^= x >> 30
+            x = (x * _MIX1) & MASK64
+            x ^= x >> 27
+            x = (x * _MIX2) & MASK64
+            x ^= x >> 31
+            b = x >> shift
+            value = x & low_mask
+            if bins[b] is None or value < bins[b]:
+                bins[b] = value
+        size = cls.NUM_HASHES
+        slots = []
+        for j in range(size):
+            distance = 0
+            while bins[(j + distance) % size] is None:
+                distance += 1
+            slots.append((bins[(j + distance) % size] + distance * _ROTATE) & 0xFFFF)
+        return slots
+
+    @classmethod
+    def _signatures_numpy(cls, bodies):
+        size = cls.NUM_HASHES
+        count = len(bodies)
+        # The whole batch as one byte string: words separated by spaces,
+        # bodies by NUL (which _SEPARATORS removes from the bodies themselves).
+        text = "\0".join(body.lower().translate(_SEPARATORS) for body in bodies).encode('utf-8')
+        data = np.frombuffer(text, dtype=np.uint8)
+        separator = (data == 32) | (data == 0)
+        edges = np.diff(np.concatenate(([True], separator, [True])).astype(np.int8))
+        word_starts = np.flatnonzero(edges == -1)
+        word_ends = np.flatnonzero(edges == 1)
+        body_of_word = np.searchsorted(np.flatnonzero(data == 0), word_starts)
+        lengths = np.bincount(body_of_word, minlength=count)
+
+        # Word hashes (see _word_hash) from prefix sums: the sum of byte j *
+        # P ** j over a word is (prefix[end] - prefix[start]) * P ** -start.
+        with np.errstate(over='ignore'):
+            powers = np.full(len(data) + 1, _P, dtype=np.uint64)
+            inverse_powers = np.full(len(data) + 1, _P_INVERSE, dtype=np.uint64)
+            powers[0] = inverse_powers[0] = 1
+            np.cumprod(powers, out=powers)
+            np.cumprod(inverse_powers, out=inverse_powers)
+            prefix = np.zeros(len(data) + 1, dtype=np.uint64)
+            np.cumsum(data * powers[:-1], out=prefix[1:])
+            word_hashes = (prefix[word_ends] - prefix[word_starts]) * inverse_powers[word_starts]
+
+        # Each body's words followed by SHINGLE_WORDS - 1 zeros, so short bodies
+        # still get one shingle; body i has max(n - SHINGLE_WORDS + 1, 1) of them.
+        # An empty body counts as one zero word.
+        pad = cls.SHINGLE_WORDS - 1
+        padded = np.maximum(lengths, 1) + pad
+        offsets = np.cumsum(padded) - padded
+        stream = np.zeros(int(padded.sum()), dtype=np.uint64)
+        first_words = np.cumsum(lengths) - lengths
+        stream[offsets[body_of_word] + np.arange(len(word_hashes)) - first_words[body_of_word]] = word_hashes
+        windows = np.maximum(lengths - pad, 1)
+        docs = np.repeat(np.arange(count), windows)
+        starts = np.arange(int(windows.sum())) - np.repeat(np.cumsum(windows) - windows, windows) + np.repeat(offsets, windows)
+        with np.errstate(over='ignore'):
+            x = stream[starts] * np.uint64(_M1) + stream[starts + 1] * np.uint64(_M2) + stream[starts + 2]
+            x ^= x >> np.uint64(30)
+            x *= np.uint64(_MIX1)
+            x ^= x >> np.uint64(27)
+            x *= np.uint64(_MIX2)
+            x ^= x >> np.uint64(31)
+        shift = np.uint64(64 - cls.BIN_BITS)
+        empty = np.uint64(MASK64)
+        bins = np.full(count * size, empty, dtype=np.uint64)
+        np.minimum.at(bins, docs * size + (x >> shift).astype(np.int64), x & np.uint64((1 << (64 - cls.BIN_BITS)) - 1))
+        bins = bins.reshape(count, size)
+        # Densify: slot j takes the first filled bin at or after j (wrapping round).
+        doubled = np.concatenate((bins, bins), axis=1)
+        positions = np.where(doubled != empty, np.arange(2 * size), 2 * size)
+        source = np.minimum.accumulate(positions[:, ::-1], axis=1)[:, ::-1][:, :size]
+        values = np.take_along_axis(doubled, source, axis=1)
+        distance = (source - np.arange(size)).astype(np.uint64)
+        with np.errstate(over='ignore'):
+            slots = ((values + distance * np.uint64(_ROTATE)) & np.uint64(0xFFFF)).astype(np.uint16)
+        return array('H', slots.tobytes())
+
+    # --- Building ---
+
+    def add(self, name: str, body: str) -> None:
+        """Index (or re-index) one prompt."""
+        self._append([name], self.signatures([body]))
+
+    def _append(self, names, signatures):
+        for name in names:
+            self.remove(name)
+        for name in names:
+            self._ids[name] = len(self._names)
+            self._names.append(name)
+        first = len(self._signatures) // self.NUM_HASHES
+        self._signatures.extend(signatures)
+        if self._buckets is not None:
+            self._bucket(range(first, len(self._names)))
+
+    def remove(self, name: str) -> None:
+        doc_id = self._ids.pop(name, None)
+        if doc_id is not None:
+            self._names[doc_id] = None
+            if self._retired() > max(1000, len(self._ids)):
+                self.compact()
+
+    def rename(self, old_name: str, new_name: str) -> None:
+        # The signature depends on the body only.
+        doc_id = self._ids.pop(old_name, None)
+        if doc_id is not None:
+            self.remove(new_name)
+            self._ids[new_name] = doc_id
+            self._names[doc_id] = new_name
+
+    @metrics.timed("similar.rebuild")
+    def rebuild(self, items) -> None:
+        """Index everything from scratch from (name, body) pairs, a batch of bodies at a time."""
+        self._names = []
+        self._ids = {}
+        self._signatures = array('H')
+        self._buckets = None
+        names, bodies = [], []
+        cache = {}  # Word hashes, for the pure-Python path
+        chars = 0
+        for name, body in items:
+            names.append(name)
+            bodies.append(body)
+            chars += len(body)
+            if len(bodies) >= self.BATCH_SIZE or chars >= self.BATCH_CHARS:
+                self._append(names, self.signatures(bodies, cache))
+                names, bodies = [], []
+                chars = 0
+        if bodies:
+            self._append(names, self.signatures(bodies, cache))
+        self._prepare()
+
+    def _retired(self) -> int:
+        return len(self._names) - len(self._ids)
+
+    def compact(self) -> None:
+        """Drop retired document ids and renumber the rest."""
+        size = self.NUM_HASHES
+        names = []
+        signatures = array('H')
+        for doc_id, name in enumerate(self._names):
+            if name is not None:
+                names.append(name)
+                signatures.extend(self._signatures[doc_id * size:(doc_id + 1) * size])
+        self._names = names
+        self._ids = {name: doc_id for doc_id, name in enumerate(names)}
+        self._signatures = signatures
+        self._buckets = None
+        self._prepare()
+
+    def _prepare(self) -> None:
+        """Fill the LSH buckets the pure-Python lookups use (nothing to do with NumPy)."""
+        if np is None and self._buckets is None:
+            self._buckets = [{} for _ in range(self.BANDS)]
+            self._bucket(self._ids.values())
+
+    def _bucket(self, doc_ids) -> None:
+        # Retired doc ids stay in their buckets until the next compaction;
+        # lookups skip them.
+        keys = self._band_keys()
+        for doc_id in doc_ids:
+            first = doc_id * self.BANDS
+            for band, buckets in enumerate(self._buckets):
+                key = keys[first + band]
+                members = buckets.setdefault(key, doc_id)
+                if members != doc_id:
+                    if type(members) is int:
+                        buckets[key] = [members, doc_id]
+                    else:
+                        members.append(doc_id)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, name):
+        return name in self._ids
+
+    # --- Store integration ---
+
+    @classmethod
+    def open(cls, store, attach: bool = True) -> SimilarityIndex:
+        """Load the persisted index for store if it is current, else rebuild it.
+
+        The returned index follows further store mutations as they happen,
+        with attach=False only once attach() is called (see SearchIndex.open()).
+        """
+        index = cls(store)
+        if not index._load_persisted():
+            index.rebuild(store.items())
+        if attach:
+            index.attach()
+        return index
+
+    @classmethod
+    def open_persisted(cls, store) -> SimilarityIndex | None:
+        """The persisted index for store if it is current, else None (see SearchIndex.open_persisted)."""
+        index = cls(store)
+        return index if index._load_persisted() else None
+
+    def attach(self) -> None:
+        self.store.add_listener(self.on_change)
+
+    def detach(self) -> None:
+        if self.store is not None:
+            self.store.remove_listener(self.on_change)
+
+    def on_change(self, change) -> None:
+        if change.op == "put":
+            self.add(change.name, change.body)
+        elif change.op == "rename":
+            self.rename(change.name, change.new_name)
+        elif change.op == "delete":
+            self.remove(change.name)
+        elif change.op == "reset":
+            self.rebuild(self.store.items())
+
+    # --- Persistence ---
+    #
+    # File layout: MAGIC, then a uint32 length and a JSON header holding the
+    # version, the data file signature and the document names; then the
+    # signature array.
+
+    @property
+    def path(self) -> str | None:
+        if self.store is None or not self.store.directory:
+            return None
+        return os.path.join(self.store.directory, self.FILENAME)
+
+    @metrics.timed("similar.persist")
+    def persist(self) -> None:
+        """Write the index next to the data file, tagged with the data's signature.
+
+        Call this after the store has flushed its writes (e.g. at shutdown) so
+        the signature matches what is on disk.
+        """
+        path = self.path
+        if path is None:
+            return
+        if self._retired():
+            self.compact()
+        header = json.dumps({
+            "version": self.VERSION,
+            "signature": self.store.signature(),
+            "names": self._names,
+            "hashes": self.NUM_HASHES,
+            "byteorder": sys.byteorder,
+        }).encode('utf-8')
+        with atomic_write(path, 'wb') as f:
+            f.write(self.MAGIC)
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+            self._signatures.tofile(f)
+
+    @metrics.timed("similar.load")
+    def _load_persisted(self) -> bool:
+        path = self.path
+        if path is None or not os.path.exists(path):
+            return False
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            if data[:4] != self.MAGIC:
+                return False
+            (header_len,) = struct.unpack_from("<I", data, 4)
+            header = json.loads(data[8:8 + header_len])
+        except (OSError, ValueError, struct.error):
+            return False
+        if (header.get("version") != self.VERSION or header.get("hashes") != self.NUM_HASHES
+                or header.get("signature") != self.store.signature()):
+            return False
+        signatures = array('H')
+        signatures.frombytes(data[8 + header_len:])
+        if len(signatures) != len(header["names"]) * self.NUM_HASHES:
+            return False
+        if header["byteorder"] != sys.byteorder:
+            signatures.byteswap()
+        self._names = header["names"]
+        self._ids = {name: doc_id for doc_id, name in enumerate(self._names)}
+        self._signatures = signatures
+        self._buckets = None
+        self._prepare()
+        return True
+
+    # --- Queries ---
+
+    def _row(self, doc_id):
+        return self._signatures[doc_id * self.NUM_HASHES:(doc_id + 1) * self.NUM_HASHES]
+
+    def _band_keys(self):
+        """The flat signature array seen as BANDS 64-bit band keys per doc id."""
+        return memoryview(self._signatures).cast('B').cast('Q')
+
+    def _matches(self, query: array, exclude: int | None, threshold: float) -> list[tuple[str, float]]:
+        size = self.NUM_HASHES
+        if np is not None:
+            signatures = np.frombuffer(self._signatures, dtype=np.uint16).reshape(-1, size)
+            query_row = np.frombuffer(query, dtype=np.uint16)
+            candidates = np.nonzero((signatures.view(np.uint64) == query_row.view(np.uint64)).any(axis=1))[0]
+            scores = (signatures[candidates] == query_row).sum(axis=1) / size
+            pairs = zip(candidates.tolist(), scores.tolist())
+        else:
+            self._prepare()
+            query_keys = memoryview(query).cast('B').cast('Q')
+            found = set()
+            for buckets, key in zip(self._buckets, query_keys):
+                members = buckets.get(key)
+                if type(members) is int:
+                    found.add(members)
+                elif members is not None:
+                    found.update(members)
+            pairs = ((doc_id, sum(a == b for a, b in zip(self._row(doc_id), query)) / size) for doc_id in found)
+        results = [(self._names[doc_id], score) for doc_id, score in pairs
+                   if doc_id != exclude and score >= threshold and self._names[doc_id] is not None]
+        results.sort(key=lambda item: (-item[1], item[0]))
+        return results
+
+    @metrics.timed("similar.query")
+    def similar(self, name: str, threshold: float = SIMILAR_THRESHOLD, limit: int | None = 20) -> list[tuple[str, float]]:
+        """Other prompts estimated at least threshold similar to name, most similar first."""
+        doc_id = self._ids.get(name)
+        if doc_id is None:
+            return []
+        return self._matches(self._row(doc_id), doc_id, threshold)[:limit]
+
+    @metrics.timed("similar.query")
+    def similar_to_body(self, body: str, threshold: float = DUPLICATE_THRESHOLD,
+                        limit: int | None = 20) -> list[tuple[str, float]]:
+        """Prompts estimated at least threshold similar to a body that is not in the index."""
+        return self._matches(self.signatures([body]), None, threshold)[:limit]
+
+    @metrics.timed("similar.report")
+    def duplicate_groups(self, threshold: float = DUPLICATE_THRESHOLD) -> list[list[str]]:
+        """Groups of prompts linked by estimated similarity >= threshold, largest first.
+
+        Pairs come from LSH buckets (prompts sharing a whole band), never
+        from comparing every prompt with every other.
+        """
+        if self._retired():
+            self.compact()
+        count = len(self._names)
+        parent = list(range(count))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        def union(i, j):
+            root_i, root_j = find(i), find(j)
+            if root_i != root_j:
+                parent[max(root_i, root_j)] = min(root_i, root_j)
+
+        if count > 1:
+            finder = self._linked_pairs_numpy if np is not None else self._linked_pairs_python
+            for i, j in finder(threshold):
+                union(i, j)
+        groups = {}
+        for doc_id in range(count):
+            groups.setdefault(find(doc_id), []).append(self._names[doc_id])
+        result = [sorted(group) for group in groups.values() if len(group) > 1]
+        result.sort(key=lambda group: (-len(group), group[0]))
+        return result
+
+    def _bucket_pairs(self, members):
+        """Candidate pairs of one LSH bucket of doc ids.
+
+        A bucket of up to MAX_BUCKET members yields all its pairs. A larger
+        one (typically a band of shared boilerplate) would cost quadratic
+        time, so its members are put in signature order and each is paired
+        with the BUCKET_WINDOW that follow it: near-duplicates agree in most
+        slots and so mostly sort close together, though a pair that only
+        shares oversized buckets can be missed. Either way the pairs depend
+        only on the bodies, not on the order the prompts were added in.
+        """
+        if len(members) <= self.MAX_BUCKET:
+            return [(a, b) for n, a in enumerate(members) for b in members[n + 1:]]
+        members = sorted(members, key=lambda doc_id: (self._row(doc_id).tolist(), doc_id))
+        window = self.BUCKET_WINDOW
+        return [(min(a, b), max(a, b)) for n, a in enumerate(members) for b in members[n + 1:n + 1 + window]]
+
+    def _linked_pairs_numpy(self, threshold):
+        size = self.NUM_HASHES
+        signatures = np.frombuffer(self._signatures, dtype=np.uint16).reshape(-1, size)
+        keys = signatures.view(np.uint64)
+        # Identical signatures are linked directly; only one of each set goes through LSH.
+        _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        for doc_id, representative in enumerate(first[inverse].tolist()):
+            if doc_id != representative:
+                yield representative, doc_id
+        representatives = np.sort(first)
+        band_keys = keys[representatives]
+        left, right = [], []
+        for band in range(self.BANDS):
+            column = band_keys[:, band]
+            order = np.argsort(column, kind='stable')
+            ordered = column[order]
+            boundaries = np.flatnonzero(ordered[1:] != ordered[:-1]) + 1
+            starts = np.concatenate(([0], boundaries))
+            ends = np.concatenate((boundaries, [len(ordered)]))
+            for start, end in zip(starts[ends - starts > 1].tolist(), ends[ends - starts > 1].tolist()):
+                for a, b in self._bucket_pairs(representatives[order[start:end]].tolist()):
+                    left.append(a)
+                    right.append(b)
+        if not left:
+            return
+        pairs = np.unique(np.stack((np.minimum(left, right), np.maximum(left, right)), axis=1), axis=0)
+        needed = math.ceil(threshold * size)
+        for start in range(0, len(pairs), 65536):
+            chunk = pairs[start:start + 65536]
+            agree = (signatures[chunk[:, 0]] == signatures[chunk[:, 1]]).sum(axis=1)
+            yield from chunk[agree >= needed].tolist()
+
+    def _linked_pairs_python(self, threshold):
+        size = self.NUM_HASHES
+        needed = math.ceil(threshold * size)
+        representatives = []
+        seen = {}
+        for doc_id in range(len(self._names)):
+            row = self._row(doc_id).tobytes()
+            representative = seen.setdefault(row, doc_id)
+            if representative != doc_id:
+                yield representative, doc_id
+            else:
+                representatives.append(doc_id)
+        keys = self._band_keys()
+        pairs = set()
+        for band in range(self.BANDS):
+            buckets = {}
+            for doc_id in representatives:
+                buckets.setdefault(keys[doc_id * self.BANDS + band], []).append(doc_id)
+            for members in buckets.values():
+                if len(members) > 1:
+                    pairs.update(self._bucket_pairs(members))
+        for a, b in pairs:
+            if sum(x == y for x, y in zip(self._row(a), self._row(b))) >= needed:
+                yield a, b
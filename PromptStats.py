@@ -0,0 +1,290 @@
+# Per-prompt metadata for sorting the prompt list.
+#
+# PromptStats keeps, for every prompt, its body size in characters, an
+# estimated token count, when it was last modified and how often it was
+# copied. The values are computed from a body once, when a store listener
+# reports the change, and persisted in promptStats.json next to the data file
+# together with the data's signature. The next open trusts them if the
+# signature still matches, so sorting never needs the bodies (which lazy
+# backends do not even keep in memory).
+#
+# Each column also has its own sorted index of (value, name) keys, kept up to
+# date with one bisect per change. ColumnOrder reads the display order
+# straight out of an index, so re-sorting a large list is one pass over a
+# list rather than a sort. An index is built the first time its column is
+# used, from the order saved in promptStats.json while nothing has changed
+# since, else with one sort.
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from bisect import bisect_left, insort
+from typing import NamedTuple
+
+from PromptMetrics import metrics
+from PromptStore import atomic_write
+
+NAME = "name"
+COLUMNS = (NAME, "size", "tokens", "modified", "uses")
+
+
+class PromptStat(NamedTuple):
+    size: int          # Characters in the body
+    tokens: int        # Estimated tokens, see estimate_tokens()
+    modified: float    # Seconds since the epoch
+    uses: int          # Times the prompt was copied
+
+
+def estimate_tokens(body: str) -> int:
+    """Rough token count: about 4 characters or 3/4 of a word per token, whichever is more."""
+    return max((len(body) + 3) // 4, (len(body.split()) * 4 + 2) // 3)
+
+
+def _key(column, name, stat):
+    return name if column == NAME else (getattr(stat, column), name)
+
+
+class ColumnOrder:
+    """The list order for one column, ascending or reversed, read from its index."""
+
+    def __init__(self, stats: PromptStats, column: str, reverse: bool = False):
+        if column not in COLUMNS:
+            raise ValueError(f"Unknown column '{column}'.")
+        self.stats = stats
+        self.column = column
+        self.reverse = reverse
+
+    def names(self) -> list[str]:
+        """Every prompt name in this order."""
+        index = self.stats._index(self.column)
+        keys = reversed(index) if self.reverse else index
+        if self.column == NAME:
+            return list(keys)
+        return [key[1] for key in keys]
+
+    def position(self, name: str) -> int:
+        """Where name (already in the stats) belongs among every prompt in this order."""
+        index = self.stats._index(self.column)
+        position = bisect_left(index, _key(self.column, name, self.stats._stats[name]))
+        return len(index) - 1 - position if self.reverse else position
+
+    def sort(self, names) -> list[str]:
+        """A subset of the names (e.g. search results) in this order."""
+        stats = self.stats._stats
+        return sorted(names, key=lambda name: _key(self.column, name, stats[name]), reverse=self.reverse)
+
+
+class PromptStats:
+    """Incrementally maintained per-prompt metadata and sort indexes for one PromptStore."""
+
+    FILENAME = "promptStats.json"
+    VERSION = 1
+
+    def __init__(self, store=None):
+        self.store = store
+        self._stats: dict[str, PromptStat] = {}
+        self._indexes: dict[str, list] = {}   # column -> sorted keys, for the columns used so far
+        self._saved = None                    # (names, field -> values, field -> order) as persisted
+
+    def __len__(self):
+        return len(self._stats)
+
+    def __contains__(self, name):
+        return name in self._stats
+
+    def get(self, name: str) -> PromptStat | None:
+        return self._stats.get(name)
+
+    def order(self, column: str, reverse: bool = False) -> ColumnOrder:
+        return ColumnOrder(self, column, reverse)
+
+    def _index(self, column):
+        index = self._indexes.get(column)
+        if index is None:
+            if self._saved is not None:
+                names, values, orders = self._saved
+                index = names if column == NAME else [(values[column][i], names[i]) for i in orders[column]]
+            elif column == NAME:
+                index = sorted(self._stats)
+            else:
+                field = PromptStat._fields.index(column)
+                index = sorted([(stat[field], name) for name, stat in self._stats.items()])
+            self._indexes[column] = index
+        return index
+
+    # --- Updating ---
+
+    def _set(self, name, stat):
+        old = self._stats.get(name)
+        if old == stat:
+            return
+        self._saved = None  # Its orders no longer match
+        for column, index in self._indexes.items():
+            if old is not None:
+                del index[bisect_left(index, _key(column, name, old))]
+            insort(index, _key(column, name, stat))
+        self._stats[name] = stat
+
+    def _remove(self, name):
+        old = self._stats.pop(name, None)
+        if old is None:
+            return
+        self._saved = None
+        for column, index in self._indexes.items():
+            del index[bisect_left(index, _key(column, name, old))]
+
+    def update(self, name: str, body: str, modified: float | None = None) -> None:
+        """Record a new body for name (its use count is kept)."""
+        old = self._stats.get(name)
+        self._set(name, PromptStat(len(body), estimate_tokens(body), time.time() if modified is None else modified,
+                                   old.uses if old is not None else 0))
+
+    def record_use(self, name: str) -> None:
+        """Count one more copy of name."""
+        stat = self._stats.get(name)
+        if stat is not None:
+            self._set(name, stat._replace(uses=stat.uses + 1))
+
+    def rename(self, old_name: str, new_name: str) -> None:
+        stat = self._stats.get(old_name)
+        if stat is not None:
+            self._remove(old_name)
+            self._set(new_name, stat)
+
+    @metrics.timed("stats.rebuild")
+    def rebuild(self, items, known: dict[str, PromptStat] | None = None, modified: float | None = None) -> None:
+        """Recompute every prompt's stats from (name, body) pairs.
+
+        known holds earlier stats to carry use counts over from, and modified
+        times for bodies whose size did not change; other bodies get modified
+        (default: now).
+        """
+        known = known or {}
+        modified = time.time() if modified is None else modified
+        stats = {}
+        for name, body in items:
+            size, tokens = len(body), estimate_tokens(body)
+            old = known.get(name)
+            if old is None:
+                stats[name] = PromptStat(size, tokens, modified, 0)
+            elif (old.size, old.tokens) != (size, tokens):
+                stats[name] = PromptStat(size, tokens, modified, old.uses)
+            else:
+                stats[name] = old
+        self._replace(stats)
+
+    def _replace(self, stats, saved=None):
+        self._stats = stats
+        self._indexes = {}
+        self._saved = saved
+
+    # --- Store integration ---
+
+    @classmethod
+    def open(cls, store, attach: bool = True) -> PromptStats:
+        """Load the persisted stats for store if they are current, else recompute them.
+
+        Recomputing reads every body, but keeps the use counts (and, for
+        bodies whose size did not change, the modified times) of the persisted
+        stats. The returned stats follow further store mutations, with
+        attach=False only once attach() is called (see SearchIndex.open()).
+        """
+        stats = cls(store)
+        if not stats._load_persisted():
+            stats.rebuild(store.items(), stats._stats, stats._data_time())
+        if attach:
+            stats.attach()
+        return stats
+
+    def attach(self) -> None:
+        self.store.add_listener(self.on_change)
+
+    def detach(self) -> None:
+        if self.store is not None:
+            self.store.remove_listener(self.on_change)
+
+    def on_change(self, change) -> None:
+        if change.op == "put":
+            self.update(change.name, change.body)
+        elif change.op == "rename":
+            self.rename(change.name, change.new_name)
+        elif change.op == "delete":
+            self._remove(change.name)
+        elif change.op == "reset":
+            if self.store.loading:
+                self._replace({})
+            else:
+                self.rebuild(self.store.items(), self._stats, self._data_time())
+
+    def _data_time(self) -> float:
+        """Modified time for bodies first seen now: the data file's, as the best guess available."""
+        path = self.store.path if self.store is not None else None
+        try:
+            return os.path.getmtime(path) if path else time.time()
+        except OSError:
+            return time.time()
+
+    # --- Persistence ---
+    #
+    # File layout: one JSON object holding the version, the data file
+    # signature, the names in sorted order, one list of values per column in
+    # the same order, and per column the positions of the names in that
+    # column's sort order, so opening rebuilds the indexes without sorting.
+
+    @property
+    def path(self) -> str | None:
+        if self.store is None or not self.store.directory:
+            return None
+        return os.path.join(self.store.directory, self.FILENAME)
+
+    @metrics.timed("stats.persist")
+    def persist(self) -> None:
+        """Write the stats next to the data file, tagged with the data's signature.
+
+        Call this after the store has flushed its writes (e.g. at shutdown) so
+        the signature matches what is on disk.
+        """
+        path = self.path
+        if path is None:
+            return
+        names = self._index(NAME)
+        stats = [self._stats[name] for name in names]
+        position = {name: i for i, name in enumerate(names)}
+        data = {"version": self.VERSION, "signature": self.store.signature(), "names": names, "order": {}}
+        for field in PromptStat._fields:
+            data[field] = [getattr(stat, field) for stat in stats]
+            data["order"][field] = [position[key[1]] for key in self._index(field)]
+        with atomic_write(path, encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+
+    def _load_persisted(self) -> bool:
+        """Read the persisted stats; True if they match the store's files.
+
+        Stats that no longer match are still kept in self._stats, so open()
+        can carry use counts and modified times over.
+        """
+        path = self.path
+        if path is None or not os.path.exists(path):
+            return False
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") != self.VERSION:
+                return False
+            names = data["names"]
+            columns = [data[field] for field in PromptStat._fields]
+            stats = dict(zip(names, map(PromptStat._make, zip(*columns))))
+            if len(stats) != len(names) or any(len(values) != len(names) for values in columns):
+                return False
+            if data.get("signature") != self.store.signature() or stats.keys() != set(self.store):
+                self._stats = stats
+                return False
+            orders = {field: data["order"][field] for field in PromptStat._fields}
+            if any(len(order) != len(names) for order in orders.values()):
+                return False
+        except (OSError, ValueError, KeyError, TypeError):
+            return False  # Unreadable: recompute
+        self._replace(stats, (names, dict(zip(PromptStat._fields, columns)), orders))
+        return True
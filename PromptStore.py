@@ -0,0 +1,706 @@
+# Headless storage engine for PromptManager.
+#
+# PromptStore keeps the prompt library in memory and persists it through a
+# storage backend. Nothing in here imports tkinter, so the same library can be
+# loaded, queried and modified from scripts, benchmarks or the GUI.
+
+from __future__ import annotations
+
+import importlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, NamedTuple
+
+from PromptMetrics import metrics
+
+
+class PromptStoreError(Exception):
+    """Base class for all storage errors raised by PromptStore."""
+
+
+class PromptNotFoundError(PromptStoreError, KeyError):
+    """Raised when a prompt name does not exist in the store."""
+
+    def __str__(self):
+        return f"Prompt '{self.args[0]}' does not exist."
+
+
+class PromptExistsError(PromptStoreError):
+    """Raised when a put/rename would overwrite an existing prompt."""
+
+    def __str__(self):
+        return f"Prompt name '{self.args[0]}' already exists."
+
+
+class PromptFormatError(PromptStoreError):
+    """Raised when the data on disk cannot be read as a prompt library."""
+
+
+class ExternalChangeError(PromptStoreError):
+    """Raised by save() when the files were changed by someone else since they were read.
+
+    Call merge_external() to take in their changes, then save again.
+    """
+
+    def __str__(self):
+        return "The prompt files were changed by another program; merge their changes before saving."
+
+
+class Change(NamedTuple):
+    """One mutation, handed to the backend on save and to store listeners.
+
+    Listeners additionally see op "reset" (with an empty name) whenever the
+    whole library is replaced by load() or clear().
+    """
+    op: str             # "put", "rename", "delete" (or "reset" for listeners)
+    name: str
+    body: str | None = None
+    new_name: str | None = None
+
+
+class MergeResult(NamedTuple):
+    """What merge_external() took in from disk (lists of prompt names)."""
+    added: list
+    changed: list
+    removed: list
+    conflicts: list     # Changed on disk and locally; the local version was kept
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed or self.conflicts)
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = 'w', **open_kwargs):
+    """Open a temp file next to path and rename it over path once closed.
+
+    Readers (and a crash mid-write) only ever see the old or the new file,
+    never a truncated one.
+    """
+    import tempfile  # Imported here: read-only command-line lookups never need it
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode, **open_kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def file_signature(path: str):
+    """[size, mtime_ns] of a file, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+class StorageBackend:
+    """Interface every storage backend implements.
+
+    Backends are constructed with the prompt directory plus optional keyword
+    settings, and are handed the full prompt dict together with the list of
+    changes made since the last save so they can choose what to write.
+    """
+
+    name = "base"
+    filename = ""
+    # Lazy backends load() a dict of name -> None and serve bodies on demand
+    # through read_body(); save() then gets None for bodies still on disk.
+    lazy = False
+    # True if save() writes only the changed entries (appends, row updates)
+    # rather than rewriting whole files; bulk writers save more often then.
+    incremental_save = False
+
+    def __init__(self, directory: str, **options):
+        self.directory = directory
+
+    @classmethod
+    def detect(cls, directory: str) -> bool:
+        """True if files specific to this backend exist in the directory."""
+        return False
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, self.filename)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def signature(self):
+        """A cheap fingerprint (sizes and mtimes) of the files on disk.
+
+        Used to tell whether data on disk still matches something derived
+        from it, such as a persisted search index.
+        """
+        return file_signature(self.path)
+
+    def load(self) -> dict[str, str]:
+        raise NotImplementedError
+
+    def iter_load(self):
+        """Yield (name, body, progress) for every prompt, progress rising to 1.0.
+
+        Lets a caller show prompts before the whole library has been read.
+        The default just load()s everything first; streaming backends override it.
+        """
+        prompts = self.load()
+        total = len(prompts) or 1
+        for i, (name, body) in enumerate(prompts.items(), 1):
+            yield name, body, i / total
+
+    def read_body(self, name: str) -> str:
+        """Fetch one body from disk (lazy backends only)."""
+        raise NotImplementedError
+
+    def fetch(self, name: str) -> str | None:
+        """One body straight from disk without a prior load(), or None if absent.
+
+        For one-off lookups. The default loads everything; backends that can
+        find a single entry cheaply override it.
+        """
+        prompts = self.load()
+        if name not in prompts:
+            return None
+        body = prompts[name]
+        return body if body is not None else self.read_body(name)
+
+    def versions(self, prompts: dict[str, str | None]) -> dict:
+        """Version tokens for the given entries as they are on disk now.
+
+        prompts maps names to their bodies (None for lazy placeholders). A
+        token only has to compare equal while an entry is unchanged on disk;
+        the default hashes the body, reading it first if it is not at hand.
+        """
+        return {name: hash(body if body is not None else self.read_body(name))
+                for name, body in prompts.items()}
+
+    def save(self, prompts: dict[str, str], changes: list[Change]) -> None:
+        raise NotImplementedError
+
+    def compact(self, prompts: dict[str, str]) -> None:
+        """Fold any incremental state into the primary file (no-op by default)."""
+
+    def close(self) -> None:
+        pass
+
+
+class JsonFileBackend(StorageBackend):
+    """The original storage format: one promptData.json dictionary."""
+
+    name = "json"
+    filename = "promptData.json"
+
+    def load(self) -> dict[str, str]:
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise PromptFormatError(f"Error decoding JSON file '{self.filename}'. It might be corrupted.") from e
+        if not isinstance(data, dict):
+            raise PromptFormatError(f"File '{self.filename}' found but has an unexpected format (expected a JSON dictionary).")
+        return data
+
+    def iter_load(self):
+        with open(self.path, 'r') as f:
+            text = f.read()
+        if not text.lstrip().startswith('{'):
+            raise PromptFormatError(f"File '{self.filename}' found but has an unexpected format (expected a JSON dictionary).")
+        total = len(text) or 1
+        try:
+            for name, body, _, end in iter_json_object(text):
+                yield name, body, end / total
+        except PromptFormatError as e:
+            raise PromptFormatError(f"Error decoding JSON file '{self.filename}'. It might be corrupted.") from e
+
+    def save(self, prompts: dict[str, str], changes: list[Change]) -> None:
+        # The single-file format can only be rewritten as a whole.
+        with atomic_write(self.path) as f:
+            json.dump(prompts, f, indent=4)
+
+
+# Backends are imported lazily so that a store opened with the default JSON
+# format does not pay for modules it never uses.
+BACKENDS = {
+    "json": ("PromptStore", "JsonFileBackend"),
+    "journal": ("JournalBackend", "JournalBackend"),
+    "indexed": ("IndexedJsonBackend", "IndexedJsonBackend"),
+    "sqlite": ("SqliteBackend", "SqliteBackend"),
+    "sharded": ("ShardedBackend", "ShardedBackend"),
+    "blobs": ("BlobBackend", "BlobBackend"),
+}
+DEFAULT_BACKEND = "json"
+
+
+def get_backend_class(name: str):
+    """Resolve a backend name from BACKENDS to its class."""
+    try:
+        module_name, class_name = BACKENDS[name]
+    except KeyError:
+        raise PromptStoreError(f"Unknown storage backend '{name}'.") from None
+    if module_name == __name__:
+        return globals()[class_name]
+    module = importlib.import_module(module_name)
+    return getattr(module, class_name)
+
+
+def detect_backend(directory: str) -> str:
+    """Name of the backend whose files are present in directory, else the default."""
+    for name in BACKENDS:
+        if name != DEFAULT_BACKEND and get_backend_class(name).detect(directory):
+            return name
+    return DEFAULT_BACKEND
+
+
+def scan_json_object(text: str):
+    """Yield (key, value_start, value_end) for a top-level JSON object of strings.
+
+    Positions are character offsets of each value's string literal (quotes
+    included), so a caller can locate bodies without keeping them. Raises
+    PromptFormatError for anything other than an object of string values.
+    """
+    for key, _, value_start, value_end in iter_json_object(text):
+        yield key, value_start, value_end
+
+
+def iter_json_object(text: str):
+    """Like scan_json_object, but yield (key, value, value_start, value_end)."""
+    decoder = json.decoder
+    ws = decoder.WHITESPACE.match
+    scanstring = decoder.scanstring
+
+    def expect(char, pos):
+        pos = ws(text, pos).end()
+        if text[pos:pos + 1] != char:
+            raise PromptFormatError(f"Expected '{char}' at position {pos}.")
+        return pos + 1
+
+    try:
+        pos = expect('{', 0)
+        pos = ws(text, pos).end()
+        if text[pos:pos + 1] == '}':
+            return
+        while True:
+            pos = expect('"', pos)
+            key, pos = scanstring(text, pos)
+            pos = expect(':', pos)
+            value_start = ws(text, pos).end()
+            if text[value_start:value_start + 1] != '"':
+                raise PromptFormatError(f"Value of '{key}' is not a string.")
+            value, pos = scanstring(text, value_start + 1)
+            yield key, value, value_start, pos
+            pos = ws(text, pos).end()
+            if text[pos:pos + 1] == '}':
+                return
+            pos = expect(',', pos)
+    except json.JSONDecodeError as e:
+        raise PromptFormatError(f"Malformed JSON: {e}") from e
+
+
+class _LRUCache:
+    """Small bounded name -> body cache for lazily loaded bodies."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key):
+        value = self._data.get(key)
+        if value is not None:
+            self._data.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+
+class PromptStore:
+    """In-memory prompt library with a typed get/put/rename/delete API.
+
+    Mutations are applied to memory immediately and recorded as pending
+    changes; save() hands them to the backend. With no directory the store
+    still works in memory but cannot be loaded or saved.
+
+    save() may run on a background thread (see PromptWriter): it snapshots
+    the pending state under a short lock and writes outside of it, so
+    mutations on the caller's thread never wait for disk I/O.
+
+    With a lazy backend only names are held in memory; get() reads bodies on
+    demand through a bounded LRU cache of cache_size entries.
+    """
+
+    DEFAULT_CACHE_SIZE = 256
+
+    def __init__(self, directory: str | None = None, backend: str | None = None,
+                 cache_size: int = DEFAULT_CACHE_SIZE, **backend_options):
+        self.directory = directory
+        self.backend = None
+        if directory:
+            backend_class = get_backend_class(backend or detect_backend(directory))
+            self.backend = backend_class(directory, **backend_options)
+        self._prompts: dict[str, str] = {}
+        self._changes: list[Change] = []
+        self._lock = threading.RLock()       # guards _prompts and _changes
+        self._save_lock = threading.Lock()   # serializes backend writes
+        self._listeners = []
+        self._cache = _LRUCache(cache_size)
+        self._loading = False
+        # What is on disk as of the last load/save/merge, for noticing and
+        # merging changes made by other programs: the backend's signature and
+        # per-entry version tokens. None while nothing has been read.
+        self._disk_signature = None
+        self._versions: dict | None = None
+
+    # --- Persistence ---
+
+    @property
+    def backend_name(self) -> str | None:
+        return self.backend.name if self.backend else None
+
+    @property
+    def filename(self) -> str | None:
+        return self.backend.filename if self.backend else None
+
+    @property
+    def path(self) -> str | None:
+        return self.backend.path if self.backend else None
+
+    def exists(self) -> bool:
+        """True if the backing file is present on disk."""
+        return self.backend is not None and self.backend.exists()
+
+    def signature(self):
+        return self.backend.signature() if self.backend else None
+
+    # --- Listeners ---
+
+    def add_listener(self, callback) -> None:
+        """Call callback(change) after every mutation (see Change)."""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback) -> None:
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self, change: Change) -> None:
+        for callback in list(self._listeners):
+            callback(change)
+
+    def _require_backend(self):
+        if self.backend is None:
+            raise PromptStoreError("No prompt directory selected.")
+        return self.backend
+
+    @metrics.timed("store.load")
+    def load(self) -> None:
+        """Replace the in-memory library with the contents on disk."""
+        backend = self._require_backend()
+        with self._save_lock:
+            signature = backend.signature()  # Taken first: a change during the read shows up later
+            data = backend.load()
+            versions = backend.versions(data)
+            with self._lock:
+                self._prompts = data
+                self._changes = []
+                self._cache.clear()
+                self._disk_signature = signature
+                self._versions = versions
+        self._notify(Change("reset", ""))
+
+    # Incremental loading: begin_load(), then add_loaded() for each batch the
+    # backend's iter_load() produces (from any thread), then end_load(). Saving
+    # is refused in between so a half-read library never overwrites the file.
+
+    @property
+    def loading(self) -> bool:
+        return self._loading
+
+    def begin_load(self) -> None:
+        backend = self._require_backend()
+        with self._lock:
+            self._prompts = {}
+            self._changes = []
+            self._cache.clear()
+            self._loading = True
+            self._disk_signature = backend.signature()
+            self._versions = None
+        self._notify(Change("reset", ""))
+
+    def add_loaded(self, prompts: dict[str, str | None]) -> None:
+        with self._lock:
+            self._prompts.update(prompts)
+
+    def end_load(self, complete: bool = True) -> None:
+        """Finish an incremental load; with complete=False the partial library is dropped."""
+        with self._lock:
+            self._loading = False
+            if complete:
+                self._versions = self.backend.versions(self._prompts)
+            else:
+                self._prompts = {}
+                self._changes = []
+                self._cache.clear()
+                self._disk_signature = None
+        self._notify(Change("reset", ""))
+
+    @metrics.timed("store.save")
+    def save(self) -> None:
+        """Persist all pending changes."""
+        backend = self._require_backend()
+        if self._loading:
+            raise PromptStoreError("Cannot save while the library is still loading.")
+        with self._save_lock:
+            if self._disk_signature is not None and backend.signature() != self._disk_signature:
+                raise ExternalChangeError()
+            with self._lock:
+                changes, self._changes = self._changes, []
+                snapshot = dict(self._prompts)
+            try:
+                backend.save(snapshot, changes)
+            except BaseException:
+                with self._lock:
+                    self._changes[:0] = changes  # Keep them for the next attempt.
+                raise
+            self._record_saved(backend, snapshot, changes)
+            if backend.lazy:
+                self._release_saved_bodies(snapshot, changes)
+
+    def _record_saved(self, backend, snapshot, changes):
+        """Update the disk signature and versions after our own write."""
+        if self._versions is None:
+            versions = backend.versions(snapshot)
+        else:
+            touched = {change.name for change in changes} | {change.new_name for change in changes if change.new_name}
+            versions = dict(self._versions)
+            for name in touched - snapshot.keys():
+                versions.pop(name, None)
+            versions.update(backend.versions({name: snapshot[name] for name in touched & snapshot.keys()}))
+        with self._lock:
+            self._versions = versions
+            self._disk_signature = backend.signature()
+
+    def merge_external(self) -> MergeResult | None:
+        """Take in changes other programs made on disk since the last load/save.
+
+        Returns None if the files are unchanged. Otherwise the whole library
+        is re-read, but only entries whose version differs are applied, and
+        listeners see one put/delete per applied entry. Entries with unsaved
+        local changes keep the local version and are reported as conflicts;
+        the next save() writes them over the other program's version.
+        """
+        backend = self._require_backend()
+        with self._save_lock:
+            if self._loading or self._disk_signature is None:
+                return None
+            signature = backend.signature()
+            if signature == self._disk_signature:
+                return None
+            fresh = backend.load()
+            versions = backend.versions(fresh)
+
+            result = MergeResult([], [], [], [])
+            notify = []
+            with self._lock:
+                old_versions = self._versions or {}
+                local = {change.name for change in self._changes} | {change.new_name for change in self._changes if change.new_name}
+                for name, version in versions.items():
+                    if old_versions.get(name) == version:
+                        continue
+                    if name in local:
+                        result.conflicts.append(name)
+                        continue
+                    (result.changed if name in self._prompts else result.added).append(name)
+                    self._prompts[name] = fresh[name]
+                    self._cache.pop(name)
+                    notify.append(name)
+                for name in old_versions.keys() - versions.keys():
+                    if name in local:
+                        result.conflicts.append(name)
+                    elif name in self._prompts:
+                        del self._prompts[name]
+                        self._cache.pop(name)
+                        result.removed.append(name)
+                self._versions = versions
+                self._disk_signature = signature
+
+        for name in notify:
+            self._notify(Change("put", name, body=self._get(name, fill_cache=False)))
+        for name in result.removed:
+            self._notify(Change("delete", name))
+        return result
+
+    def _release_saved_bodies(self, snapshot, changes):
+        """Swap bodies that are now on disk back to lazy placeholders."""
+        with self._lock:
+            for change in changes:
+                name = change.new_name if change.op == "rename" else change.name
+                body = snapshot.get(name)
+                # Identity check: skip names edited again while we were saving.
+                if body is not None and self._prompts.get(name) is body:
+                    self._prompts[name] = None
+                    self._cache.put(name, body)
+
+    def clear(self) -> None:
+        """Empty the library; the next save() writes an empty file."""
+        with self._lock:
+            self._prompts = {}
+            self._changes = []
+            self._cache.clear()
+            self._disk_signature = None
+            self._versions = None
+        self._notify(Change("reset", ""))
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._changes)
+
+    @metrics.timed("store.compact")
+    def compact(self) -> None:
+        """Save pending changes and let the backend fold incremental state away."""
+        backend = self._require_backend()
+        if self._changes:
+            self.save()
+        with self._save_lock:
+            with self._lock:
+                snapshot = dict(self._prompts)
+            before = backend.signature()
+            backend.compact(snapshot)
+            with self._lock:
+                # Our own rewrite is not an external change.
+                if self._disk_signature == before:
+                    self._disk_signature = backend.signature()
+
+    def close(self, compact: bool = True) -> None:
+        if self.backend is None:
+            return
+        if compact:
+            self.compact()
+        self.backend.close()
+
+    # --- Queries ---
+
+    def get(self, name: str) -> str:
+        return self._get(name, fill_cache=True)
+
+    def _get(self, name, fill_cache):
+        with self._lock:
+            try:
+                body = self._prompts[name]
+            except KeyError:
+                raise PromptNotFoundError(name) from None
+            if body is None:
+                body = self._cache.get(name)
+            if body is None:
+                # Placeholders always name a body present in the backend's
+                # current file (see rename()), so this read is consistent.
+                with metrics.span("store.read_body"):
+                    body = self.backend.read_body(name)
+                if fill_cache:
+                    self._cache.put(name, body)
+            return body
+
+    def read(self, name: str) -> str:
+        """Body of name read from disk, without loading the library first.
+
+        For scripts that look up a prompt or two; the in-memory library and
+        any unsaved changes are not consulted.
+        """
+        body = self._require_backend().fetch(name)
+        if body is None:
+            raise PromptNotFoundError(name)
+        return body
+
+    def names(self) -> list[str]:
+        """All prompt names, sorted."""
+        with self._lock:
+            return sorted(self._prompts)
+
+    def items(self) -> Iterator[tuple[str, str]]:
+        """(name, body) pairs; lazy bodies are read without filling the cache."""
+        if self.backend is None or not self.backend.lazy:
+            with self._lock:
+                return iter(list(self._prompts.items()))
+        return self._iter_lazy_items()
+
+    def _iter_lazy_items(self):
+        with self._lock:
+            entries = list(self._prompts.items())
+        for name, body in entries:
+            if body is None:
+                try:
+                    body = self._get(name, fill_cache=False)
+                except PromptNotFoundError:
+                    continue  # Deleted since the listing.
+            yield name, body
+
+    def __iter__(self) -> Iterator[str]:
+        # A copy, since a background load may be adding names meanwhile.
+        with self._lock:
+            return iter(list(self._prompts))
+
+    def __contains__(self, name) -> bool:
+        return name in self._prompts
+
+    def __len__(self) -> int:
+        return len(self._prompts)
+
+    # --- Mutations ---
+
+    def put(self, name: str, body: str, overwrite: bool = True) -> None:
+        """Create or replace a prompt."""
+        with self._lock:
+            if not overwrite and name in self._prompts:
+                raise PromptExistsError(name)
+            self._prompts[name] = body
+            self._cache.pop(name)
+            change = Change("put", name, body=body)
+            self._changes.append(change)
+        self._notify(change)
+
+    def rename(self, old_name: str, new_name: str) -> None:
+        with self._lock:
+            if old_name not in self._prompts:
+                raise PromptNotFoundError(old_name)
+            if new_name == old_name:
+                return
+            if new_name in self._prompts:
+                raise PromptExistsError(new_name)
+            if self._prompts[old_name] is None:
+                # The backend only knows the body under its old name until the
+                # next save, so materialize it now.
+                self._prompts[old_name] = self.get(old_name)
+            self._cache.pop(old_name)
+            self._prompts[new_name] = self._prompts.pop(old_name)
+            change = Change("rename", old_name, new_name=new_name)
+            self._changes.append(change)
+        self._notify(change)
+
+    def delete(self, name: str) -> None:
+        with self._lock:
+            if name not in self._prompts:
+                raise PromptNotFoundError(name)
+            del self._prompts[name]
+            self._cache.pop(name)
+            change = Change("delete", name)
+            self._changes.append(change)
+        self._notify(change)
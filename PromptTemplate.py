@@ -0,0 +1,235 @@
+# Prompt templates: variables, includes and copy wrappers.
+#
+# Prompt bodies may contain two kinds of placeholders:
+#
+#     {$topic}           a variable, filled from the values passed to render()
+#     {>Other Prompt}    the body of another prompt, itself rendered
+#
+# Both need their sigil, so braces written before templates existed ({word},
+# {{mustache}}, code, JSON, ...) are ordinary text and existing prompts copy
+# byte for byte. Doubled braces are always copied as written, even around a
+# placeholder. A variable with no value is left exactly as written. A wrapper
+# marks where the wrapped prompt goes with {@prompt}, which is not a variable,
+# so a prompt's own {$prompt} blank is never mistaken for it.
+#
+# TemplateEngine parses each prompt once into a Template and keeps it until a
+# store listener reports that the prompt was edited, renamed or deleted.
+# Rendering a prompt inlines its includes (rejecting cycles) into a single
+# str.format_map pattern, which is cached as well, so batch rendering only
+# pays for the formatting itself. Nothing here imports tkinter.
+
+from __future__ import annotations
+
+import re
+import threading
+from typing import Iterable, Iterator, NamedTuple
+
+from PromptMetrics import metrics
+from PromptStore import PromptNotFoundError, PromptStoreError, _LRUCache
+
+WRAPPER_VARIABLE = "@prompt"     # Where a wrapper puts the rendered prompt
+WRAPPER_PREFIX = "Wrapper: "     # Prompts named like this are offered as copy wrappers
+
+# Doubled braces (no groups, copied as written), or a variable (group 1),
+# the wrapper slot (group 2) or an include (group 3).
+PLACEHOLDER_RE = re.compile(r"\{\{[^{}\n]*\}\}"
+                            r"|\{(?:\$([A-Za-z_][A-Za-z0-9_]*)|(" + re.escape(WRAPPER_VARIABLE) + r")|>([^{}\n]+))\}")
+
+# The text copy_prompt_to_clipboard always put around a prompt.
+DEFAULT_WRAPPER = "(Important) Follow These Additional Instructions to Provide your Answer: [ {" + WRAPPER_VARIABLE + "} ]"
+
+
+class TemplateError(PromptStoreError):
+    """Raised when a template cannot be rendered (missing include, cycle, missing value)."""
+
+
+class Variable(NamedTuple):
+    name: str
+
+
+class Include(NamedTuple):
+    name: str
+
+
+class Template:
+    """One parsed body: literal strings interleaved with Variable and Include parts."""
+
+    __slots__ = ("parts", "variables", "includes")
+
+    def __init__(self, parts: tuple):
+        self.parts = parts
+        self.variables = frozenset(part.name for part in parts if type(part) is Variable)
+        self.includes = tuple(dict.fromkeys(part.name for part in parts if type(part) is Include))
+
+    @classmethod
+    def compile(cls, text: str) -> Template:
+        parts = []
+        pos = 0
+        for match in PLACEHOLDER_RE.finditer(text):
+            if match.start() > pos:
+                parts.append(text[pos:match.start()])
+            variable, slot, include = match.groups()
+            if variable or slot:
+                parts.append(Variable(variable or slot))
+            elif include:
+                parts.append(Include(include.strip()))
+            else:
+                parts.append(match.group())  # {{...}}: text, whatever is inside
+            pos = match.end()
+        if pos < len(text):
+            parts.append(text[pos:])
+        return cls(tuple(parts))
+
+
+class _Values(dict):
+    """format_map mapping that leaves variables without a value as written."""
+
+    __slots__ = ()
+
+    def __missing__(self, key):
+        return "{" + key + "}" if key == WRAPPER_VARIABLE else "{$" + key + "}"
+
+
+class Renderer:
+    """A template with its includes inlined, ready to be filled many times."""
+
+    __slots__ = ("pattern", "variables")
+
+    def __init__(self, pattern: str, variables: frozenset):
+        self.pattern = pattern       # str.format pattern: literal braces doubled
+        self.variables = variables   # Every variable, including those of included prompts
+
+    def render(self, values: dict | None = None, strict: bool = False) -> str:
+        if strict:
+            missing = self.variables.difference(values or ())
+            if missing:
+                raise TemplateError(f"No value for {', '.join(sorted(missing))}.")
+        return self.pattern.format_map(_Values(values or ()))
+
+
+class TemplateEngine:
+    """Compiled-template cache for one PromptStore.
+
+    Compiled templates are kept per prompt name (up to cache_size of them)
+    and dropped as the store reports changes. Renderers depend on every
+    prompt they include, so they are all dropped on any change.
+    """
+
+    DEFAULT_CACHE_SIZE = 4096
+
+    def __init__(self, store, cache_size: int = DEFAULT_CACHE_SIZE):
+        self.store = store
+        self._lock = threading.RLock()
+        self._templates = _LRUCache(cache_size)
+        self._renderers: dict[str, Renderer] = {}
+        self._default_wrapper = self._build(Template.compile(DEFAULT_WRAPPER), ())
+        store.add_listener(self.on_change)
+
+    def detach(self) -> None:
+        self.store.remove_listener(self.on_change)
+
+    def on_change(self, change) -> None:
+        with self._lock:
+            if change.op == "reset":
+                self._templates.clear()
+            else:
+                self._templates.pop(change.name)
+                if change.new_name is not None:
+                    self._templates.pop(change.new_name)
+            self._renderers.clear()
+
+    # --- Compiling ---
+
+    def template(self, name: str) -> Template:
+        """The parsed body of prompt name."""
+        with self._lock:
+            template = self._templates.get(name)
+            if template is None:
+                with metrics.span("template.compile"):
+                    template = Template.compile(self.store.get(name))
+                self._templates.put(name, template)
+            return template
+
+    def renderer(self, name: str) -> Renderer:
+        """Prompt name with its includes resolved; raises TemplateError on a cycle or missing include."""
+        with self._lock:
+            renderer = self._renderers.get(name)
+            if renderer is None:
+                renderer = self._renderers[name] = self._build(self.template(name), (name,))
+            return renderer
+
+    def _build(self, template, chain) -> Renderer:
+        pieces = []
+        variables = set()
+        self._flatten(template, chain, pieces, variables)
+        return Renderer("".join(pieces), frozenset(variables))
+
+    def _flatten(self, template, chain, pieces, variables):
+        """Append template's format pattern to pieces; chain is the include path that led here."""
+        for part in template.parts:
+            if type(part) is str:
+                pieces.append(part.replace("{", "{{").replace("}", "}}"))
+            elif type(part) is Variable:
+                pieces.append("{" + part.name + "}")
+                if part.name != WRAPPER_VARIABLE:  # Filled by render_wrapped(), never asked for
+                    variables.add(part.name)
+            else:
+                if part.name in chain:
+                    cycle = " -> ".join(chain[chain.index(part.name):] + (part.name,))
+                    raise TemplateError(f"Prompts include each other: {cycle}.")
+                try:
+                    included = self.template(part.name)
+                except PromptNotFoundError:
+                    raise TemplateError(f"'{chain[-1]}' includes '{part.name}', which does not exist.") from None
+                self._flatten(included, chain + (part.name,), pieces, variables)
+
+    # --- Rendering ---
+
+    def variables(self, name: str, wrapper: str | None = None) -> list[str]:
+        """Sorted variables needed to render name (and wrap it with wrapper, see render_wrapped)."""
+        variables = set(self.renderer(name).variables)
+        wrapper_renderer = self._wrapper_renderer(wrapper)
+        if wrapper_renderer is not None:
+            variables |= wrapper_renderer.variables
+        return sorted(variables)
+
+    @metrics.timed("template.render")
+    def render(self, name: str, values: dict | None = None, strict: bool = False) -> str:
+        """Body of prompt name with includes expanded and variables filled in.
+
+        Variables without a value stay as written unless strict is set, in
+        which case they raise TemplateError.
+        """
+        return self.renderer(name).render(values, strict)
+
+    def render_many(self, name: str, rows: Iterable[dict], strict: bool = False) -> Iterator[str]:
+        """Render name once per dictionary of values in rows."""
+        renderer = self.renderer(name)
+        for values in rows:
+            yield renderer.render(values, strict)
+
+    def render_wrapped(self, name: str, values: dict | None = None, wrapper: str | None = DEFAULT_WRAPPER,
+                       strict: bool = False) -> str:
+        """render() the prompt, then put it in wrapper's {@prompt} placeholder.
+
+        wrapper is DEFAULT_WRAPPER, None for no wrapper, or the name of a
+        prompt used as wrapper template. The wrapper gets the same values.
+        """
+        body = self.render(name, values, strict)
+        wrapper_renderer = self._wrapper_renderer(wrapper)
+        if wrapper_renderer is None:
+            return body
+        wrapper_values = dict(values or ())
+        wrapper_values[WRAPPER_VARIABLE] = body
+        return wrapper_renderer.render(wrapper_values, strict)
+
+    def _wrapper_renderer(self, wrapper):
+        if wrapper is None:
+            return None
+        if wrapper == DEFAULT_WRAPPER:
+            return self._default_wrapper
+        return self.renderer(wrapper)
+
+    def wrappers(self) -> list[str]:
+        """Names of the prompts offered as copy wrappers, sorted."""
+        return sorted(name for name in self.store if name.startswith(WRAPPER_PREFIX))
@@ -0,0 +1,193 @@
+# Bulk import and export of prompts.
+#
+# The exchange format is JSON Lines: one {"name": ..., "body": ...} object per
+# line. Both directions stream: export writes one prompt at a time (reading
+# lazily stored bodies without caching them), and import reads one line at a
+# time and saves to the store every batch_size prompts, so neither side holds
+# a second copy of the library.
+#
+# On import, a prompt whose name already exists is skipped, overwritten or
+# added under a new name ("Name (2)") according to the conflict policy, and
+# prompts whose body is identical to one already in the library (or earlier
+# in the same import) are dropped as duplicates. Bodies are compared by a
+# 16-byte BLAKE2 digest, so the duplicate check holds digests, not bodies.
+
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Iterable, NamedTuple
+
+from PromptMetrics import metrics
+from PromptStore import PromptFormatError, atomic_write
+
+POLICIES = ("skip", "overwrite", "rename")
+DEFAULT_POLICY = "skip"
+DEFAULT_BATCH_SIZE = 5000
+
+
+class ImportResult(NamedTuple):
+    """Counts of what import_prompts() did with each incoming prompt."""
+    added: int
+    overwritten: int
+    renamed: int
+    skipped: int        # Name already taken and policy "skip"
+    duplicates: int     # Same body as a prompt already in the library
+
+    def __str__(self):
+        parts = [f"{self.added} added"]
+        for count, label in ((self.overwritten, "overwritten"), (self.renamed, "added under a new name"),
+                             (self.skipped, "skipped (name exists)"), (self.duplicates, "skipped (duplicate body)")):
+            if count:
+                parts.append(f"{count} {label}")
+        return ", ".join(parts)
+
+
+def body_digest(body: str) -> bytes:
+    return hashlib.blake2b(body.encode('utf-8'), digest_size=16).digest()
+
+
+def unique_name(name: str, taken) -> str:
+    """name, or "name (2)", "name (3)", ... whichever is first not in taken."""
+    if name not in taken:
+        return name
+    n = 2
+    while f"{name} ({n})" in taken:
+        n += 1
+    return f"{name} ({n})"
+
+
+# --- Reading ---
+
+def iter_jsonl(f) -> Iterable[tuple[str, str]]:
+    """Yield (name, body) from a JSON Lines file object; blank lines are ignored."""
+    for number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise PromptFormatError(f"Line {number}: not valid JSON ({e.msg}).") from None
+        if (not isinstance(record, dict) or not isinstance(record.get("name"), str)
+                or not isinstance(record.get("body"), str)):
+            raise PromptFormatError(f"Line {number}: expected an object with string \"name\" and \"body\".")
+        yield record["name"], record["body"]
+
+
+def iter_json_dict(f) -> Iterable[tuple[str, str]]:
+    """Yield (name, body) from a promptData.json-style dictionary (read whole)."""
+    try:
+        data = json.load(f)
+    except json.JSONDecodeError as e:
+        raise PromptFormatError(f"Not valid JSON: {e}") from None
+    if not isinstance(data, dict):
+        raise PromptFormatError("Expected a JSON dictionary of prompt names to bodies.")
+    for name, body in data.items():
+        if not isinstance(body, str):
+            raise PromptFormatError(f"Prompt '{name}' does not have a text body.")
+        yield name, body
+
+
+def iter_file(path: str):
+    """(name, body) pairs from a .jsonl file, or a .json dictionary for any other extension."""
+    with open(path, 'r', encoding='utf-8') as f:
+        reader = iter_jsonl if path.lower().endswith(".jsonl") else iter_json_dict
+        yield from reader(f)
+
+
+# --- Import ---
+
+@metrics.timed("transfer.import")
+def import_prompts(store, prompts: Iterable[tuple[str, str]], policy: str = DEFAULT_POLICY,
+                   dedup: bool = True, batch_size: int | None = None,
+                   added_names: list | None = None, replaced: list | None = None) -> ImportResult:
+    """Put (name, body) pairs into store according to policy; returns the counts.
+
+    The store is saved every batch_size prompts and at the end (if it has a
+    directory); 0 saves only at the end. The default is DEFAULT_BATCH_SIZE for
+    backends that save incrementally, and only at the end for those that
+    rewrite whole files on every save. Names that were newly
+    created are appended to added_names, if given, so a caller can update its
+    view once afterwards, and (name, body, previous body) for each overwritten
+    prompt to replaced, so it can record them in the prompts' histories.
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown conflict policy '{policy}' (use {', '.join(POLICIES)}).")
+    if store.backend is None:
+        batch_size = 0
+    elif batch_size is None:
+        batch_size = DEFAULT_BATCH_SIZE if store.backend.incremental_save else 0
+    seen = set()
+    if dedup:
+        with metrics.span("transfer.hash_library"):
+            seen = {body_digest(body) for _, body in store.items()}
+    added = overwritten = renamed = skipped = duplicates = pending = 0
+    for name, body in prompts:
+        if dedup:
+            digest = body_digest(body)
+            if digest in seen:
+                duplicates += 1
+                continue
+            seen.add(digest)
+        if name in store:
+            if policy == "skip":
+                skipped += 1
+                continue
+            if policy == "overwrite":
+                previous = store.get(name)
+                store.put(name, body)
+                overwritten += 1
+                if replaced is not None and body != previous:
+                    replaced.append((name, body, previous))
+            else:
+                name = unique_name(name, store)
+                store.put(name, body)
+                renamed += 1
+                if added_names is not None:
+                    added_names.append(name)
+        else:
+            store.put(name, body)
+            added += 1
+            if added_names is not None:
+                added_names.append(name)
+        pending += 1
+        if batch_size and pending >= batch_size:
+            store.save()
+            pending = 0
+    if store.backend is not None and store.dirty:
+        store.save()
+    return ImportResult(added, overwritten, renamed, skipped, duplicates)
+
+
+# --- Export ---
+
+@metrics.timed("transfer.export")
+def export_jsonl(store, f) -> int:
+    """Write every prompt to f as JSON Lines; returns the count."""
+    count = 0
+    for name, body in store.items():
+        f.write(json.dumps({"name": name, "body": body}, ensure_ascii=False))
+        f.write("\n")
+        count += 1
+    return count
+
+
+@metrics.timed("transfer.export")
+def export_json(store, f) -> int:
+    """Write every prompt to f as a promptData.json-style dictionary; returns the count."""
+    count = 0
+    f.write("{")
+    for name, body in store.items():
+        f.write(",\n    " if count else "\n    ")
+        f.write(f"{json.dumps(name)}: {json.dumps(body)}")
+        count += 1
+    f.write("\n}\n" if count else "}\n")
+    return count
+
+
+def export_file(store, path: str) -> int:
+    """Export to path as JSON Lines (.jsonl) or a JSON dictionary (any other extension)."""
+    with atomic_write(path, encoding='utf-8') as f:
+        if path.lower().endswith(".jsonl"):
+            return export_jsonl(store, f)
+        return export_json(store, f)
@@ -0,0 +1,135 @@
+# Write-behind saving for PromptStore.
+#
+# The GUI calls schedule() after every mutation. A background thread waits
+# until no new changes have arrived for `delay` seconds (or `max_delay` has
+# passed since the first unsaved change) and then runs one store.save() for
+# the whole burst, so saving never blocks the Tk event loop.
+
+from __future__ import annotations
+
+import threading
+import time
+
+
+class WriteBehindWriter:
+    """Debounced background saver for one PromptStore."""
+
+    IDLE = "idle"
+    PENDING = "pending"
+    WRITING = "writing"
+
+    def __init__(self, store, delay: float = 0.5, max_delay: float = 5.0):
+        self.store = store
+        self.delay = delay
+        self.max_delay = max_delay
+        self._cond = threading.Condition()
+        self._first_request = None   # monotonic time of the oldest unsaved request
+        self._last_request = None    # monotonic time of the newest request
+        self._writing = False
+        self._flush_requested = False
+        self._stopping = False
+        self._error = None
+        self._thread = None
+
+    # --- Called from the UI thread ---
+
+    def schedule(self) -> None:
+        """Note that the store has unsaved changes; the write happens later.
+
+        Also restarts a writer that was closed.
+        """
+        with self._cond:
+            self._stopping = False
+            now = time.monotonic()
+            if self._first_request is None:
+                self._first_request = now
+            self._last_request = now
+            self._ensure_thread()
+            self._cond.notify()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Write anything pending right away and wait for it to finish.
+
+        Returns False if the wait timed out. A failed write is reported
+        through status()/take_error(), not raised here.
+        """
+        with self._cond:
+            if self._first_request is None and not self._writing:
+                return True
+            self._flush_requested = True
+            self._ensure_thread()
+            self._cond.notify()
+            return self._cond.wait_for(lambda: self._first_request is None and not self._writing, timeout)
+
+    def close(self, timeout: float | None = None) -> bool:
+        """Flush and stop the background thread."""
+        flushed = self.flush(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        return flushed
+
+    @property
+    def pending(self) -> bool:
+        """True while there are changes that have not reached disk yet."""
+        return self._first_request is not None or self._writing
+
+    def status(self) -> str:
+        with self._cond:
+            if self._writing:
+                return self.WRITING
+            if self._first_request is not None:
+                return self.PENDING
+            return self.IDLE
+
+    def take_error(self) -> Exception | None:
+        """Return (and clear) the exception from the last failed write."""
+        with self._cond:
+            error, self._error = self._error, None
+            return error
+
+    # --- Background thread ---
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="PromptWriter", daemon=True)
+            self._thread.start()
+
+    def _due_in(self, now):
+        """Seconds until the pending burst should be written (<= 0 means now)."""
+        if self._flush_requested:
+            return 0
+        return min(self._last_request + self.delay, self._first_request + self.max_delay) - now
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._first_request is not None:
+                        wait = self._due_in(time.monotonic())
+                        if wait <= 0:
+                            break
+                        self._cond.wait(wait)
+                    elif self._stopping:
+                        return
+                    else:
+                        self._cond.wait()
+                self._first_request = self._last_request = None
+                self._flush_requested = False
+                self._writing = True
+
+            error = None
+            try:
+                self.store.save()
+            except Exception as e:
+                error = e
+
+            with self._cond:
+                self._writing = False
+                if error is not None:
+                    self._error = error
+                self._cond.notify_all()
@@ -0,0 +1,223 @@
+# Directory-sharded storage for PromptStore.
+#
+# Prompts live in a promptShards/ directory: a small manifest.json plus N
+# shard files (shard-000.json ...), each an ordinary JSON dictionary holding
+# the prompts whose name hashes (CRC-32, stable across runs and machines) to
+# that shard. A save rewrites only the shards touched by the pending changes,
+# so one edit costs one small file, and writers that touch different shards do
+# not contend for the same file. Shards are read in parallel on load.
+#
+# Migrating from and back to the single promptData.json file:
+#
+#     python ShardedBackend.py split <directory> [--shards N]
+#     python ShardedBackend.py join <directory>
+
+from __future__ import annotations
+
+import json
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from PromptStore import (Change, JsonFileBackend, PromptFormatError, PromptStoreError, StorageBackend,
+                         atomic_write, file_signature)
+
+SHARD_DIRNAME = "promptShards"
+
+
+class ShardedBackend(StorageBackend):
+    """N hash-partitioned JSON shard files plus a manifest."""
+
+    name = "sharded"
+    filename = os.path.join(SHARD_DIRNAME, "manifest.json")
+    VERSION = 1
+    DEFAULT_SHARDS = 64
+    LOAD_THREADS = 8
+
+    def __init__(self, directory: str, shards: int | None = None):
+        super().__init__(directory)
+        self.shard_count = shards or self.DEFAULT_SHARDS   # Replaced by the manifest's count on load
+        self._members: list[set[str]] | None = None        # Names per shard, as last loaded/saved
+
+    @classmethod
+    def detect(cls, directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, cls.filename))
+
+    @property
+    def shard_directory(self) -> str:
+        return os.path.join(self.directory, SHARD_DIRNAME)
+
+    def shard_path(self, index: int) -> str:
+        return os.path.join(self.shard_directory, f"shard-{index:03d}.json")
+
+    def shard_of(self, name: str) -> int:
+        return zlib.crc32(name.encode('utf-8')) % self.shard_count
+
+    def signature(self):
+        if not self.exists():
+            return file_signature(self.path)
+        if self._members is None:
+            self._read_manifest()  # Get the real shard count before listing shard files
+        return [file_signature(self.path)] + [file_signature(self.shard_path(i)) for i in range(self.shard_count)]
+
+    # --- Loading ---
+
+    def _read_manifest(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except json.JSONDecodeError as e:
+            raise PromptFormatError(f"Error decoding '{self.filename}'. It might be corrupted.") from e
+        if not isinstance(manifest, dict) or manifest.get("version") != self.VERSION or not isinstance(manifest.get("shards"), int):
+            raise PromptFormatError(f"File '{self.filename}' found but has an unexpected format.")
+        self.shard_count = manifest["shards"]
+
+    def _read_shard(self, index: int) -> dict[str, str]:
+        path = self.shard_path(index)
+        if not os.path.exists(path):
+            return {}  # Shards that never held a prompt are not written.
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise PromptFormatError(f"Error decoding shard '{os.path.basename(path)}'. It might be corrupted.") from e
+        if not isinstance(data, dict):
+            raise PromptFormatError(f"Shard '{os.path.basename(path)}' has an unexpected format (expected a JSON dictionary).")
+        return data
+
+    def _iter_shards(self):
+        """Yield (index, prompts) for every shard, reading them in parallel."""
+        self._read_manifest()
+        with ThreadPoolExecutor(max_workers=self.LOAD_THREADS) as pool:
+            yield from enumerate(pool.map(self._read_shard, range(self.shard_count)))
+
+    def load(self) -> dict[str, str]:
+        prompts = {}
+        members = []
+        for _, shard in self._iter_shards():
+            prompts.update(shard)
+            members.append(set(shard))
+        self._members = members
+        return prompts
+
+    def iter_load(self):
+        members = []
+        for index, shard in self._iter_shards():
+            members.append(set(shard))
+            progress = (index + 1) / self.shard_count
+            for name, body in shard.items():
+                yield name, body, progress
+        self._members = members
+
+    def fetch(self, name: str) -> str | None:
+        self._read_manifest()
+        return self._read_shard(self.shard_of(name)).get(name)
+
+    # --- Saving ---
+
+    def save(self, prompts: dict[str, str], changes: list[Change]) -> None:
+        if self._members is None or not self.exists():
+            self._write_all(prompts)
+            return
+        dirty = set()
+        for change in changes:
+            for name in (change.name, change.new_name):
+                if name is None:
+                    continue
+                index = self.shard_of(name)
+                dirty.add(index)
+                if name in prompts:
+                    self._members[index].add(name)
+                else:
+                    self._members[index].discard(name)
+        for index in sorted(dirty):
+            self._write_shard(index, {name: prompts[name] for name in sorted(self._members[index])})
+
+    def _write_shard(self, index, shard):
+        if shard:
+            with atomic_write(self.shard_path(index), encoding='utf-8') as f:
+                json.dump(shard, f, indent=4)
+        elif os.path.exists(self.shard_path(index)):
+            os.remove(self.shard_path(index))
+
+    def _write_all(self, prompts):
+        """Write every shard and then the manifest (first save, or after a reset)."""
+        os.makedirs(self.shard_directory, exist_ok=True)
+        shards = [{} for _ in range(self.shard_count)]
+        for name in sorted(prompts):
+            shards[self.shard_of(name)][name] = prompts[name]
+        for index, shard in enumerate(shards):
+            self._write_shard(index, shard)
+        with atomic_write(self.path, encoding='utf-8') as f:
+            json.dump({"version": self.VERSION, "shards": self.shard_count}, f, indent=4)
+        self._members = [set(shard) for shard in shards]
+
+    # --- Import ---
+
+    def import_json(self, json_path: str, overwrite: bool = True) -> int:
+        """Fill the shards from a promptData.json file; returns the number of prompts imported.
+
+        With overwrite=False prompts that already exist keep their current body.
+        """
+        source = JsonFileBackend(os.path.dirname(json_path))
+        source.filename = os.path.basename(json_path)
+        imported = source.load()
+        prompts = self.load() if self.exists() else {}
+        for name, body in imported.items():
+            if overwrite or name not in prompts:
+                prompts[name] = body
+        self._write_all(prompts)
+        return len(imported)
+
+
+# --- Migration to and from the single-file format ---
+
+def _backup_path(path):
+    backup = path + ".bak"
+    if os.path.exists(backup):
+        raise PromptStoreError(f"Backup '{backup}' already exists; move it away before migrating.")
+    return backup
+
+
+def split_library(directory: str, shards: int = ShardedBackend.DEFAULT_SHARDS) -> int:
+    """Convert promptData.json into promptShards/; the JSON file becomes promptData.json.bak."""
+    source = JsonFileBackend(directory)
+    target = ShardedBackend(directory, shards=shards)
+    if target.exists():
+        raise PromptStoreError(f"'{target.filename}' already exists in '{directory}'.")
+    backup = _backup_path(source.path)
+    count = target.import_json(source.path)
+    os.replace(source.path, backup)
+    return count
+
+
+def join_library(directory: str) -> int:
+    """Convert promptShards/ back into promptData.json; the shards become promptShards.bak/."""
+    source = ShardedBackend(directory)
+    target = JsonFileBackend(directory)
+    if target.exists():
+        raise PromptStoreError(f"'{target.filename}' already exists in '{directory}'.")
+    backup = _backup_path(source.shard_directory)
+    prompts = source.load()
+    target.save(prompts, [])
+    os.replace(source.shard_directory, backup)
+    return len(prompts)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Migrate a prompt directory between promptData.json and sharded storage.")
+    parser.add_argument("action", choices=("split", "join"),
+                        help="'split' converts promptData.json into shards; 'join' converts shards back into promptData.json")
+    parser.add_argument("directory")
+    parser.add_argument("--shards", type=int, default=ShardedBackend.DEFAULT_SHARDS,
+                        help=f"number of shard files for 'split' (default: {ShardedBackend.DEFAULT_SHARDS})")
+    args = parser.parse_args()
+
+    if args.action == "split":
+        count = split_library(args.directory, args.shards)
+        print(f"Split {count} prompts into {args.shards} shards in '{os.path.join(args.directory, SHARD_DIRNAME)}'.")
+    else:
+        count = join_library(args.directory)
+        print(f"Joined {count} prompts into '{os.path.join(args.directory, JsonFileBackend.filename)}'.")
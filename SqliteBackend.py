@@ -0,0 +1,216 @@
+# SQLite storage for PromptStore.
+#
+# prompts.sqlite holds one row per prompt. The database runs in WAL mode so
+# the GUI can keep reading while the background writer commits, every
+# create/edit/rename/delete is a single-row statement, and an FTS5 table
+# (kept in sync by triggers) serves content search. Bodies are read on demand,
+# so only names are loaded at startup. Everything uses the stdlib sqlite3.
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+
+from PromptStore import Change, PromptFormatError, StorageBackend, file_signature
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prompts (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    body TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1
+);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS prompts_fts USING fts5(
+    name, body, content='prompts', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS prompts_ai AFTER INSERT ON prompts BEGIN
+    INSERT INTO prompts_fts(rowid, name, body) VALUES (new.id, new.name, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS prompts_ad AFTER DELETE ON prompts BEGIN
+    INSERT INTO prompts_fts(prompts_fts, rowid, name, body) VALUES ('delete', old.id, old.name, old.body);
+END;
+CREATE TRIGGER IF NOT EXISTS prompts_au AFTER UPDATE ON prompts BEGIN
+    INSERT INTO prompts_fts(prompts_fts, rowid, name, body) VALUES ('delete', old.id, old.name, old.body);
+    INSERT INTO prompts_fts(rowid, name, body) VALUES (new.id, new.name, new.body);
+END;
+"""
+
+
+class SqliteBackend(StorageBackend):
+    """prompts.sqlite with WAL, single-row writes and FTS5 search."""
+
+    name = "sqlite"
+    filename = "prompts.sqlite"
+    lazy = True
+    incremental_save = True
+    NAME_WEIGHT = 5.0   # bm25 weight of the name column relative to the body
+
+    def __init__(self, directory: str):
+        super().__init__(directory)
+        self._local = threading.local()   # sqlite3 connections are per thread
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._has_fts = None              # Decided when the schema is created
+
+    @property
+    def has_fts(self) -> bool:
+        """True if this SQLite has FTS5, so search() works; connects to find out."""
+        if self._has_fts is None:
+            self._connect()
+        return self._has_fts
+
+    @classmethod
+    def detect(cls, directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, cls.filename))
+
+    def signature(self):
+        self._connect()  # Opening the database creates its files; count that as the starting point.
+        return [file_signature(self.path), file_signature(self.path + "-wal")]
+
+    # --- Connections ---
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(self.directory, exist_ok=True)
+            # Explicit transactions; close() may run on another thread once
+            # the owning one is done with the connection.
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._ensure_schema(conn)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _ensure_schema(self, conn):
+        try:
+            conn.executescript(SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(prompts)")}
+            if "version" not in columns:
+                # Databases created before per-row versions existed.
+                conn.execute("ALTER TABLE prompts ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+        except sqlite3.DatabaseError as e:
+            raise PromptFormatError(f"File '{self.filename}' is not a usable SQLite database: {e}") from e
+        if self._has_fts is None:
+            try:
+                conn.executescript(FTS_SCHEMA)
+                self._has_fts = True
+            except sqlite3.OperationalError:
+                # Built without FTS5: storage still works, search falls back
+                # to the in-memory index.
+                self._has_fts = False
+
+    def close(self) -> None:
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+    # --- StorageBackend ---
+
+    def load(self) -> dict[str, None]:
+        rows = self._connect().execute("SELECT name FROM prompts ORDER BY name")
+        return dict.fromkeys(name for (name,) in rows)
+
+    def read_body(self, name: str) -> str:
+        body = self.fetch(name)
+        if body is None:
+            raise KeyError(name)
+        return body
+
+    def fetch(self, name: str) -> str | None:
+        row = self._connect().execute("SELECT body FROM prompts WHERE name = ?", (name,)).fetchone()
+        return row[0] if row is not None else None
+
+    def save(self, prompts: dict[str, str | None], changes: list[Change]) -> None:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for change in changes:
+                if change.op == "put":
+                    conn.execute(
+                        "INSERT INTO prompts(name, body) VALUES (?, ?) "
+                        "ON CONFLICT(name) DO UPDATE SET body = excluded.body, version = version + 1",
+                        (change.name, change.body))
+                elif change.op == "rename":
+                    conn.execute("UPDATE prompts SET name = ?, version = version + 1 WHERE name = ?",
+                                 (change.new_name, change.name))
+                elif change.op == "delete":
+                    conn.execute("DELETE FROM prompts WHERE name = ?", (change.name,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def versions(self, prompts) -> dict:
+        # Every write bumps a row's version and a re-created row gets a new
+        # id, so (id, version) identifies one state of an entry.
+        conn = self._connect()
+        if len(prompts) > 500:
+            rows = conn.execute("SELECT name, id, version FROM prompts")
+            return {name: (row_id, version) for name, row_id, version in rows if name in prompts}
+        versions = {}
+        for name in prompts:
+            row = conn.execute("SELECT id, version FROM prompts WHERE name = ?", (name,)).fetchone()
+            if row is not None:
+                versions[name] = tuple(row)
+        return versions
+
+    def compact(self, prompts) -> None:
+        # Fold the WAL back into the main database file.
+        self._connect().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    # --- Search ---
+
+    def search(self, query: str, limit: int | None = None) -> list[str]:
+        """Names whose name or body contain every query word (as a prefix), best first."""
+        words = [word for word in query.replace('"', ' ').split() if word]
+        if not words:
+            return []
+        match = " AND ".join(f'"{word}"*' for word in words)
+        sql = ("SELECT prompts.name FROM prompts_fts JOIN prompts ON prompts.id = prompts_fts.rowid "
+               "WHERE prompts_fts MATCH ? ORDER BY bm25(prompts_fts, ?, 1.0), prompts.name")
+        params = [match, self.NAME_WEIGHT]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [name for (name,) in self._connect().execute(sql, params)]
+
+    # --- Import ---
+
+    def import_json(self, json_path: str, overwrite: bool = True) -> int:
+        """Copy every prompt from a promptData.json file in one transaction.
+
+        Returns the number of prompts imported. With overwrite=False prompts
+        whose name already exists in the database are left alone.
+        """
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise PromptFormatError(f"Error decoding JSON file '{json_path}'. It might be corrupted.") from e
+        if not isinstance(data, dict):
+            raise PromptFormatError(f"File '{json_path}' found but has an unexpected format (expected a JSON dictionary).")
+
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if overwrite:
+                sql = ("INSERT INTO prompts(name, body) VALUES (?, ?) "
+                       "ON CONFLICT(name) DO UPDATE SET body = excluded.body, version = version + 1")
+            else:
+                sql = "INSERT OR IGNORE INTO prompts(name, body) VALUES (?, ?)"
+            imported = conn.executemany(sql, data.items()).rowcount
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return imported
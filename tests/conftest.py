@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+# The modules live next to this directory, not in a package.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PromptStore import PromptStore  # noqa: E402
+
+
+def reopen(directory, backend=None) -> PromptStore:
+    """A fresh store on directory, loaded, as another run of the program would see it."""
+    store = PromptStore(directory, backend=backend)
+    store.load()
+    return store
+
+
+def contents(store) -> dict:
+    return dict(store.items())
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return str(tmp_path)
@@ -0,0 +1,226 @@
+import os
+import time
+
+import pytest
+
+import JournalBackend as journal_module
+from PromptStore import BACKENDS, PromptStore, PromptStoreError
+from conftest import contents, reopen
+
+
+def bump_mtime(path):
+    """Change path's mtime (and so its signature) without changing its contents."""
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5 * 10 ** 9))
+
+
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+def test_round_trip(directory, backend):
+    store = PromptStore(directory, backend=backend)
+    store.put("a", "Alpha")
+    store.put("b", "Bravo " * 2000)  # Large enough to be chunked by the blob backend
+    store.save()
+    store.put("c", "Charlie")
+    store.rename("a", "renamed")
+    store.delete("b")
+    store.save()
+    store.close()
+
+    store = reopen(directory, backend)
+    assert contents(store) == {"renamed": "Alpha", "c": "Charlie"}
+    store.close()
+
+
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+def test_reopen_without_compaction(directory, backend):
+    store = PromptStore(directory, backend=backend)
+    store.put("a", "one")
+    store.save()
+    for i in range(5):
+        store.put(f"p{i}", f"body {i}")
+        store.save()
+    store.close(compact=False)
+
+    store = reopen(directory, backend)
+    assert contents(store) == {"a": "one", **{f"p{i}": f"body {i}" for i in range(5)}}
+    store.close()
+
+
+# --- Journal ---
+
+def make_journal(directory):
+    store = PromptStore(directory, backend="journal")
+    store.put("a", "one")
+    store.save()                     # Snapshot
+    store.put("b", "two")
+    store.save()                     # Journal record
+    store.close(compact=False)
+    return store.backend.journal_path
+
+
+def test_journal_torn_tail_is_kept_out_of_later_appends(directory):
+    journal_path = make_journal(directory)
+    with open(journal_path, 'a', encoding='utf-8') as f:
+        f.write('{"op": "put", "name": "half')   # A crash mid-append
+
+    store = reopen(directory, "journal")
+    assert contents(store) == {"a": "one", "b": "two"}
+    store.put("c", "three")
+    store.save()
+    store.put("d", "four")
+    store.save()
+    store.close(compact=False)
+
+    store = reopen(directory, "journal")
+    assert contents(store) == {"a": "one", "b": "two", "c": "three", "d": "four"}
+    with open(journal_path, encoding='utf-8') as f:
+        assert "half" not in f.read()
+
+
+def test_journal_survives_snapshot_touched_elsewhere(directory):
+    make_journal(directory)
+    bump_mtime(os.path.join(directory, "promptData.json"))  # e.g. a sync tool
+
+    store = reopen(directory, "journal")
+    assert contents(store) == {"a": "one", "b": "two"}
+    store.put("c", "three")
+    store.save()
+    store.close(compact=False)
+    assert contents(reopen(directory, "journal")) == {"a": "one", "b": "two", "c": "three"}
+
+
+def test_journal_crash_after_compaction_is_not_replayed_twice(directory, monkeypatch):
+    store = PromptStore(directory, backend="journal")
+    store.put("a", "old")
+    store.save()
+    store.rename("a", "b")
+    store.put("a", "new")
+    store.save()
+
+    # Crash after the new snapshot replaced the old one, before the journal was emptied.
+    real_open = open
+
+    def crashing_open(path, mode='r', *args, **kwargs):
+        if path == store.backend.journal_path and mode == 'w':
+            raise OSError("simulated crash")
+        return real_open(path, mode, *args, **kwargs)
+
+    monkeypatch.setattr(journal_module, "open", crashing_open, raising=False)
+    with pytest.raises(OSError):
+        store.compact()
+    monkeypatch.undo()
+
+    # Replaying "rename a -> b" onto the new snapshot would overwrite b with "new".
+    store = reopen(directory, "journal")
+    assert contents(store) == {"a": "new", "b": "old"}
+    store.put("c", "three")
+    store.save()
+    store.close(compact=False)
+    assert contents(reopen(directory, "journal")) == {"a": "new", "b": "old", "c": "three"}
+
+
+def test_journal_compaction_empties_journal(directory):
+    journal_path = make_journal(directory)
+    store = reopen(directory, "journal")
+    store.close()
+    assert os.path.getsize(journal_path) == 0
+    assert contents(reopen(directory, "journal")) == {"a": "one", "b": "two"}
+
+
+# --- Blobs ---
+
+def make_blobs(directory):
+    store = PromptStore(directory, backend="blobs")
+    store.put("a", "one")
+    store.save()
+    store.put("b", "two")
+    store.save()
+    store.close(compact=False)
+    return store.backend.log_path
+
+
+def test_blob_log_torn_tail(directory):
+    log_path = make_blobs(directory)
+    with open(log_path, 'a', encoding='utf-8') as f:
+        f.write('{"op":"put","name":"half')
+
+    store = reopen(directory, "blobs")
+    assert contents(store) == {"a": "one", "b": "two"}
+    store.put("c", "three")
+    store.save()
+    store.close(compact=False)
+    assert contents(reopen(directory, "blobs")) == {"a": "one", "b": "two", "c": "three"}
+
+
+def test_blob_log_survives_index_touched_elsewhere(directory):
+    make_blobs(directory)
+    store = PromptStore(directory, backend="blobs")
+    bump_mtime(store.backend.path)
+
+    store = reopen(directory, "blobs")
+    assert contents(store) == {"a": "one", "b": "two"}
+    store.put("c", "three")
+    store.save()
+    store.close(compact=False)
+    assert contents(reopen(directory, "blobs")) == {"a": "one", "b": "two", "c": "three"}
+
+
+def test_blob_deduplicates_and_collects_garbage(directory):
+    shared = "".join(f"line {i}: the same long paragraph of text\n" for i in range(400))
+    store = PromptStore(directory, backend="blobs")
+    store.put("a", shared)
+    store.put("b", shared)
+    store.put("c", shared + "one different line\n")
+    store.save()
+    backend = store.backend
+    pack_size = os.path.getsize(backend._pack_path(backend._pack_name))
+    assert pack_size < 2 * len(shared)          # Shared chunks are stored once
+
+    store.put("a", "short")
+    store.delete("b")
+    store.delete("c")
+    store.save()
+    assert backend.garbage_bytes() > 0
+    assert backend.collect_garbage() > 0
+    assert backend.garbage_bytes() == 0
+    store.close(compact=False)
+
+    store = reopen(directory, "blobs")
+    assert contents(store) == {"a": "short"}
+    assert os.listdir(os.path.join(directory, "promptBlobs")).count(backend._pack_name) == 1
+
+
+def test_blob_index_deleted_after_lazy_load(directory):
+    make_blobs(directory)
+    store = reopen(directory, "blobs")      # Bodies stay in the pack until read
+    store.put("c", "three")
+    store.rename("a", "first")
+    os.remove(store.backend.path)
+    store.backend.save(dict(store._prompts), [])
+    assert contents(reopen(directory, "blobs")) == {"first": "one", "b": "two", "c": "three"}
+
+
+def test_blob_index_and_pack_deleted_after_lazy_load(directory):
+    make_blobs(directory)
+    store = reopen(directory, "blobs")
+    backend = store.backend
+    backend.close()
+    os.remove(backend.path)
+    os.remove(backend._pack_path(backend._pack_name))
+    with pytest.raises(PromptStoreError, match="body of 'a'"):
+        backend.save(dict(store._prompts), [])
+
+
+def test_external_save_is_detected(directory):
+    first = PromptStore(directory, backend="journal")
+    first.put("a", "one")
+    first.save()
+    second = reopen(directory, "journal")
+    time.sleep(0.01)
+    second.put("b", "two two")
+    second.save()
+
+    first.put("c", "three")
+    from PromptStore import ExternalChangeError
+    with pytest.raises(ExternalChangeError):
+        first.save()
@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+import PromptSearch
+from PromptCLI import main
+from PromptStore import PromptStore
+
+
+def run(capsys, directory, *argv):
+    assert main(["--dir", directory, *argv]) == 0
+    return capsys.readouterr().out.splitlines()
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def library(request, directory):
+    store = PromptStore(directory, backend=request.param)
+    store.put("Code review", "Review this {$language} code for bugs")
+    store.put("Email draft", "Draft a short email")
+    store.save()
+    store.close()
+    return directory, request.param
+
+
+def test_search(capsys, library):
+    directory, backend = library
+    assert run(capsys, directory, "search", "review") == ["Code review"]
+    assert run(capsys, directory, "search", "dra") == ["Email draft"]
+    # SQLite answers from its own full-text index; other formats keep one next to the data.
+    index_path = os.path.join(directory, PromptSearch.SearchIndex.FILENAME)
+    assert os.path.exists(index_path) == (backend != "sqlite")
+
+
+def test_sqlite_search_uses_fts(capsys, directory, monkeypatch):
+    store = PromptStore(directory, backend="sqlite")
+    store.put("Code review", "Review this code")
+    store.save()
+    store.close()
+
+    def no_rebuild(self, items):
+        raise AssertionError("searched without FTS5")
+
+    monkeypatch.setattr(PromptSearch.SearchIndex, "rebuild", no_rebuild)
+    assert run(capsys, directory, "search", "code") == ["Code review"]
+
+
+def test_edits_and_lookups(capsys, library):
+    directory, _ = library
+    run(capsys, directory, "put", "Code review", "Review this {$language} code for style")
+    run(capsys, directory, "rename", "Email draft", "Email")
+    assert run(capsys, directory, "list") == ["Code review", "Email"]
+    assert run(capsys, directory, "render", "Code review", "-v", "language=Python") == \
+        ["Review this Python code for style"]
+    assert run(capsys, directory, "history", "Code review", "--show", "1") == ["Review this {$language} code for bugs"]
+    assert main(["--dir", directory, "get", "Email draft"]) == 1
+
+
+def test_import_overwrite_keeps_history(capsys, library, tmp_path):
+    directory, _ = library
+    source = tmp_path / "incoming.jsonl"
+    source.write_text('{"name": "Email draft", "body": "Draft a long email"}\n', encoding="utf-8")
+    assert main(["--dir", directory, "import", str(source), "--on-conflict", "overwrite"]) == 0
+    assert run(capsys, directory, "get", "Email draft") == ["Draft a long email"]
+    assert run(capsys, directory, "history", "Email draft", "--show", "1") == ["Draft a short email"]
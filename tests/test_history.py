@@ -0,0 +1,71 @@
+import pytest
+
+from PromptHistory import PromptHistory
+from PromptStore import PromptStore, PromptStoreError
+
+
+def revisions_of(base, count):
+    """count successive edits of base, some small and some large."""
+    body = base
+    result = [body]
+    for i in range(1, count):
+        if i % 5 == 0:
+            body = f"rewritten {i}\n" * 40
+        else:
+            lines = body.splitlines(keepends=True)
+            lines.insert(i % (len(lines) + 1), f"added line {i}\n")
+            body = "".join(lines)
+        result.append(body)
+    return result
+
+
+def test_restores_every_revision(directory):
+    history = PromptHistory(directory, keyframe_interval=4)
+    bodies = revisions_of("first line\nsecond line\n", 12)
+    previous = None
+    for body in bodies:
+        history.record("p", body, previous)
+        previous = body
+    numbers = [revision.number for revision in history.revisions("p")]
+    assert len(numbers) == len(bodies)
+    assert [history.body("p", number) for number in numbers] == bodies
+
+    reopened = PromptHistory(directory)
+    assert [reopened.body("p", number) for number in numbers] == bodies
+
+
+def test_unchanged_body_is_not_recorded(directory):
+    history = PromptHistory(directory)
+    assert history.record("p", "same")
+    assert not history.record("p", "same", "same")
+
+
+def test_previous_body_is_kept(directory):
+    history = PromptHistory(directory)
+    history.record("p", "second", previous="first")
+    assert [history.body("p", r.number) for r in history.revisions("p")] == ["first", "second"]
+
+
+def test_oldest_revisions_are_dropped(directory):
+    history = PromptHistory(directory, keyframe_interval=4, max_revisions=8)
+    bodies = revisions_of("start\n", 20)
+    for body in bodies:
+        history.record("p", body)
+    revisions = history.revisions("p")
+    assert len(revisions) <= 8
+    assert history.body("p", revisions[-1].number) == bodies[-1]
+    with pytest.raises(PromptStoreError):
+        history.body("p", 1)
+
+
+def test_follows_store_renames_and_deletes(directory):
+    store = PromptStore(directory)
+    store.put("old", "body")
+    history = PromptHistory(directory)
+    history.attach(store)
+    history.record("old", "body")
+    store.rename("old", "new")
+    assert history.revisions("old") == []
+    assert history.body("new", history.revisions("new")[0].number) == "body"
+    store.delete("new")
+    assert history.revisions("new") == []
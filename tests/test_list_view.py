@@ -0,0 +1,23 @@
+import random
+
+from PromptListView import _Positions
+
+
+def test_positions_follow_inserts_and_removals():
+    rng = random.Random(3)
+    names = [f"p{i}" for i in range(50)]
+    rng.shuffle(names)
+    positions = _Positions(names)
+    for step in range(500):
+        if names and rng.random() < 0.5:
+            index = rng.randrange(len(names))
+            positions.removed(names.pop(index), index)
+        else:
+            index = rng.randrange(len(names) + 1)
+            names.insert(index, f"n{step}")
+            positions.inserted(f"n{step}", index)
+        if step % 3 == 0:
+            name = rng.choice(names)
+            assert positions.index(names, name) == names.index(name)
+    assert all(positions.index(names, name) == i for i, name in enumerate(names))
+    assert "missing" not in positions and positions.index(names, "missing") is None
@@ -0,0 +1,166 @@
+import random
+
+import pytest
+
+import PromptSearch
+from PromptSearch import SearchIndex, open_search
+from PromptStore import PromptStore
+from conftest import reopen
+
+WORDS = "review draft outline rewrite summarize report refactor python code email".split()
+QUERIES = ["review", "re", "r", "review draft", "dr out", "prompt", "prompt 0042", "0042", "missing", "email re"]
+
+
+def library(count=600, seed=3):
+    rng = random.Random(seed)
+    return {f"{rng.choice(WORDS)} prompt {i:04d}": " ".join(rng.choice(WORDS) for _ in range(rng.randrange(1, 40)))
+            for i in range(count)}
+
+
+@pytest.fixture
+def index():
+    prompts = library()
+    index = SearchIndex()
+    index.rebuild(prompts.items())
+    for name in random.Random(1).sample(sorted(prompts), 40):
+        index.remove(name)                       # Leaves retired document ids behind
+    return index
+
+
+def test_matches_every_term_best_first():
+    index = SearchIndex()
+    index.rebuild([("Python review", "check the code"), ("Email draft", "review this email"),
+                   ("Notes", "nothing relevant")])
+    assert index.search("review") == ["Python review", "Email draft"]
+    assert index.search("rev email") == ["Email draft"]
+    assert index.search("pyth") == ["Python review"]
+    assert index.search("absent") == []
+    assert index.search("") == []
+
+
+@pytest.mark.parametrize("limit", [None, 1, 7, 50])
+def test_python_and_numpy_results_agree(index, monkeypatch, limit):
+    pytest.importorskip("numpy")
+    with_numpy = [index.search(query, limit) for query in QUERIES]
+    monkeypatch.setattr(PromptSearch, "np", None)
+    assert [index.search(query, limit) for query in QUERIES] == with_numpy
+
+
+def edit(index):
+    """Changes that add() and remove() must carry into the name rank and the impact groups."""
+    index.add("aaa review prompt", "review review draft")
+    index.add("zzz review prompt", "review draft")
+    index.rename(index._names[0], "mmm renamed prompt", "email code")
+    index.remove(index._names[1])
+
+
+def test_name_rank_follows_edits(index):
+    pytest.importorskip("numpy")
+    index.search("review", 5)                    # Builds the name rank
+    edit(index)
+    results = [index.search(query, 7) for query in QUERIES]
+    index._rank = None
+    assert [index.search(query, 7) for query in QUERIES] == results
+
+
+def test_best_first_reading_matches_full_scoring(index, monkeypatch):
+    monkeypatch.setattr(PromptSearch, "np", None)
+
+    def results():
+        return [index.search(query, limit) for query in QUERIES for limit in (1, 7, 50)]
+
+    monkeypatch.setattr(SearchIndex, "LONG_POSTINGS", 10 ** 9)
+    full = results()
+    monkeypatch.setattr(SearchIndex, "LONG_POSTINGS", 20)
+    assert results() == full
+    edit(index)                                  # After the impact groups were built
+    fresh = results()
+    monkeypatch.setattr(SearchIndex, "LONG_POSTINGS", 10 ** 9)
+    assert results() == fresh
+
+
+def test_ties_are_ordered_by_name(monkeypatch):
+    index = SearchIndex()
+    index.rebuild([(name, "same body") for name in ("delta", "alpha", "charlie", "bravo")])
+    index.remove("charlie")
+    assert index.search("same") == ["alpha", "bravo", "delta"]
+    assert index.search("same", 2) == ["alpha", "bravo"]
+    monkeypatch.setattr(PromptSearch, "np", None)
+    assert index.search("same", 2) == ["alpha", "bravo"]
+
+
+def test_stale_persisted_index_is_refreshed(directory):
+    store = PromptStore(directory)
+    for name, body in library(200).items():
+        store.put(name, body)
+    store.save()
+    index = SearchIndex.open(store)
+    index.persist()
+    index.detach()
+    store.close(compact=False)
+
+    other = reopen(directory)
+    edited, deleted = other.names()[:2]
+    other.put(edited, "zebra")
+    other.put("brand new", "quokka")
+    other.delete(deleted)
+    other.save()
+    other.close(compact=False)
+
+    store = reopen(directory)
+    assert SearchIndex.open_persisted(store) is None
+    refreshed = SearchIndex.open(store)
+    rebuilt = SearchIndex(store)
+    rebuilt.rebuild(store.items())
+    assert refreshed.search("zebra") == [edited]
+    assert refreshed.search("quokka") == ["brand new"]
+    assert deleted not in refreshed.search(deleted)
+    refreshed.compact()  # Retired postings still count towards idf until then
+    for query in QUERIES:
+        assert refreshed.search(query) == rebuilt.search(query)
+
+
+def test_index_follows_store_changes(directory):
+    store = PromptStore(directory)
+    store.put("first", "alpha")
+    index = SearchIndex.open(store)
+    store.put("second", "alpha beta")
+    store.rename("first", "renamed")
+    assert index.search("alpha") == ["renamed", "second"]
+    store.delete("second")
+    assert index.search("beta") == []
+    assert index.search("renamed") == ["renamed"]
+
+
+def test_backend_search_shows_unsaved_edits_without_saving(directory):
+    from PromptWriter import WriteBehindWriter
+    store = PromptStore(directory, backend="sqlite")
+    if not store.backend.has_fts:
+        pytest.skip("SQLite without FTS5")
+    for name, body in [("Code review", "review python code"), ("Email", "draft an email"),
+                       ("Old name", "review notes"), ("Gone", "review this")]:
+        store.put(name, body)
+    store.save()
+    writer = WriteBehindWriter(store, delay=60, max_delay=60)
+    search = open_search(store, writer)
+    assert sorted(search.search("review")) == ["Code review", "Gone", "Old name"]
+
+    store.put("Email", "review the email draft")
+    store.put("New", "a new review")
+    store.rename("Old name", "Renamed")
+    store.delete("Gone")
+    store.put("Code review", "check python code")
+    writer.schedule()
+    assert search.search("revi") == ["Code review", "Email", "New", "Renamed"]
+    assert search.search("python") == ["Code review"]
+    assert search.search("che pyth") == ["Code review"]
+    assert search.search("revi", 2) == ["Code review", "Email"]
+    assert store.dirty                           # Searching saved nothing
+
+    writer.flush()
+    assert sorted(search.search("revi")) == ["Code review", "Email", "New", "Renamed"]
+    assert search.search("python") == ["Code review"]
+    assert not search._unsaved
+    writer.close()
+    search.detach()
+    store.close()
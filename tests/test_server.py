@@ -0,0 +1,91 @@
+import http.client
+import json
+
+import pytest
+
+from PromptServer import PromptClient, PromptServer, PromptService
+from PromptStore import PromptNotFoundError, PromptStore, PromptStoreError
+
+
+@pytest.fixture
+def service(directory):
+    store = PromptStore(directory)
+    store.put("Code review", "Review this {$language} code")
+    store.put("Email / draft", "Draft an email about {$topic}")
+    store.save()
+    store.close(compact=False)
+    service = PromptService.open(directory)
+    service.CHECK_INTERVAL = 0
+    yield service
+    service.close()
+
+
+@pytest.fixture
+def server(service):
+    server = PromptServer(service, port=0)
+    server.start()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def client(server):
+    host, port = server._server.server_address[:2]
+    with PromptClient(host, port) as client:
+        yield client
+
+
+def raw_request(server, method, path, body=None):
+    connection = http.client.HTTPConnection(*server._server.server_address[:2], timeout=10)
+    try:
+        connection.request(method, path, body, {"Content-Type": "application/json"})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def test_reads(client):
+    assert client.names() == ["Code review", "Email / draft"]
+    assert client.get("Email / draft") == "Draft an email about {$topic}"
+    assert client.get_many(["Code review", "missing"]) == {"Code review": "Review this {$language} code"}
+    assert client.search("review") == ["Code review"]
+    with pytest.raises(PromptNotFoundError):
+        client.get("missing")
+
+
+def test_render(client):
+    assert client.render("Code review", {"language": "Python"}) == "Review this Python code"
+    assert client.render("Code review", wrap=True).endswith("[ Review this {$language} code ]")
+    with pytest.raises(PromptStoreError):
+        client.render("Code review", strict=True)
+    with pytest.raises(PromptStoreError):
+        client.render("Code review", ["not", "a", "dict"])
+
+
+def test_external_changes_are_picked_up(client, directory):
+    assert client.names() == ["Code review", "Email / draft"]
+    other = PromptStore(directory)
+    other.load()
+    other.put("Added elsewhere", "new")
+    other.delete("Code review")
+    other.save()
+    other.close(compact=False)
+    assert client.names() == ["Added elsewhere", "Email / draft"]
+    assert client.search("new") == ["Added elsewhere"]
+
+
+def test_bad_requests_are_answered(server, client):
+    assert raw_request(server, "POST", "/get", b"{not json")[0] == 400
+    assert raw_request(server, "POST", "/get", b'{"names": "Code review"}')[0] == 400
+    assert raw_request(server, "POST", "/render", b'{"name": "Code review", "wrapper": 3}')[0] == 400
+    assert raw_request(server, "GET", "/nowhere")[0] == 404
+    assert client.names()  # The kept-alive connection still works
+
+
+def test_internal_errors_are_answered(server, service, monkeypatch):
+    def broken(*args):
+        raise RuntimeError("boom")
+    monkeypatch.setattr(service, "search", broken)
+    status, payload = raw_request(server, "GET", "/search?q=x")
+    assert status == 500 and "boom" in payload["error"]
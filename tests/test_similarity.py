@@ -0,0 +1,89 @@
+import random
+
+import pytest
+
+import PromptSimilarity
+from PromptSimilarity import SimilarityIndex
+from PromptStore import PromptStore
+
+WORDS = "the quick brown fox jumps over lazy dog while reviewing python code carefully".split()
+
+
+def bodies(count=60, seed=5):
+    rng = random.Random(seed)
+    result = ["", "one", "Ünïcode wörds, punctuation! and\ttabs", "x " * 5000]
+    for _ in range(count):
+        result.append(" ".join(rng.choice(WORDS) for _ in range(rng.randrange(3, 200))))
+    return result
+
+
+def test_numpy_and_python_signatures_agree(monkeypatch):
+    pytest.importorskip("numpy")
+    texts = bodies()
+    with_numpy = SimilarityIndex.signatures(texts)
+    monkeypatch.setattr(PromptSimilarity, "np", None)
+    assert SimilarityIndex.signatures(texts) == with_numpy
+
+
+def near_duplicates():
+    rng = random.Random(2)
+    base = " ".join(rng.choice(WORDS) for _ in range(300))
+    items = [("original", base), ("copy", base.replace("lazy", "sleepy", 1)), ("spaced", base.upper() + "  ")]
+    items += [(f"other {i}", body) for i, body in enumerate(bodies(20, seed=9))]
+    return items
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_duplicate_groups(monkeypatch, use_numpy):
+    if use_numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(PromptSimilarity, "np", None)
+    index = SimilarityIndex()
+    index.rebuild(near_duplicates())
+    assert index.duplicate_groups()[0] == ["copy", "original", "spaced"]
+    similar = index.similar("original")
+    assert similar[0] == ("spaced", 1.0)   # Case and spacing do not count
+    assert similar[1][0] == "copy"
+
+
+def test_follows_renames_and_removals():
+    index = SimilarityIndex()
+    index.rebuild(near_duplicates())
+    index.rename("copy", "moved")
+    index.remove("spaced")
+    assert index.duplicate_groups()[0] == ["moved", "original"]
+    assert index.similar("missing") == []
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_lookups_follow_edits(monkeypatch, use_numpy):
+    if use_numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(PromptSimilarity, "np", None)
+    store = PromptStore()
+    for name, body in near_duplicates():
+        store.put(name, body)
+    index = SimilarityIndex.open(store)
+    store.put("late copy", store.get("original") + " again")
+    store.rename("spaced", "moved")
+    store.delete("copy")
+    for i in range(1100):   # Enough retired doc ids to compact
+        store.put("churn", f"churn {i}")
+    assert sorted(name for name, _ in index.similar("original")) == ["late copy", "moved"]
+    assert index.similar_to_body(store.get("churn")) == [("churn", 1.0)]
+
+
+def test_oversized_buckets_ignore_insertion_order(monkeypatch):
+    monkeypatch.setattr(SimilarityIndex, "MAX_BUCKET", 4)
+    monkeypatch.setattr(SimilarityIndex, "BUCKET_WINDOW", 2)
+    index = SimilarityIndex()
+    index.rebuild(near_duplicates())
+    members = list(range(len(index)))
+    pairs = set(index._bucket_pairs(members))
+    assert len(pairs) == 2 * len(members) - 3
+    for seed in range(4):
+        random.Random(seed).shuffle(members)
+        assert set(index._bucket_pairs(members)) == pairs
+    assert set(index._bucket_pairs(members[:4])) == {(a, b) for a in members[:4] for b in members[:4] if a < b}
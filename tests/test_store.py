@@ -0,0 +1,88 @@
+import pytest
+
+from PromptStore import BACKENDS, PromptNotFoundError, PromptStore
+from conftest import contents, reopen
+
+
+@pytest.fixture(params=sorted(BACKENDS))
+def pair(request, directory):
+    """Two stores on one library, as two running programs would have it."""
+    backend = request.param
+    first = PromptStore(directory, backend=backend)
+    first.put("kept", "unchanged")
+    first.put("edited", "before")
+    first.put("removed", "soon gone")
+    first.put("contested", "base")
+    first.save()
+    second = reopen(directory, backend)
+    yield first, second
+    first.close(compact=False)
+    second.close(compact=False)
+
+
+def test_merge_external_applies_other_program_changes(pair):
+    first, second = pair
+    seen = []
+    first.add_listener(lambda change: seen.append((change.op, change.name)))
+    second.put("edited", "after, from the other program")
+    second.put("added", "new")
+    second.delete("removed")
+    second.save()
+
+    result = first.merge_external()
+    assert sorted(result.changed) == ["edited"]
+    assert result.added == ["added"]
+    assert result.removed == ["removed"]
+    assert result.conflicts == []
+    assert contents(first) == contents(second)
+    assert sorted(seen) == [("delete", "removed"), ("put", "added"), ("put", "edited")]
+    assert first.merge_external() is None        # Nothing new since
+
+
+def test_merge_external_keeps_local_edits_as_conflicts(pair):
+    first, second = pair
+    second.put("contested", "theirs, longer")
+    second.put("edited", "theirs")
+    second.save()
+    first.put("contested", "mine")
+
+    result = first.merge_external()
+    assert result.conflicts == ["contested"]
+    assert result.changed == ["edited"]
+    assert first.get("contested") == "mine"
+    first.save()                                 # No ExternalChangeError after the merge
+    assert reopen(first.directory, first.backend_name).get("contested") == "mine"
+
+
+def test_merge_external_conflict_on_deleted_entry(pair):
+    first, second = pair
+    second.delete("contested")
+    second.save()
+    first.put("contested", "mine, edited")
+
+    result = first.merge_external()
+    assert result.conflicts == ["contested"]
+    assert result.removed == []
+    first.save()
+    assert reopen(first.directory, first.backend_name).get("contested") == "mine, edited"
+
+
+def test_merge_external_without_changes(pair):
+    first, _ = pair
+    assert first.merge_external() is None
+
+
+def test_save_and_reopen(directory):
+    store = PromptStore(directory)
+    store.put("a", "Alpha")
+    store.put("b", "Bravo")
+    store.rename("a", "renamed")
+    store.delete("b")
+    store.save()
+    assert contents(reopen(directory)) == {"renamed": "Alpha"}
+
+
+def test_missing_prompt(directory):
+    store = PromptStore(directory)
+    with pytest.raises(PromptNotFoundError):
+        store.get("nothing")
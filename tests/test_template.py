@@ -0,0 +1,72 @@
+import pytest
+
+from PromptStore import PromptStore
+from PromptTemplate import DEFAULT_WRAPPER, TemplateEngine, TemplateError
+
+# Bodies written before templates existed; they must copy byte for byte.
+EXISTING = [
+    "Use {{user_name}} to greet them, and {x} for the rest.",
+    "{{#items}}{{> item}}{{/items}} {% if a %}{{ a }}{% endif %}",
+    'Reply as {"answer": {"text": "..."}} and f"{value!r:>10}" or {0} {}',
+    "Unbalanced } and { braces, {>not closed, {{$literal}} and {{@prompt}}",
+    "def f():\n    return {k: v for k, v in d.items()}\n",
+]
+
+
+@pytest.fixture
+def engine():
+    store = PromptStore()
+    store.put("greeting", "Hello {$name}, about {$topic}.")
+    store.put("outer", "Start. {>greeting} End with {topic} and {>  greeting  }")
+    store.put("cycle a", "A {>cycle b}")
+    store.put("cycle b", "B {>cycle a}")
+    store.put("broken", "See {>nowhere}")
+    store.put("has prompt blank", "Rewrite {$prompt} for {$topic}")
+    store.put("Wrapper: tagged", "<{$tone}>{@prompt}</{$tone}>")
+    for i, body in enumerate(EXISTING):
+        store.put(f"existing {i}", body)
+    return TemplateEngine(store)
+
+
+def test_variables_and_includes(engine):
+    assert engine.render("outer", {"name": "Ann", "topic": "tests"}) == \
+        "Start. Hello Ann, about tests. End with {topic} and Hello Ann, about tests."
+    assert engine.variables("outer") == ["name", "topic"]
+
+
+def test_missing_values_stay_as_written(engine):
+    assert engine.render("greeting", {"name": "Ann"}) == "Hello Ann, about {$topic}."
+    with pytest.raises(TemplateError):
+        engine.render("greeting", {"name": "Ann"}, strict=True)
+
+
+@pytest.mark.parametrize("index", range(len(EXISTING)))
+def test_existing_bodies_copy_unchanged(engine, index):
+    name = f"existing {index}"
+    assert engine.variables(name) == []
+    assert engine.render(name, {"x": "X", "user_name": "U", "literal": "L"}) == EXISTING[index]
+    assert engine.render_wrapped(name, None, "Wrapper: tagged") == "<{$tone}>" + EXISTING[index] + "</{$tone}>"
+
+
+def test_include_cycles_and_missing_includes(engine):
+    with pytest.raises(TemplateError, match="cycle a -> cycle b -> cycle a"):
+        engine.render("cycle a")
+    with pytest.raises(TemplateError, match="nowhere"):
+        engine.render("broken")
+
+
+def test_edits_reach_cached_renderers(engine):
+    engine.render("outer", {})
+    engine.store.put("greeting", "Hi {$name}")
+    assert engine.render("outer", {"name": "Bo"}) == "Start. Hi Bo End with {topic} and Hi Bo"
+
+
+def test_wrappers(engine):
+    values = {"prompt": "this text", "topic": "tests", "tone": "calm"}
+    assert engine.render_wrapped("has prompt blank", values, DEFAULT_WRAPPER) == \
+        "(Important) Follow These Additional Instructions to Provide your Answer: " \
+        "[ Rewrite this text for tests ]"
+    assert engine.render_wrapped("has prompt blank", values, "Wrapper: tagged") == \
+        "<calm>Rewrite this text for tests</calm>"
+    assert engine.variables("has prompt blank", "Wrapper: tagged") == ["prompt", "tone", "topic"]
+    assert engine.wrappers() == ["Wrapper: tagged"]
@@ -0,0 +1,57 @@
+import io
+
+import pytest
+
+from PromptStore import PromptStore
+from PromptTransfer import export_jsonl, import_prompts, iter_jsonl
+from conftest import contents, reopen
+
+INCOMING = [("existing", "new body"), ("fresh", "fresh body"), ("copy of existing", "old body")]
+
+
+@pytest.fixture
+def store(directory):
+    store = PromptStore(directory)
+    store.put("existing", "old body")
+    store.save()
+    return store
+
+
+def test_skip_policy(store):
+    result = import_prompts(store, INCOMING, policy="skip")
+    assert (result.added, result.skipped, result.duplicates) == (1, 1, 1)
+    assert contents(store) == {"existing": "old body", "fresh": "fresh body"}
+
+
+def test_overwrite_policy(store):
+    result = import_prompts(store, INCOMING, policy="overwrite")
+    assert (result.added, result.overwritten, result.duplicates) == (1, 1, 1)
+    assert contents(reopen(store.directory)) == {"existing": "new body", "fresh": "fresh body"}
+
+
+def test_rename_policy(store):
+    names = []
+    result = import_prompts(store, INCOMING, policy="rename", dedup=False, added_names=names)
+    assert (result.added, result.renamed) == (2, 1)
+    assert contents(store) == {"existing": "old body", "existing (2)": "new body", "fresh": "fresh body",
+                               "copy of existing": "old body"}
+    assert sorted(names) == ["copy of existing", "existing (2)", "fresh"]
+
+
+def test_unknown_policy(store):
+    with pytest.raises(ValueError):
+        import_prompts(store, INCOMING, policy="merge")
+
+
+def test_jsonl_round_trip(store):
+    store.put("multi\nline", 'quotes " and\nnewlines')
+    buffer = io.StringIO()
+    assert export_jsonl(store, buffer) == 2
+    buffer.seek(0)
+    assert dict(iter_jsonl(buffer)) == contents(store)
+
+
+def test_overwritten_bodies_are_reported(store):
+    replaced = []
+    import_prompts(store, INCOMING + [("fresh", "fresh body 2")], policy="overwrite", dedup=False, replaced=replaced)
+    assert replaced == [("existing", "new body", "old body"), ("fresh", "fresh body 2", "fresh body")]